@@ -0,0 +1,187 @@
+"""
+Benchmark and reference check for the indicators in indicators.py
+
+Usage:
+    python bench_indicators.py                  # Time every indicator at 1k, 20k, 200k and 2M points
+    python bench_indicators.py --sizes 1000 20000 --repeat 5
+    python bench_indicators.py --check          # Compare outputs against the pinned golden values
+
+The golden values were taken from the original list based implementations and
+pin the None warm-up padding as well as the MACD signal realignment, so any
+faster implementation must reproduce them.
+"""
+
+import argparse
+import math
+import sys
+import time
+import tracemalloc
+import numpy as np
+from indicators import INDICATORS
+
+DEFAULT_SIZES = [1_000, 20_000, 200_000, 2_000_000]
+
+# Extra arguments for indicators without a default period
+INDICATOR_ARGS = {
+    'sma': (20,),
+    'ema': (20,)
+}
+
+# Absolute tolerance for golden values (they are rounded to 10 decimals)
+TOLERANCE = 1e-8
+
+
+def synthetic_prices(size: int, seed: int = 42) -> list:
+    """Geometric random walk starting at 100"""
+    rng = np.random.default_rng(seed)
+    return (100.0 * np.exp(np.cumsum(rng.normal(0.0, 0.01, size)))).tolist()
+
+
+def golden_prices() -> list:
+    """Deterministic series the golden values were taken from"""
+    return [100 + 10 * math.sin(i / 5) + 0.3 * i + (i % 7) for i in range(260)]
+
+
+# Indicator -> output key (None for plain lists) -> (first non-None index, {index: value})
+GOLDEN = {
+    'macd': {
+        'macd': (25, {25: -4.6324088408, 26: -4.2213334828, 150: -1.1713443273, 259: 5.0397585223}),
+        'signal': (33, {33: -2.708846143, 34: -1.9609637167, 150: 0.5363790583, 259: 3.2848248506}),
+        'histogram': (33, {33: 2.7437421993, 34: 2.9915297052, 150: -1.7077233856, 259: 1.7549336716})
+    },
+    'rsi': {
+        None: (14, {14: 61.2510713577, 15: 60.0206512796, 150: 41.8184487917, 259: 63.6219872076})
+    },
+    'bollinger': {
+        'upper': (19, {19: 119.8744959285, 20: 119.3582776245, 150: 158.7785110508, 259: 194.8860850865}),
+        'middle': (19, {19: 110.0095201168, 20: 110.2311188692, 150: 145.8899138572, 259: 176.322374473}),
+        'lower': (19, {19: 100.1445443051, 20: 101.1039601138, 150: 133.0013166637, 259: 157.7586638595})
+    },
+    'sma': {
+        None: (19, {19: 110.0095201168, 20: 110.2311188692, 150: 145.8899138572, 259: 176.322374473})
+    },
+    'ema': {
+        None: (19, {19: 110.0095201168, 20: 109.4783253483, 150: 142.0161139654, 259: 180.1742421575})
+    },
+    'volatility': {
+        None: (200, {200: 1.6396010865, 201: 1.6236736765, 259: 1.4763789354})
+    },
+    'dual_ema': {
+        'ema50': (49, {49: 112.177339311, 50: 112.1139059612, 150: 139.7187800449, 259: 173.8919359648}),
+        'ema200': (199, {199: 133.2167166444, 200: 133.5971585843, 259: 150.9559920533})
+    }
+}
+
+# calculate_macd(golden_prices()[:12], 2, 4, 3): the signal line starts on the
+# slow EMA's first value, not on the first MACD value
+GOLDEN_SMALL_MACD = {
+    'macd': [None, None, None, 3.1582037342, 3.0638640561, 2.9056054226, 2.6873071863,
+             0.5494606734, 0.3596988527, 0.5038908688, 0.5728911628, 0.5117841835],
+    'signal': [None, None, None, None, None, 3.0425577376, 2.864932462,
+               1.7071965677, 1.0334477102, 0.7686692895, 0.6707802262, 0.5912822049],
+    'histogram': [None, None, None, None, None, -0.136952315, -0.1776252757,
+                  -1.1577358943, -0.6737488575, -0.2647784207, -0.0978890633, -0.0794980213]
+}
+
+# (description, call, expected)
+EDGE_CASES = [
+    ('ema shorter than period', lambda: INDICATORS['ema']([1, 2], 3), [None, None]),
+    ('rsi of a flat series', lambda: INDICATORS['rsi']([5.0] * 20)[14:16], [100.0, 100.0]),
+    ('volatility with a zero price', lambda: INDICATORS['volatility']([0.0, 1.0, 2.0, 3.0], 2),
+     [None, None, 100.0, 75.0]),
+    ('empty input', lambda: INDICATORS['sma']([], 20), [])
+]
+
+
+def _matches(actual, expected) -> bool:
+    if expected is None or actual is None:
+        return actual is expected
+    return abs(actual - expected) <= TOLERANCE
+
+
+def _check_series(label: str, values, first_valid: int, points: dict) -> list:
+    errors = []
+    if len(values) != len(golden_prices()):
+        return [f"{label}: expected {len(golden_prices())} values, got {len(values)}"]
+
+    padding = [i for i in range(first_valid) if values[i] is not None]
+    if padding:
+        errors.append(f"{label}: expected None before index {first_valid}, got a value at {padding[0]}")
+    if values[first_valid] is None:
+        errors.append(f"{label}: expected a value at index {first_valid}, got None")
+
+    for index, expected in points.items():
+        if not _matches(values[index], expected):
+            errors.append(f"{label}[{index}]: expected {expected}, got {values[index]}")
+    return errors
+
+
+def run_checks() -> list:
+    """Compare every indicator against the golden values, returns a list of failures"""
+    errors = []
+    prices = golden_prices()
+    for name, series in GOLDEN.items():
+        result = INDICATORS[name](prices, *INDICATOR_ARGS.get(name, ()))
+        for key, (first_valid, points) in series.items():
+            values = result if key is None else result[key]
+            errors.extend(_check_series(name if key is None else f"{name}.{key}", values, first_valid, points))
+
+    result = INDICATORS['macd'](prices[:12], 2, 4, 3)
+    for key, expected in GOLDEN_SMALL_MACD.items():
+        if len(result[key]) != len(expected) or not all(map(_matches, result[key], expected)):
+            errors.append(f"small macd.{key}: expected {expected}, got {result[key]}")
+
+    for description, call, expected in EDGE_CASES:
+        actual = call()
+        if len(actual) != len(expected) or not all(map(_matches, actual, expected)):
+            errors.append(f"{description}: expected {expected}, got {actual}")
+    return errors
+
+
+def benchmark(function, prices: list, args: tuple, repeat: int) -> tuple:
+    """Best wall time of `repeat` calls and the peak memory allocated by one call"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(prices, *args)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    function(prices, *args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def run_benchmarks(sizes: list, repeat: int, names: list) -> None:
+    print(f"{'indicator':<12}{'points':>11}{'seconds':>12}{'ops/sec':>12}{'points/sec':>14}{'peak MB':>10}")
+    for size in sizes:
+        prices = synthetic_prices(size)
+        for name in names:
+            seconds, peak = benchmark(INDICATORS[name], prices, INDICATOR_ARGS.get(name, ()), repeat)
+            print(f"{name:<12}{size:>11,}{seconds:>12.5f}{1 / seconds:>12.1f}"
+                  f"{size / seconds:>14,.0f}{peak / 1024 / 1024:>10.1f}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark and check the SmartChart indicators")
+    parser.add_argument('--check', action='store_true', help="Only compare outputs against the golden values")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="Series lengths to time")
+    parser.add_argument('--repeat', type=int, default=3, help="Timed calls per indicator and size")
+    parser.add_argument('--indicators', nargs='+', choices=list(INDICATORS), default=list(INDICATORS),
+                        help="Indicators to time")
+    args = parser.parse_args()
+
+    errors = run_checks()
+    for error in errors:
+        print(f"FAIL {error}")
+    print(f"Golden values: {'FAILED' if errors else 'OK'}")
+    if args.check or errors:
+        return 1 if errors else 0
+
+    run_benchmarks(args.sizes, args.repeat, args.indicators)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
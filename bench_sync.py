@@ -0,0 +1,184 @@
+"""
+End-to-end benchmark of sync_all_data.py against the local Bybit stand-in
+
+Usage:
+    python bench_sync.py                              # 20 symbols, 7 days of history
+    python bench_sync.py --symbols 50 --days 30 --rate 200
+    python bench_sync.py --latency 0.05 --error-rate 0.01 --malformed-rate 0.01
+    python bench_sync.py --derive --load-data
+
+Starts fake_bybit.py in-process, recreates the benchmark database on the MySQL
+server configured in sync_all_data.py (never the database the sync normally
+writes to), refreshes the tickers and runs the one-shot sync with the real
+limiter, writers and candle store. Reports candles/sec, API calls and database
+write time per interval.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import sys
+import tempfile
+import time
+import aiohttp
+import aiomysql
+import pymysql
+import sync_all_data
+import sync_tickers
+from candle_store import CandleStore
+from fake_bybit import FakeBybit, start_server, synthetic_symbols
+
+CANDLE_TABLE = """
+CREATE TABLE {table} (
+    symbol VARCHAR(32) NOT NULL,
+    open_time BIGINT NOT NULL,
+    open_datetime DATETIME NOT NULL,
+    open DOUBLE, high DOUBLE, low DOUBLE, close DOUBLE, volume DOUBLE, turnover DOUBLE,
+    PRIMARY KEY (symbol, open_time)
+)
+"""
+
+
+def ticker_table() -> str:
+    columns = []
+    for name, convert in sync_tickers.TICKER_FIELDS[1:]:
+        kind = 'BIGINT' if convert is sync_tickers.safe_int else 'DOUBLE' if convert is sync_tickers.safe_float else 'VARCHAR(32)'
+        columns.append(f"{name} {kind}")
+    return f"CREATE TABLE tickers (symbol VARCHAR(32) NOT NULL PRIMARY KEY, {', '.join(columns)})"
+
+
+def create_database(name: str) -> None:
+    """Drop and recreate the benchmark database with empty tickers and candle tables"""
+    conn = pymysql.connect(host=sync_all_data.DB_HOST, port=sync_all_data.DB_PORT,
+                           user=sync_all_data.DB_USER, password=sync_all_data.DB_PASS)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP DATABASE IF EXISTS {name}")
+            cur.execute(f"CREATE DATABASE {name}")
+            cur.execute(f"USE {name}")
+            cur.execute(ticker_table())
+            for table in sync_all_data.intervals_mapping.values():
+                cur.execute(CANDLE_TABLE.format(table=table))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def configure(args, url: str) -> None:
+    """Point sync_all_data and sync_tickers at the fake API and the benchmark database"""
+    sync_all_data.BYBIT_API_URL = sync_tickers.BYBIT_API_URL = url
+    sync_all_data.DB_NAME = sync_tickers.DB_CONFIG['database'] = args.database
+    sync_all_data.API_CACHE_INVALIDATE_URL = sync_tickers.API_SYMBOLS_REFRESH_URL = None
+    sync_all_data.candle_store = None if args.no_store else CandleStore(tempfile.mkdtemp(prefix='bench_store_'))
+    sync_all_data.REQUESTS_PER_SECOND = args.rate
+    sync_all_data.MAX_REQUESTS_PER_SECOND = max(args.rate, sync_all_data.MAX_REQUESTS_PER_SECOND)
+    sync_all_data.LOAD_DATA_INFILE = args.load_data
+    sync_all_data.DERIVE_TIMEFRAMES = args.derive
+    sync_all_data.ingest_stats.clear()
+
+
+async def timed_interval(interval, pool, session, limiter, elapsed: dict) -> None:
+    started = time.perf_counter()
+    await sync_all_data.run_for_interval(interval, pool, session, limiter)
+    elapsed[interval] = time.perf_counter() - started
+
+
+async def run_sync(args) -> dict:
+    """Run the sync and return per interval wall times, the limiter and the seconds spent on tickers"""
+    S = sync_all_data
+    started = time.perf_counter()
+    await S.refresh_symbols()
+    ticker_seconds = time.perf_counter() - started
+
+    pool = await aiomysql.create_pool(
+        host=S.DB_HOST, port=S.DB_PORT, user=S.DB_USER, password=S.DB_PASS, db=S.DB_NAME,
+        autocommit=False, minsize=1, maxsize=S.MAX_CONCURRENT_REQUESTS*2 + S.WRITERS_PER_TABLE*len(S.timeframes),
+        local_infile=S.LOAD_DATA_INFILE
+    )
+    limiter = S.TokenBucket(S.REQUESTS_PER_SECOND, S.REQUEST_BURST, S.interval_priority,
+                            S.MIN_REQUESTS_PER_SECOND, S.MAX_REQUESTS_PER_SECOND)
+    connector = aiohttp.TCPConnector(limit=S.HTTP_CONNECTIONS, keepalive_timeout=S.HTTP_KEEPALIVE_SECONDS)
+    elapsed = {}
+    try:
+        async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=S.HTTP_TIMEOUT)) as session:
+            started = time.perf_counter()
+            if S.DERIVE_TIMEFRAMES:
+                await S.run_derived(pool, session, limiter)
+                elapsed = {interval: time.perf_counter() - started for interval in S.timeframes}
+            else:
+                await asyncio.gather(*(timed_interval(interval, pool, session, limiter, elapsed) for interval in S.timeframes))
+    finally:
+        pool.close()
+        await pool.wait_closed()
+    return {'elapsed': elapsed, 'limiter': limiter, 'tickers': ticker_seconds}
+
+
+def report(result: dict, fake: FakeBybit, total: float) -> None:
+    S = sync_all_data
+    limiter = result['limiter']
+    print(f"{'interval':<10}{'candles':>11}{'API calls':>11}{'seconds':>10}{'candles/s':>12}"
+          f"{'DB write s':>12}{'transactions':>14}")
+    candles = 0
+    for interval in S.timeframes:
+        table = S.intervals_mapping[interval]
+        stats = S.ingest_stats.get(table, {'rows': 0, 'transactions': 0, 'seconds': 0.0})
+        api_interval = interval.upper() if interval in ["D", "W"] else interval
+        seconds = result['elapsed'].get(interval, 0.0)
+        candles += stats['rows']
+        print(f"{interval:<10}{stats['rows']:>11,}{limiter.granted.get(api_interval, 0):>11,}{seconds:>10.2f}"
+              f"{stats['rows'] / seconds if seconds else 0:>12,.0f}{stats['seconds']:>12.2f}{stats['transactions']:>14,}")
+
+    stats = limiter.stats()
+    print(f"\nTotal: {candles:,} candles in {total:.2f} s ({candles / total if total else 0:,.0f} candles/s), "
+          f"tickers {result['tickers']:.2f} s")
+    print(f"API: {stats['requests']:,} requests, throttled {stats['throttled']} times, final rate {stats['rate']:.1f}/s")
+    print(f"Fake server: {fake.stats['requests']:,} requests, {fake.stats['errors']} injected 429s, "
+          f"{fake.stats['malformed']} malformed, {fake.stats['throttled']} over quota")
+
+
+async def run(args) -> int:
+    if args.database == sync_all_data.DB_NAME:
+        print(f"Refusing to benchmark into the sync database '{args.database}'")
+        return 1
+
+    fake = FakeBybit(synthetic_symbols(args.symbols), days=args.days, now=time.time(), latency=args.latency,
+                     error_rate=args.error_rate, malformed_rate=args.malformed_rate,
+                     quota=args.quota, quota_window=args.quota_window)
+    runner, url = await start_server(fake)
+    try:
+        create_database(args.database)
+        configure(args, url)
+        started = time.perf_counter()
+        with contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO()):
+            result = await run_sync(args)
+        total = time.perf_counter() - started
+    finally:
+        await runner.cleanup()
+
+    print(f"{args.symbols} symbols, {args.days:g} days, latency {args.latency * 1000:.0f} ms, "
+          f"{'derived' if args.derive else 'fetched'} timeframes, {'LOAD DATA' if args.load_data else 'INSERT'}\n")
+    report(result, fake, total)
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the candle sync against a local fake Bybit API")
+    parser.add_argument('--symbols', type=int, default=20, help="Number of symbols")
+    parser.add_argument('--days', type=float, default=7, help="Days of history per symbol")
+    parser.add_argument('--database', default='smartchart_bench', help="Database to recreate and sync into")
+    parser.add_argument('--rate', type=float, default=sync_all_data.REQUESTS_PER_SECOND, help="Requests per second")
+    parser.add_argument('--latency', type=float, default=0.0, help="Mean API response delay in seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Share of API requests answered with 429")
+    parser.add_argument('--malformed-rate', type=float, default=0.0, help="Share of API requests answered with broken JSON")
+    parser.add_argument('--quota', type=int, help="API requests allowed per quota window (sent in rate limit headers)")
+    parser.add_argument('--quota-window', type=float, default=5.0, help="Quota window in seconds")
+    parser.add_argument('--derive', action='store_true', help="Fetch only 1m and derive the other timeframes")
+    parser.add_argument('--load-data', action='store_true', help="Write large batches with LOAD DATA LOCAL INFILE")
+    parser.add_argument('--no-store', action='store_true', help="Don't write the local candle store")
+    parser.add_argument('--verbose', action='store_true', help="Show the sync's own output")
+    return asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
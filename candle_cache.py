@@ -0,0 +1,135 @@
+"""
+In-process candle cache for SmartChart
+Keeps the most recent candles per (symbol, timeframe) as column arrays
+"""
+
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+def columns_nbytes(columns: Dict[str, np.ndarray]) -> int:
+    """Memory used by a dict of column arrays"""
+    return sum(values.nbytes for values in columns.values())
+
+
+class CandleCache:
+    """
+    LRU cache of candle columns per (symbol, timeframe) with a memory budget
+
+    Each entry holds columns sorted by 'time' (seconds) and a 'complete' flag
+    that is set when the entry holds the symbol's entire history. Entries are
+    evicted least recently used first once the total size exceeds max_bytes.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def lookup(self, symbol: str, timeframe: str, limit: int) -> Optional[dict]:
+        """Entry that can answer a request for the last `limit` candles, or None"""
+        key = (symbol, timeframe)
+        entry = self.entries.get(key)
+        if entry is None or (not entry['complete'] and len(entry['columns']['time']) < limit):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry
+
+    def put(self, symbol: str, timeframe: str, columns: Dict[str, np.ndarray], complete: bool) -> dict:
+        """Store columns for (symbol, timeframe), replacing any existing entry"""
+        key = (symbol, timeframe)
+        self._drop(key)
+        entry = {'columns': columns, 'complete': complete}
+        self.entries[key] = entry
+        self.bytes += columns_nbytes(columns)
+        self._evict()
+        return entry
+
+    def merge_tail(self, symbol: str, timeframe: str, entry: dict, tail: Dict[str, np.ndarray]) -> dict:
+        """
+        Replace an entry's candles from the tail's first time onwards with the tail
+
+        The entry is stored again if it was evicted or replaced since it was looked up.
+        """
+        columns = entry['columns']
+        if len(tail['time']):
+            keep = int(np.searchsorted(columns['time'], tail['time'][0]))
+            columns = {name: np.concatenate([columns[name][:keep], tail[name]]) for name in columns}
+
+        key = (symbol, timeframe)
+        if self.entries.get(key) is not entry:
+            return self.put(symbol, timeframe, columns, entry['complete'])
+
+        self.bytes += columns_nbytes(columns) - columns_nbytes(entry['columns'])
+        entry['columns'] = columns
+        self._evict()
+        return entry
+
+    def invalidate(self, symbol: Optional[str] = None, timeframe: Optional[str] = None,
+                   since: Optional[int] = None) -> int:
+        """
+        Drop cached candles, optionally limited to a symbol, timeframe and time
+
+        Args:
+            symbol: Only this symbol (all symbols if None)
+            timeframe: Only this timeframe (all timeframes if None)
+            since: Only candles with time >= since (seconds); whole entries if None
+
+        Returns:
+            Number of entries affected
+        """
+        affected = 0
+        for key in list(self.entries):
+            if (symbol is not None and key[0] != symbol) or (timeframe is not None and key[1] != timeframe):
+                continue
+
+            entry = self.entries[key]
+            columns = entry['columns']
+            keep = 0 if since is None else int(np.searchsorted(columns['time'], since))
+            if keep == len(columns['time']):
+                continue
+
+            affected += 1
+            if keep == 0:
+                self._drop(key)
+            else:
+                trimmed = {name: values[:keep].copy() for name, values in columns.items()}
+                self.bytes += columns_nbytes(trimmed) - columns_nbytes(columns)
+                entry['columns'] = trimmed
+
+        self.invalidations += affected
+        return affected
+
+    def stats(self) -> dict:
+        """Entry count, memory use and hit rate"""
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else None,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations
+        }
+
+    def _drop(self, key) -> None:
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= columns_nbytes(entry['columns'])
+
+    def _evict(self) -> None:
+        # Never evict the most recently used entry, even if it alone is over budget
+        while self.bytes > self.max_bytes and len(self.entries) > 1:
+            key = next(iter(self.entries))
+            self._drop(key)
+            self.evictions += 1
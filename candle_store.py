@@ -0,0 +1,232 @@
+"""
+Local on-disk candle store for SmartChart
+Append-only column files per (table, symbol), written by sync_all_data.py and memory-mapped by the API
+
+Layout:
+    <root>/<table>/<symbol>/time      int64 open time in seconds, ascending
+    <root>/<table>/<symbol>/<field>   float64 open, high, low, close, volume
+    <root>/<table>/<symbol>/meta.json {"length": rows in use, "complete": holds the whole history}
+
+Column files are grown in steps of GROW_ROWS and never shrink, so a reader's
+mapping stays valid while the writer appends. The writer writes the rows
+before it replaces meta.json, so readers never see rows that are not written
+yet. Rows that are rewritten in place (in practice only the forming candle)
+may be read half-updated while the write is in progress.
+
+Without "complete" the files hold an unbroken run of the newest candles, so
+a reader can trust the store for anything from its oldest candle onwards.
+"""
+
+import json
+import os
+import numpy as np
+from typing import Dict, Optional
+
+DEFAULT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'candle_store')
+
+FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+DTYPES = {'time': np.dtype('<i8'), **{field: np.dtype('<f8') for field in FIELDS}}
+
+# Rows added to the column files at a time
+GROW_ROWS = 4096
+
+
+class CandleStore:
+    """
+    Memory-mapped candle columns per (table, symbol)
+
+    One process (the sync job) writes, any number of processes read. read()
+    returns read-only views of the mapped files, so slicing them copies nothing.
+    """
+
+    def __init__(self, root: str = DEFAULT_ROOT):
+        self.root = root
+        self.maps: Dict[tuple, dict] = {}
+        self.reads = 0
+        self.remaps = 0
+        self.rows_written = 0
+
+    def path(self, table: str, symbol: str) -> str:
+        return os.path.join(self.root, table, symbol)
+
+    def read(self, table: str, symbol: str) -> Optional[dict]:
+        """
+        Stored candles of a symbol
+
+        Returns:
+            Dictionary with 'columns' (name to read-only array, oldest first) and
+            'complete', or None if nothing is stored for the symbol
+        """
+        directory = self.path(table, symbol)
+        try:
+            status = os.stat(os.path.join(directory, 'meta.json'))
+        except FileNotFoundError:
+            self.maps.pop((table, symbol), None)
+            return None
+
+        key = (table, symbol)
+        mapped = self.maps.get(key)
+        version = (status.st_ino, status.st_mtime_ns, status.st_size)
+        if mapped is None or mapped['version'] != version:
+            meta = self._read_meta(directory)
+            if mapped is None or meta['length'] > mapped['capacity'] or not self._same_files(directory, mapped):
+                mapped = self._map(directory, meta['length'])
+                self.remaps += 1
+                if mapped is None:
+                    return None
+            mapped.update(version=version, length=meta['length'], complete=meta['complete'])
+            self.maps[key] = mapped
+
+        self.reads += 1
+        length = mapped['length']
+        return {
+            'columns': {name: values[:length] for name, values in mapped['columns'].items()},
+            'complete': mapped['complete']
+        }
+
+    def write(self, table: str, symbol: str, columns: Dict[str, np.ndarray]) -> int:
+        """
+        Insert or replace candles (matched on time)
+
+        Rows from the first new time onwards are rewritten, which for the usual
+        write (new candles plus the forming one) is just the tail.
+
+        Args:
+            columns: 'time' (seconds) and the OHLCV fields, in any order
+
+        Returns:
+            Number of rows written
+        """
+        times = np.asarray(columns['time'], dtype=DTYPES['time'])
+        if len(times) == 0:
+            return 0
+        # Sort and keep the last of duplicate times
+        order = np.argsort(times, kind='stable')
+        keep = np.r_[times[order][1:] != times[order][:-1], True]
+        new = {name: np.asarray(columns[name], dtype=dtype)[order][keep] for name, dtype in DTYPES.items()}
+
+        directory = self.path(table, symbol)
+        os.makedirs(directory, exist_ok=True)
+        meta = self._read_meta(directory)
+        length = meta['length']
+        # Binary search on the mapped times only touches a few pages
+        stored_times = np.memmap(os.path.join(directory, 'time'), dtype=DTYPES['time'], mode='r', shape=(length,)) if length else None
+        first = int(np.searchsorted(stored_times, new['time'][0])) if length else 0
+        del stored_times
+
+        if first < length:
+            # Merge with the stored rows from `first` onwards, new rows win
+            old = {name: self._read_rows(directory, name, first, length) for name in DTYPES}
+            replaced = np.isin(old['time'], new['time'])
+            merged = {name: np.concatenate([old[name][~replaced], new[name]]) for name in DTYPES}
+            order = np.argsort(merged['time'], kind='stable')
+            new = {name: values[order] for name, values in merged.items()}
+
+        end = first + len(new['time'])
+        capacity = -(-end // GROW_ROWS) * GROW_ROWS
+        for name, dtype in DTYPES.items():
+            path = os.path.join(directory, name)
+            with open(path, 'r+b' if os.path.exists(path) else 'w+b') as file:
+                if os.fstat(file.fileno()).st_size < capacity * dtype.itemsize:
+                    file.truncate(capacity * dtype.itemsize)
+                file.seek(first * dtype.itemsize)
+                file.write(new[name].tobytes())
+
+        self._write_meta(directory, {'length': max(end, length), 'complete': meta['complete']})
+        self.rows_written += len(new['time'])
+        return len(new['time'])
+
+    def last_time(self, table: str, symbol: str) -> Optional[int]:
+        """Newest stored time in seconds, None if nothing is stored"""
+        directory = self.path(table, symbol)
+        length = self._read_meta(directory)['length']
+        return int(self._read_rows(directory, 'time', length - 1, length)[0]) if length else None
+
+    def is_complete(self, table: str, symbol: str) -> bool:
+        return self._read_meta(self.path(table, symbol))['complete']
+
+    def mark_complete(self, table: str, symbol: str) -> None:
+        """Record that the store holds the symbol's whole history, so reads never need MySQL"""
+        directory = self.path(table, symbol)
+        os.makedirs(directory, exist_ok=True)
+        self._write_meta(directory, {**self._read_meta(directory), 'complete': True})
+
+    def remove(self, table: str, symbol: str) -> None:
+        """Delete a symbol's candles (mapped files stay readable until they are unmapped)"""
+        directory = self.path(table, symbol)
+        for name in ('meta.json',) + tuple(DTYPES):
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+        try:
+            os.rmdir(directory)
+        except OSError:
+            pass
+        self.maps.pop((table, symbol), None)
+
+    def move(self, table: str, source: str, symbol: str) -> None:
+        """Replace a symbol's candles with those written under the name `source`"""
+        self.remove(table, symbol)
+        os.rename(self.path(table, source), self.path(table, symbol))
+        self.maps.pop((table, source), None)
+
+    def stats(self) -> dict:
+        return {
+            'root': self.root,
+            'mapped': len(self.maps),
+            'mapped_bytes': sum(values.nbytes for mapped in self.maps.values() for values in mapped['columns'].values()),
+            'reads': self.reads,
+            'remaps': self.remaps,
+            'rows_written': self.rows_written
+        }
+
+    def _map(self, directory: str, length: int) -> Optional[dict]:
+        columns = {}
+        for name, dtype in DTYPES.items():
+            path = os.path.join(directory, name)
+            try:
+                size = os.path.getsize(path)
+            except FileNotFoundError:
+                return None
+            if size < length * dtype.itemsize:
+                return None
+            # np.memmap can't map an empty file
+            columns[name] = np.memmap(path, dtype=dtype, mode='r') if size else np.empty(0, dtype=dtype)
+        return {
+            'columns': columns,
+            'capacity': min(len(values) for values in columns.values()),
+            'inode': os.stat(os.path.join(directory, 'time')).st_ino
+        }
+
+    @staticmethod
+    def _same_files(directory: str, mapped: dict) -> bool:
+        # The symbol may have been removed and written again since it was mapped
+        try:
+            return os.stat(os.path.join(directory, 'time')).st_ino == mapped['inode']
+        except FileNotFoundError:
+            return False
+
+    @staticmethod
+    def _read_meta(directory: str) -> dict:
+        try:
+            with open(os.path.join(directory, 'meta.json')) as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {'length': 0, 'complete': False}
+
+    @staticmethod
+    def _write_meta(directory: str, meta: dict) -> None:
+        # Replace atomically so readers see either the old or the new length
+        temporary = os.path.join(directory, 'meta.json.tmp')
+        with open(temporary, 'w') as file:
+            json.dump(meta, file)
+        os.replace(temporary, os.path.join(directory, 'meta.json'))
+
+    @staticmethod
+    def _read_rows(directory: str, name: str, start: int, end: int) -> np.ndarray:
+        dtype = DTYPES[name]
+        if end <= start:
+            return np.empty(0, dtype=dtype)
+        return np.fromfile(os.path.join(directory, name), dtype=dtype, count=end - start, offset=start * dtype.itemsize)
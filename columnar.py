@@ -0,0 +1,93 @@
+"""
+Columnar binary wire format for SmartChart
+
+Layout (all numbers little-endian):
+    4 bytes   magic b'SCC1'
+    4 bytes   uint32 length of the JSON header
+    n bytes   JSON header, padded with spaces so the body starts on an 8-byte boundary
+    body      column buffers, each starting on an 8-byte boundary
+
+The header holds the response metadata plus a 'columns' list with name,
+dtype ('int64' or 'float64'), offset (from the start of the body) and length
+of each column. Missing values in float64 columns are NaN.
+"""
+
+import json
+import struct
+import numpy as np
+from typing import Dict, Tuple
+
+MAGIC = b'SCC1'
+MEDIA_TYPE = 'application/vnd.smartchart.columnar'
+
+_DTYPES = {
+    'int64': np.dtype('<i8'),
+    'float64': np.dtype('<f8')
+}
+
+
+def flatten_columns(result, prefix: str = '') -> Dict[str, np.ndarray]:
+    """Flatten a dict of arrays (possibly nested) to 'parent.child' column names"""
+    columns = {}
+    for key, value in result.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            columns.update(flatten_columns(value, f"{name}."))
+        else:
+            columns[name] = value
+    return columns
+
+
+def unflatten_columns(columns: Dict[str, np.ndarray]) -> dict:
+    """Inverse of flatten_columns: rebuild nested dicts from 'parent.child' column names"""
+    result = {}
+    for name, values in columns.items():
+        *parents, key = name.split('.')
+        target = result
+        for parent in parents:
+            target = target.setdefault(parent, {})
+        target[key] = values
+    return result
+
+
+def encode_columnar(meta: dict, columns: Dict[str, np.ndarray]) -> bytes:
+    """
+    Pack columns into the columnar wire format
+
+    Args:
+        meta: JSON-serializable metadata stored in the header
+        columns: Column name to 1D array (integer arrays are sent as int64, everything else as float64)
+
+    Returns:
+        Encoded payload
+    """
+    buffers = []
+    descriptors = []
+    offset = 0
+    for name, values in columns.items():
+        values = np.asarray(values)
+        dtype = 'int64' if np.issubdtype(values.dtype, np.integer) else 'float64'
+        data = np.ascontiguousarray(values, dtype=_DTYPES[dtype]).tobytes()
+        descriptors.append({'name': name, 'dtype': dtype, 'offset': offset, 'length': len(values)})
+        buffers.append(data)
+        offset += len(data)  # Always a multiple of 8
+
+    header = json.dumps({**meta, 'columns': descriptors}).encode('utf-8')
+    header += b' ' * (-(8 + len(header)) % 8)
+    return b''.join([MAGIC, struct.pack('<I', len(header)), header] + buffers)
+
+
+def decode_columnar(payload: bytes) -> Tuple[dict, Dict[str, np.ndarray]]:
+    """Unpack a columnar payload into (header, columns); columns are read-only views of payload"""
+    if payload[:4] != MAGIC:
+        raise ValueError("Not a columnar payload")
+    (header_length,) = struct.unpack_from('<I', payload, 4)
+    body_start = 8 + header_length
+    header = json.loads(payload[8:body_start])
+
+    columns = {}
+    for column in header['columns']:
+        columns[column['name']] = np.frombuffer(
+            payload, dtype=_DTYPES[column['dtype']], count=column['length'], offset=body_start + column['offset']
+        )
+    return header, columns
@@ -0,0 +1,222 @@
+"""
+Local stand-in for the Bybit market API, for running and benchmarking the sync offline
+
+Serves /v5/market/kline and /v5/market/tickers with deterministic synthetic
+data: the same symbol, interval and open time always give the same candle, so
+repeated runs are comparable. Latency, HTTP 429s and malformed JSON can be
+injected, and an optional request quota is reported in Bybit's rate limit
+headers (X-Bapi-Limit, X-Bapi-Limit-Status, X-Bapi-Limit-Reset-Timestamp).
+
+Usage:
+    python fake_bybit.py --port 8081 --symbols 50 --days 30
+    python fake_bybit.py --latency 0.05 --error-rate 0.01 --malformed-rate 0.01 --quota 600
+
+Point the sync at it with: python sync_all_data.py --api-url http://localhost:8081
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+import zlib
+import numpy as np
+from aiohttp import web
+from typing import List, Optional
+from resample import bucket_floor, parse_timeframe
+
+# Most candles Bybit returns per kline request, and the default without limit
+MAX_LIMIT = 1000
+DEFAULT_LIMIT = 200
+
+
+def synthetic_symbols(count: int) -> List[str]:
+    """BTCUSDT, ETHUSDT, ... followed by generated names"""
+    known = ['BTCUSDT', 'ETHUSDT', 'SOLUSDT', 'XRPUSDT', 'DOGEUSDT', 'BNBUSDT', 'ADAUSDT', 'AVAXUSDT']
+    return (known + [f"SYN{i:04d}USDT" for i in range(count)])[:count]
+
+
+def _noise(values: np.ndarray, seed: int) -> np.ndarray:
+    """Deterministic pseudo random numbers in [0, 1) per value"""
+    return np.modf(np.abs(np.sin(values * 12.9898 + seed) * 43758.5453))[0]
+
+
+class FakeBybit:
+    """
+    Synthetic market data and fault injection
+
+    Candles exist from `days` before `now` up to the forming candle at `now`.
+    With now=None the clock runs, so new candles keep appearing as they would
+    on the real API.
+    """
+
+    def __init__(self, symbols: List[str], days: float = 30, now: Optional[float] = None,
+                 latency: float = 0.0, error_rate: float = 0.0, malformed_rate: float = 0.0,
+                 quota: Optional[int] = None, quota_window: float = 5.0, seed: int = 1):
+        self.symbols = symbols
+        self.days = days
+        self.fixed_now = now
+        self.latency = latency
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self.quota = quota
+        self.quota_window = quota_window
+        self.random = random.Random(seed)
+        self.window_start = time.time()
+        self.window_requests = 0
+        self.stats = {'requests': 0, 'candles': 0, 'errors': 0, 'malformed': 0, 'throttled': 0}
+
+    def now(self) -> float:
+        return self.fixed_now if self.fixed_now is not None else time.time()
+
+    def candles(self, symbol: str, interval: str, start: Optional[int], end: Optional[int], limit: int) -> list:
+        """Kline list as Bybit returns it: newest first, every value a string"""
+        seconds = parse_timeframe(interval)
+        now = self.now()
+        first = int(bucket_floor(int(now - self.days * 86400), seconds))
+        last = int(bucket_floor(int(now), seconds))
+        if end is not None:
+            last = min(last, int(bucket_floor(end // 1000, seconds)))
+        if start is not None:
+            # The first `limit` candles from start onwards
+            lowest = max(first, first + -(-(start // 1000 - first) // seconds) * seconds)
+            times = np.arange(lowest, min(last, lowest + (limit - 1) * seconds) + 1, seconds, dtype=np.int64)
+        else:
+            times = np.arange(max(first, last - (limit - 1) * seconds), last + 1, seconds, dtype=np.int64)
+
+        seed = zlib.crc32(symbol.encode())
+        open_ = self._price(seed, times)
+        close = self._price(seed, np.minimum(times + seconds, int(now)))
+        spread = 0.002 * np.sqrt(seconds / 60)
+        high = np.maximum(open_, close) * (1 + spread * _noise(times, seed + 1))
+        low = np.minimum(open_, close) * (1 - spread * _noise(times, seed + 2))
+        volume = (seconds / 60) * (1 + 100 * _noise(times, seed + 3))
+        turnover = volume * (open_ + close) / 2
+        self.stats['candles'] += len(times)
+        return [[str(t * 1000), f"{o:.6f}", f"{h:.6f}", f"{l:.6f}", f"{c:.6f}", f"{v:.3f}", f"{q:.4f}"]
+                for t, o, h, l, c, v, q in zip(times.tolist(), open_, high, low, close, volume, turnover)][::-1]
+
+    def tickers(self) -> list:
+        tickers = []
+        for rank, symbol in enumerate(self.symbols):
+            seed = zlib.crc32(symbol.encode())
+            price = float(self._price(seed, np.array([int(self.now())]))[0])
+            tickers.append({
+                'symbol': symbol, 'lastPrice': f"{price:.6f}", 'markPrice': f"{price:.6f}",
+                'indexPrice': f"{price:.6f}", 'prevPrice24h': f"{price:.6f}", 'price24hPcnt': '0',
+                'highPrice24h': f"{price * 1.02:.6f}", 'lowPrice24h': f"{price * 0.98:.6f}",
+                'turnover24h': str(10 ** 9 // (rank + 1)), 'volume24h': str(10 ** 6 // (rank + 1)),
+                'openInterest': '0', 'openInterestValue': '0', 'fundingRate': '0.0001',
+                'nextFundingTime': str(int(self.now() // 28800 + 1) * 28800000), 'bid1Price': f"{price:.6f}",
+                'bid1Size': '1', 'ask1Price': f"{price:.6f}", 'ask1Size': '1', 'basis': ''
+            })
+        return tickers
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/v5/market/kline', self.handle_kline)
+        app.router.add_get('/v5/market/tickers', self.handle_tickers)
+        return app
+
+    async def handle_kline(self, request: web.Request) -> web.Response:
+        query = request.query
+        injected = await self._inject()
+        if injected is not None:
+            return injected
+        symbol = query.get('symbol', '')
+        interval = query.get('interval', '')
+        if symbol not in self.symbols or parse_timeframe(interval) is None:
+            return self._reply({'retCode': 10001, 'retMsg': 'params error', 'result': {}, 'time': int(time.time() * 1000)})
+        limit = min(int(query.get('limit', DEFAULT_LIMIT)), MAX_LIMIT)
+        start = int(query['start']) if 'start' in query else None
+        end = int(query['end']) if 'end' in query else None
+        result = {'category': 'linear', 'symbol': symbol, 'list': self.candles(symbol, interval, start, end, limit)}
+        return self._reply({'retCode': 0, 'retMsg': 'OK', 'result': result, 'time': int(time.time() * 1000)})
+
+    async def handle_tickers(self, request: web.Request) -> web.Response:
+        injected = await self._inject()
+        if injected is not None:
+            return injected
+        result = {'category': 'linear', 'list': self.tickers()}
+        return self._reply({'retCode': 0, 'retMsg': 'OK', 'result': result, 'time': int(time.time() * 1000)})
+
+    async def _inject(self) -> Optional[web.Response]:
+        """Latency, quota and random faults for one request (a response replaces the real one)"""
+        self.stats['requests'] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency * (0.5 + self.random.random()))
+
+        if self.quota is not None:
+            now = time.time()
+            if now - self.window_start >= self.quota_window:
+                self.window_start = now
+                self.window_requests = 0
+            self.window_requests += 1
+            if self.window_requests > self.quota:
+                self.stats['throttled'] += 1
+                return self._reply({'retCode': 10006, 'retMsg': 'Too many visits!', 'result': {}}, status=429)
+
+        if self.random.random() < self.error_rate:
+            self.stats['errors'] += 1
+            return self._reply({'retCode': 10006, 'retMsg': 'Too many visits!', 'result': {}}, status=429)
+        if self.random.random() < self.malformed_rate:
+            self.stats['malformed'] += 1
+            return web.Response(text='{"retCode":0,"retMsg":"OK","result":{"list":[["17', content_type='application/json')
+        return None
+
+    def _reply(self, body: dict, status: int = 200) -> web.Response:
+        headers = {}
+        if self.quota is not None:
+            headers = {
+                'X-Bapi-Limit': str(self.quota),
+                'X-Bapi-Limit-Status': str(max(self.quota - self.window_requests, 0)),
+                'X-Bapi-Limit-Reset-Timestamp': str(int((self.window_start + self.quota_window) * 1000))
+            }
+        return web.Response(text=json.dumps(body), status=status, headers=headers, content_type='application/json')
+
+    @staticmethod
+    def _price(seed: int, times: np.ndarray) -> np.ndarray:
+        """Smooth waves per symbol with a little noise, always positive"""
+        base = 0.1 + (seed % 100000) / 10
+        phase = seed % 1000
+        t = times.astype(np.float64)
+        wave = 0.3 * np.sin(t / (86400 * 11) + phase) + 0.08 * np.sin(t / 7200 + phase / 3)
+        return base * (1.5 + wave + 0.004 * (_noise(t, seed) - 0.5))
+
+
+async def start_server(fake: FakeBybit, host: str = '127.0.0.1', port: int = 0):
+    """
+    Serve fake in the running event loop
+
+    Returns:
+        Tuple of (runner, base URL); call runner.cleanup() to stop
+    """
+    runner = web.AppRunner(fake.app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    return runner, f"http://{host}:{runner.addresses[0][1]}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local stand-in for the Bybit market API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--symbols', type=int, default=50, help="Number of USDT perpetuals")
+    parser.add_argument('--days', type=float, default=30, help="Days of history per symbol")
+    parser.add_argument('--latency', type=float, default=0.0, help="Mean response delay in seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Share of requests answered with 429")
+    parser.add_argument('--malformed-rate', type=float, default=0.0, help="Share of requests answered with broken JSON")
+    parser.add_argument('--quota', type=int, help="Requests allowed per quota window (reported in rate limit headers)")
+    parser.add_argument('--quota-window', type=float, default=5.0, help="Quota window in seconds")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    fake = FakeBybit(synthetic_symbols(args.symbols), days=args.days, latency=args.latency,
+                     error_rate=args.error_rate, malformed_rate=args.malformed_rate,
+                     quota=args.quota, quota_window=args.quota_window, seed=args.seed)
+    web.run_app(fake.app(), host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
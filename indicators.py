@@ -1,10 +1,598 @@
 """
 Technical indicators library for SmartChart
 All indicators implemented from scratch without external libraries
+
+The list-based calculate_* functions are thin wrappers around an array engine
+(the *_array functions) that works on float64 NumPy arrays and pads warm-up
+periods with NaN. The array functions operate along the last axis, so a 2D
+array of closes (one row per symbol) is handled in a single call.
 """
 
 import numpy as np
-from typing import List, Dict, Tuple, Optional
+from collections import deque
+from typing import List, Dict, Tuple, Optional, Union
+
+# Block length used when running EMA-style recursions as matrix products
+_SCAN_BLOCK = 64
+
+
+def _as_array(prices) -> np.ndarray:
+    """Convert a list or array of prices to a float64 array (no copy if already float64)"""
+    return np.asarray(prices, dtype=np.float64)
+
+
+def to_json_list(values: np.ndarray) -> List[Optional[float]]:
+    """Convert a NaN-padded array to a list with None for missing values"""
+    values = _as_array(values)
+    result = values.astype(object)
+    result[np.isnan(values)] = None
+    return result.tolist()
+
+
+def to_json_safe(result: Union[np.ndarray, Dict[str, np.ndarray]]):
+    """Convert an array result (or dict of array results) to JSON-safe lists"""
+    if isinstance(result, dict):
+        return {key: to_json_safe(value) for key, value in result.items()}
+    return to_json_list(result)
+
+
+def slice_result(result, start: Optional[int] = None, stop: Optional[int] = None):
+    """Slice an array result (or dict of array results) along the last axis"""
+    if isinstance(result, dict):
+        return {key: slice_result(value, start, stop) for key, value in result.items()}
+    return result[..., start:stop]
+
+
+def concat_results(first, second):
+    """Join two array results (or dicts of array results) along the last axis"""
+    if isinstance(first, dict):
+        return {key: concat_results(first[key], second[key]) for key in first}
+    return np.concatenate([first, second], axis=-1)
+
+
+def _ewm_scan(values: np.ndarray, alpha: float, initial) -> np.ndarray:
+    """
+    Run y[t] = y[t-1] + alpha * (values[t] - y[t-1]) along the last axis
+
+    The series is split into blocks; each block's response to its own inputs is
+    a single matrix product and only the carry between blocks is sequential.
+
+    Args:
+        values: Input array
+        alpha: Smoothing factor (2 / (period + 1) for EMA, 1 / period for Wilder)
+        initial: Value of y before values[0] (scalar or one per row)
+
+    Returns:
+        Array of the same shape as values
+    """
+    n = values.shape[-1]
+    if n == 0:
+        return np.empty(values.shape)
+
+    decay = 1.0 - alpha
+    block = min(_SCAN_BLOCK, n)
+    n_blocks = -(-n // block)
+    pad = n_blocks * block - n
+    if pad:
+        values = np.concatenate([values, np.zeros(values.shape[:-1] + (pad,))], axis=-1)
+    blocks = values.reshape(values.shape[:-1] + (n_blocks, block))
+
+    # weights[i, j] = decay^(i - j) for j <= i
+    steps = np.arange(block)
+    lag = steps[:, None] - steps[None, :]
+    weights = np.where(lag >= 0, decay ** np.maximum(lag, 0), 0.0)
+    local = alpha * (blocks @ weights.T)
+    carry = decay ** (steps + 1)
+
+    out = np.empty_like(local)
+    prev = np.asarray(initial, dtype=np.float64)
+    for k in range(n_blocks):
+        out[..., k, :] = local[..., k, :] + prev[..., None] * carry
+        prev = out[..., k, -1]
+
+    return out.reshape(values.shape)[..., :n]
+
+
+def ema_array(prices, period: int) -> np.ndarray:
+    """
+    Calculate EMA over the last axis, seeded with the SMA of the first period
+
+    Args:
+        prices: Array of prices
+        period: Number of periods for EMA
+
+    Returns:
+        Array of EMA values (NaN where EMA cannot be calculated)
+    """
+    prices = _as_array(prices)
+    ema = np.full(prices.shape, np.nan)
+    if prices.shape[-1] < period:
+        return ema
+
+    seed = prices[..., :period].sum(axis=-1) / period
+    ema[..., period - 1] = seed
+    ema[..., period:] = _ewm_scan(prices[..., period:], 2 / (period + 1), seed)
+    return ema
+
+
+def macd_array(prices,
+               fast_period: int = 12,
+               slow_period: int = 26,
+               signal_period: int = 9) -> Dict[str, np.ndarray]:
+    """
+    Calculate MACD over the last axis
+
+    Args:
+        prices: Array of closing prices
+        fast_period: Period for the fast EMA (default 12)
+        slow_period: Period for the slow EMA (default 26)
+        signal_period: Period for the signal line (default 9)
+
+    Returns:
+        Dictionary with 'macd', 'signal' and 'histogram' arrays
+    """
+    prices = _as_array(prices)
+    macd_line = ema_array(prices, fast_period) - ema_array(prices, slow_period)
+
+    # Signal is an EMA of the MACD line starting at its first defined value
+    signal_line = np.full(prices.shape, np.nan)
+    start = max(fast_period, slow_period) - 1
+    if start < prices.shape[-1]:
+        signal_line[..., start:] = ema_array(macd_line[..., start:], signal_period)
+
+    return {
+        'macd': macd_line,
+        'signal': signal_line,
+        'histogram': macd_line - signal_line
+    }
+
+
+def _rsi_from_averages(avg_gain: np.ndarray, avg_loss: np.ndarray) -> np.ndarray:
+    """RSI from average gain/loss, 100 where there are no losses"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(avg_loss == 0, 100.0, 100 - (100 / (1 + avg_gain / avg_loss)))
+
+
+def rsi_array(prices, period: int = 14) -> np.ndarray:
+    """
+    Calculate RSI with Wilder's smoothing over the last axis
+
+    Args:
+        prices: Array of closing prices
+        period: Number of periods (default 14)
+
+    Returns:
+        Array of RSI values (NaN for the first period values)
+    """
+    prices = _as_array(prices)
+    n = prices.shape[-1]
+    rsi = np.full(prices.shape, np.nan)
+    if n < period + 1:
+        return rsi
+
+    deltas = np.diff(prices, axis=-1)
+    gains = np.where(deltas > 0, deltas, 0.0)
+    losses = np.where(deltas < 0, -deltas, 0.0)
+
+    # First average is a plain mean, then Wilder's smoothing (alpha = 1 / period)
+    shape = prices.shape[:-1] + (n - period,)
+    avg_gain = np.empty(shape)
+    avg_loss = np.empty(shape)
+    avg_gain[..., 0] = gains[..., :period].sum(axis=-1) / period
+    avg_loss[..., 0] = losses[..., :period].sum(axis=-1) / period
+    avg_gain[..., 1:] = _ewm_scan(gains[..., period:], 1 / period, avg_gain[..., 0])
+    avg_loss[..., 1:] = _ewm_scan(losses[..., period:], 1 / period, avg_loss[..., 0])
+
+    rsi[..., period:] = _rsi_from_averages(avg_gain, avg_loss)
+    return rsi
+
+
+def dual_ema_array(prices, period1: int = 50, period2: int = 200) -> Dict[str, np.ndarray]:
+    """
+    Calculate dual EMA lines (50 and 200 period) over the last axis
+
+    Args:
+        prices: Array of closing prices
+        period1: First EMA period (default 50)
+        period2: Second EMA period (default 200)
+
+    Returns:
+        Dictionary with 'ema50' and 'ema200' arrays
+    """
+    prices = _as_array(prices)
+    return {
+        'ema50': ema_array(prices, period1),
+        'ema200': ema_array(prices, period2)
+    }
+
+
+def rolling_sum(values, window: int) -> np.ndarray:
+    """
+    Sum of every full window along the last axis using a cumulative sum
+
+    Args:
+        values: Input array
+        window: Window length
+
+    Returns:
+        Array with n - window + 1 values along the last axis (entry k is the sum of values[k:k + window])
+    """
+    values = _as_array(values)
+    csum = np.cumsum(values, axis=-1)
+    sums = csum[..., window - 1:].copy()
+    sums[..., 1:] -= csum[..., :-window]
+    return sums
+
+
+class RollingWindow:
+    """
+    Fixed-length window with running mean and variance
+
+    Each push is O(1): the new value is added and the value that falls out of
+    the window is removed using Welford's update. None entries take up a slot
+    in the window but are left out of the statistics.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.values = deque()
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def push(self, value: Optional[float]) -> None:
+        """Append a value, dropping the oldest one once the window is full"""
+        self.values.append(value)
+        if value is not None:
+            self.count += 1
+            delta = value - self.mean
+            self.mean += delta / self.count
+            self._m2 += delta * (value - self.mean)
+
+        if len(self.values) > self.size:
+            old = self.values.popleft()
+            if old is not None:
+                self.count -= 1
+                if self.count == 0:
+                    self.mean = 0.0
+                    self._m2 = 0.0
+                else:
+                    delta = old - self.mean
+                    self.mean -= delta / self.count
+                    self._m2 -= delta * (old - self.mean)
+
+    @property
+    def full(self) -> bool:
+        return len(self.values) == self.size
+
+    @property
+    def sum(self) -> float:
+        return self.mean * self.count
+
+    @property
+    def variance(self) -> Optional[float]:
+        """Population variance of the values in the window"""
+        if self.count == 0:
+            return None
+        return max(self._m2, 0.0) / self.count
+
+    @property
+    def std(self) -> Optional[float]:
+        variance = self.variance
+        return None if variance is None else variance ** 0.5
+
+
+def rolling_variance(values, window: int) -> np.ndarray:
+    """
+    Population variance of every full window along the last axis in linear time
+
+    Values are centred on the mean of their block of `window` values, so the
+    sums stay small however far the series drifts. A window covers the end of
+    one block and the start of the next; the variance of each part comes from
+    block-local cumulative sums and the parts are combined with Chan's pairwise
+    update, so the deviations are taken around the window's own mean.
+
+    Args:
+        values: Input array
+        window: Window length
+
+    Returns:
+        Array with n - window + 1 values along the last axis (entry k is the variance of values[k:k + window])
+    """
+    values = _as_array(values)
+    n = values.shape[-1]
+    blocks = -(-n // window)
+    # Pad the last block with the last value, windows ending in the padding are not returned
+    padding = np.repeat(values[..., -1:], blocks * window - n, axis=-1)
+    grouped = np.concatenate([values, padding], axis=-1).reshape(values.shape[:-1] + (blocks, window))
+    means = grouped.mean(axis=-1, keepdims=True)
+    centred = grouped - means
+    sum1 = np.cumsum(centred, axis=-1)
+    sum2 = np.cumsum(centred * centred, axis=-1)
+
+    # Per position: prefix sums within its block, the block's totals and the block mean
+    flat = values.shape[:-1] + (blocks * window,)
+    prefix1, prefix2 = sum1.reshape(flat), sum2.reshape(flat)
+    total1 = np.broadcast_to(sum1[..., -1:], grouped.shape).reshape(flat)
+    total2 = np.broadcast_to(sum2[..., -1:], grouped.shape).reshape(flat)
+    block_mean = np.broadcast_to(means, grouped.shape).reshape(flat)
+
+    ends = np.arange(window - 1, n)
+    previous = np.maximum(ends - window, 0)
+    head = ends % window + 1  # Values in the window's last block
+    tail = window - head  # Values at the end of the block before it
+
+    # Start of the last block
+    head_sum = prefix1[..., ends]
+    head_mean = head_sum / head
+    head_m2 = prefix2[..., ends] - head_sum * head_mean
+
+    # End of the previous block (nothing when the window is a whole block)
+    has_tail = tail > 0
+    tail_sum = np.where(has_tail, total1[..., previous] - prefix1[..., previous], 0.0)
+    tail_mean = tail_sum / np.maximum(tail, 1)
+    tail_m2 = np.where(has_tail, total2[..., previous] - prefix2[..., previous] - tail_sum * tail_mean, 0.0)
+
+    delta = np.where(has_tail, block_mean[..., previous] - block_mean[..., ends] + tail_mean - head_mean, 0.0)
+    m2 = head_m2 + tail_m2 + delta * delta * head * tail / window
+    return np.maximum(m2, 0.0) / window
+
+
+def sma_array(prices, period: int) -> np.ndarray:
+    """
+    Calculate SMA over the last axis in linear time
+
+    Args:
+        prices: Array of prices
+        period: Number of periods
+
+    Returns:
+        Array of SMA values (NaN for the first period - 1 values)
+    """
+    prices = _as_array(prices)
+    sma = np.full(prices.shape, np.nan)
+    if prices.shape[-1] < period:
+        return sma
+
+    # Sum relative to the first price to keep the cumulative sum small
+    base = prices[..., :1]
+    sma[..., period - 1:] = rolling_sum(prices - base, period) / period + base
+    return sma
+
+
+def bollinger_bands_array(prices, period: int = 20, std_dev: float = 2.0) -> Dict[str, np.ndarray]:
+    """
+    Calculate Bollinger Bands over the last axis in linear time
+
+    Args:
+        prices: Array of closing prices
+        period: Period for the moving average (default 20)
+        std_dev: Number of standard deviations (default 2.0)
+
+    Returns:
+        Dictionary with 'upper', 'middle' and 'lower' arrays
+    """
+    prices = _as_array(prices)
+    upper = np.full(prices.shape, np.nan)
+    middle = np.full(prices.shape, np.nan)
+    lower = np.full(prices.shape, np.nan)
+    if prices.shape[-1] < period:
+        return {'upper': upper, 'middle': middle, 'lower': lower}
+
+    # Population std of each window around its own mean
+    std = np.sqrt(rolling_variance(prices, period))
+
+    middle[..., period - 1:] = sma_array(prices, period)[..., period - 1:]
+    upper[..., period - 1:] = middle[..., period - 1:] + std_dev * std
+    lower[..., period - 1:] = middle[..., period - 1:] - std_dev * std
+    return {'upper': upper, 'middle': middle, 'lower': lower}
+
+
+def _percentage_changes(prices: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Absolute percentage change per candle and a mask of where it is defined (previous price > 0)"""
+    previous = prices[..., :-1]
+    valid = previous > 0
+    safe_previous = np.where(valid, previous, 1.0)
+    changes = np.where(valid, np.abs((prices[..., 1:] - previous) / safe_previous) * 100, 0.0)
+    return changes, valid
+
+
+def volatility_array(prices, period: int = 200) -> np.ndarray:
+    """
+    Calculate the average absolute percentage change over the last axis in linear time
+
+    Args:
+        prices: Array of closing prices
+        period: Number of periods for calculation (default 200)
+
+    Returns:
+        Array of volatility values (NaN for the first period values)
+    """
+    prices = _as_array(prices)
+    volatility = np.full(prices.shape, np.nan)
+    if prices.shape[-1] < period + 1:
+        return volatility
+
+    changes, valid = _percentage_changes(prices)
+    totals = rolling_sum(changes, period)
+    counts = rolling_sum(valid.astype(np.float64), period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        volatility[..., period:] = np.where(counts > 0, totals / np.maximum(counts, 1.0), np.nan)
+    return volatility
+
+
+# ---------------------------------------------------------------------------
+# Streaming state
+#
+# Each state object is advanced over new prices and returns the same values
+# the matching *_array function would return for those positions if it were
+# run over the whole history. A state can be kept after the last closed candle
+# and copied (copy.deepcopy) to evaluate a candle that is still forming.
+# ---------------------------------------------------------------------------
+
+class EMAState:
+    """Resumable EMA, seeded with the SMA of the first period prices"""
+
+    def __init__(self, period: int):
+        self.period = period
+        self.value: Optional[float] = None
+        self._warmup: List[float] = []
+
+    def advance(self, prices) -> np.ndarray:
+        """Advance over new prices and return their EMA values (NaN during warm-up)"""
+        prices = _as_array(prices)
+        ema = np.full(prices.shape, np.nan)
+
+        i = 0
+        while self.value is None and i < len(prices):
+            self._warmup.append(float(prices[i]))
+            if len(self._warmup) == self.period:
+                self.value = sum(self._warmup) / self.period
+                self._warmup = []
+                ema[i] = self.value
+            i += 1
+
+        if i < len(prices):
+            ema[i:] = _ewm_scan(prices[i:], 2 / (self.period + 1), self.value)
+            self.value = float(ema[-1])
+        return ema
+
+
+class MACDState:
+    """Resumable MACD, the signal line starts at the first defined MACD value"""
+
+    def __init__(self, fast_period: int = 12, slow_period: int = 26, signal_period: int = 9):
+        self.fast = EMAState(fast_period)
+        self.slow = EMAState(slow_period)
+        self.signal = EMAState(signal_period)
+
+    def advance(self, prices) -> Dict[str, np.ndarray]:
+        """Advance over new prices and return their 'macd', 'signal' and 'histogram' values"""
+        prices = _as_array(prices)
+        macd_line = self.fast.advance(prices) - self.slow.advance(prices)
+
+        signal_line = np.full(prices.shape, np.nan)
+        defined = np.flatnonzero(~np.isnan(macd_line))
+        if defined.size:
+            start = defined[0]
+            signal_line[start:] = self.signal.advance(macd_line[start:])
+
+        return {
+            'macd': macd_line,
+            'signal': signal_line,
+            'histogram': macd_line - signal_line
+        }
+
+
+class DualEMAState:
+    """Resumable dual EMA lines (50 and 200 period)"""
+
+    def __init__(self, period1: int = 50, period2: int = 200):
+        self.ema50 = EMAState(period1)
+        self.ema200 = EMAState(period2)
+
+    def advance(self, prices) -> Dict[str, np.ndarray]:
+        """Advance over new prices and return their 'ema50' and 'ema200' values"""
+        prices = _as_array(prices)
+        return {
+            'ema50': self.ema50.advance(prices),
+            'ema200': self.ema200.advance(prices)
+        }
+
+
+class RSIState:
+    """Resumable RSI with Wilder's smoothing"""
+
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.last_price: Optional[float] = None
+        self.avg_gain: Optional[float] = None
+        self.avg_loss: Optional[float] = None
+        self._gains: List[float] = []
+        self._losses: List[float] = []
+
+    def advance(self, prices) -> np.ndarray:
+        """Advance over new prices and return their RSI values (NaN during warm-up)"""
+        prices = _as_array(prices)
+        rsi = np.full(prices.shape, np.nan)
+        if len(prices) == 0:
+            return rsi
+
+        head = prices if self.last_price is None else np.concatenate([[self.last_price], prices])
+        deltas = np.diff(head)
+        # The very first price has no delta, so deltas[k] belongs to prices[k + offset]
+        offset = len(prices) - len(deltas)
+        gains = np.where(deltas > 0, deltas, 0.0)
+        losses = np.where(deltas < 0, -deltas, 0.0)
+
+        i = 0
+        while self.avg_gain is None and i < len(deltas):
+            self._gains.append(float(gains[i]))
+            self._losses.append(float(losses[i]))
+            if len(self._gains) == self.period:
+                self.avg_gain = sum(self._gains) / self.period
+                self.avg_loss = sum(self._losses) / self.period
+                self._gains = []
+                self._losses = []
+                rsi[offset + i] = _rsi_from_averages(np.float64(self.avg_gain), np.float64(self.avg_loss))
+            i += 1
+
+        if i < len(deltas):
+            avg_gain = _ewm_scan(gains[i:], 1 / self.period, self.avg_gain)
+            avg_loss = _ewm_scan(losses[i:], 1 / self.period, self.avg_loss)
+            rsi[offset + i:] = _rsi_from_averages(avg_gain, avg_loss)
+            self.avg_gain = float(avg_gain[-1])
+            self.avg_loss = float(avg_loss[-1])
+
+        self.last_price = float(prices[-1])
+        return rsi
+
+
+class VolatilityState:
+    """Resumable volatility over a rolling window of absolute percentage changes"""
+
+    def __init__(self, period: int = 200):
+        self.period = period
+        self.last_price: Optional[float] = None
+        self.window = RollingWindow(period)
+
+    def advance(self, prices) -> np.ndarray:
+        """Advance over new prices and return their volatility values (NaN during warm-up)"""
+        prices = _as_array(prices)
+        volatility = np.full(prices.shape, np.nan)
+        if len(prices) == 0:
+            return volatility
+
+        head = prices if self.last_price is None else np.concatenate([[self.last_price], prices])
+        changes, valid = _percentage_changes(head)
+        offset = len(prices) - len(changes)
+        self.last_price = float(prices[-1])
+
+        if len(changes) < self.period:
+            # Short tail: O(1) per change through the running window
+            for k in range(len(changes)):
+                self.window.push(float(changes[k]) if valid[k] else None)
+                if self.window.full and self.window.count > 0:
+                    volatility[offset + k] = self.window.mean
+            return volatility
+
+        # Long run: window sums over the previous window plus the new changes, then rebuild the window
+        previous = list(self.window.values)
+        all_changes = np.concatenate([[0.0 if v is None else v for v in previous], changes])
+        all_valid = np.concatenate([[v is not None for v in previous], valid]).astype(bool)
+        totals = rolling_sum(all_changes, self.period)
+        counts = rolling_sum(all_valid.astype(np.float64), self.period)
+
+        # rolling_sum entry k covers all_changes[k:k + period]; keep windows ending on a new change
+        first = max(0, len(previous) - self.period + 1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values = np.where(counts[first:] > 0, totals[first:] / np.maximum(counts[first:], 1.0), np.nan)
+        volatility[len(volatility) - len(values):] = values
+
+        self.window = RollingWindow(self.period)
+        for change, is_valid in zip(all_changes[-self.period:], all_valid[-self.period:]):
+            self.window.push(float(change) if is_valid else None)
+        return volatility
 
 
 def calculate_ema(prices: List[float], period: int) -> List[Optional[float]]:
@@ -18,23 +606,7 @@ def calculate_ema(prices: List[float], period: int) -> List[Optional[float]]:
     Returns:
         List of EMA values (None for periods where EMA cannot be calculated)
     """
-    if len(prices) < period:
-        return [None] * len(prices)
-    
-    ema = [None] * (period - 1)
-    
-    # First EMA value is SMA for first period
-    sma = sum(prices[:period]) / period
-    ema.append(sma)
-    
-    # EMA formula: (Price - Previous_EMA) * multiplier + Previous_EMA
-    multiplier = 2 / (period + 1)
-    
-    for i in range(period, len(prices)):
-        ema_value = (prices[i] - ema[i-1]) * multiplier + ema[i-1]
-        ema.append(ema_value)
-    
-    return ema
+    return to_json_list(ema_array(prices, period))
 
 
 def calculate_macd(prices: List[float], 
@@ -53,48 +625,7 @@ def calculate_macd(prices: List[float],
     Returns:
         Dictionary med 'macd', 'signal', och 'histogram' listor
     """
-    # Beräkna EMAs
-    ema_fast = calculate_ema(prices, fast_period)
-    ema_slow = calculate_ema(prices, slow_period)
-    
-    # Beräkna MACD-linjen (fast EMA - slow EMA)
-    macd_line = []
-    for i in range(len(prices)):
-        if ema_fast[i] is not None and ema_slow[i] is not None:
-            macd_line.append(ema_fast[i] - ema_slow[i])
-        else:
-            macd_line.append(None)
-    
-    # Beräkna signal-linjen (EMA av MACD)
-    # Ta bort None-värden för signal-beräkning
-    macd_values_for_signal = [x for x in macd_line if x is not None]
-    signal_ema = calculate_ema(macd_values_for_signal, signal_period)
-    
-    # Sätt tillbaka signal-värden på rätt position
-    signal_line = []
-    signal_idx = 0
-    for i in range(len(macd_line)):
-        if macd_line[i] is None:
-            signal_line.append(None)
-        elif signal_idx < len(signal_ema):
-            signal_line.append(signal_ema[signal_idx])
-            signal_idx += 1
-        else:
-            signal_line.append(None)
-    
-    # Beräkna histogram (MACD - Signal)
-    histogram = []
-    for i in range(len(prices)):
-        if macd_line[i] is not None and signal_line[i] is not None:
-            histogram.append(macd_line[i] - signal_line[i])
-        else:
-            histogram.append(None)
-    
-    return {
-        'macd': macd_line,
-        'signal': signal_line,
-        'histogram': histogram
-    }
+    return to_json_safe(macd_array(prices, fast_period, slow_period, signal_period))
 
 
 def calculate_rsi(prices: List[float], period: int = 14) -> List[Optional[float]]:
@@ -108,36 +639,7 @@ def calculate_rsi(prices: List[float], period: int = 14) -> List[Optional[float]
     Returns:
         Lista med RSI-värden
     """
-    if len(prices) < period + 1:
-        return [None] * len(prices)
-    
-    rsi = [None] * period
-    
-    # Beräkna prisförändringar
-    deltas = [prices[i] - prices[i-1] for i in range(1, len(prices))]
-    
-    # Separera gains och losses
-    gains = [d if d > 0 else 0 for d in deltas]
-    losses = [-d if d < 0 else 0 for d in deltas]
-    
-    # Första average gain/loss
-    avg_gain = sum(gains[:period]) / period
-    avg_loss = sum(losses[:period]) / period
-    
-    # Beräkna RSI
-    for i in range(period, len(prices)):
-        if avg_loss == 0:
-            rsi.append(100.0)
-        else:
-            rs = avg_gain / avg_loss
-            rsi.append(100 - (100 / (1 + rs)))
-        
-        # Uppdatera average gain/loss (Wilder's smoothing)
-        if i < len(gains):
-            avg_gain = (avg_gain * (period - 1) + gains[i]) / period
-            avg_loss = (avg_loss * (period - 1) + losses[i]) / period
-    
-    return rsi
+    return to_json_list(rsi_array(prices, period))
 
 
 def calculate_bollinger_bands(prices: List[float], 
@@ -154,32 +656,8 @@ def calculate_bollinger_bands(prices: List[float],
     Returns:
         Dictionary med 'upper', 'middle', och 'lower' band
     """
-    if len(prices) < period:
-        none_list = [None] * len(prices)
-        return {'upper': none_list, 'middle': none_list, 'lower': none_list}
-    
-    upper = [None] * (period - 1)
-    middle = [None] * (period - 1)
-    lower = [None] * (period - 1)
-    
-    for i in range(period - 1, len(prices)):
-        # Beräkna SMA
-        window = prices[i - period + 1:i + 1]
-        sma = sum(window) / period
-        
-        # Beräkna standardavvikelse
-        variance = sum((x - sma) ** 2 for x in window) / period
-        std = variance ** 0.5
-        
-        middle.append(sma)
-        upper.append(sma + std_dev * std)
-        lower.append(sma - std_dev * std)
-    
-    return {
-        'upper': upper,
-        'middle': middle,
-        'lower': lower
-    }
+    return to_json_safe(bollinger_bands_array(prices, period, std_dev))
+
 
 
 def calculate_sma(prices: List[float], period: int) -> List[Optional[float]]:
@@ -193,16 +671,8 @@ def calculate_sma(prices: List[float], period: int) -> List[Optional[float]]:
     Returns:
         Lista med SMA-värden
     """
-    if len(prices) < period:
-        return [None] * len(prices)
-    
-    sma = [None] * (period - 1)
-    
-    for i in range(period - 1, len(prices)):
-        window = prices[i - period + 1:i + 1]
-        sma.append(sum(window) / period)
-    
-    return sma
+    return to_json_list(sma_array(prices, period))
+
 
 
 def calculate_volatility(prices: List[float], period: int = 200) -> List[Optional[float]]:
@@ -216,27 +686,8 @@ def calculate_volatility(prices: List[float], period: int = 200) -> List[Optiona
     Returns:
         List of volatility values
     """
-    if len(prices) < period + 1:
-        return [None] * len(prices)
-    
-    volatility = [None] * period
-    
-    for i in range(period, len(prices)):
-        # Calculate percentage changes for the last 'period' candles
-        percentage_changes = []
-        for j in range(i - period + 1, i + 1):
-            if j > 0 and prices[j-1] > 0:
-                percent_change = ((prices[j] - prices[j-1]) / prices[j-1]) * 100
-                percentage_changes.append(abs(percent_change))  # Use absolute value
-        
-        if percentage_changes:
-            # Calculate average of absolute percentage changes
-            avg_volatility = sum(percentage_changes) / len(percentage_changes)
-            volatility.append(avg_volatility)
-        else:
-            volatility.append(None)
-    
-    return volatility
+    return to_json_list(volatility_array(prices, period))
+
 
 
 def calculate_dual_ema(prices: List[float], period1: int = 50, period2: int = 200) -> Dict[str, List[Optional[float]]]:
@@ -251,13 +702,7 @@ def calculate_dual_ema(prices: List[float], period1: int = 50, period2: int = 20
     Returns:
         Dictionary with 'ema50' and 'ema200' lists
     """
-    ema50 = calculate_ema(prices, period1)
-    ema200 = calculate_ema(prices, period2)
-    
-    return {
-        'ema50': ema50,
-        'ema200': ema200
-    }
+    return to_json_safe(dual_ema_array(prices, period1, period2))
 
 
 # Dictionary to easily access indicators
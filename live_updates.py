@@ -0,0 +1,118 @@
+"""
+Live update fan-out for SmartChart
+Pushes changed candles to every WebSocket client subscribed to a (symbol, timeframe)
+"""
+
+import asyncio
+import json
+from typing import Awaitable, Callable, Dict, Optional, Set, Tuple
+
+Key = Tuple[str, str]
+
+
+class UpdateHub:
+    """
+    Subscriptions per (symbol, timeframe) with one shared computation per key
+
+    notify() marks a key as changed from a time onwards. One task per key calls
+    load_update(key, since) and sends the resulting message to every subscriber,
+    so many viewers of one symbol share a single database read and indicator
+    calculation. Notifications that arrive while a key is being published are
+    coalesced into one more round starting at the oldest change.
+
+    Each client is a bounded queue of encoded messages. A client that falls
+    queue_size messages behind has its queue emptied and gets a 'resync'
+    message, telling it to reload the candles over HTTP.
+    """
+
+    def __init__(self, load_update: Callable[[Key, int], Awaitable[Optional[dict]]], queue_size: int = 100):
+        self.load_update = load_update
+        self.queue_size = queue_size
+        self.subscribers: Dict[Key, Set[asyncio.Queue]] = {}
+        self.pending: Dict[Key, Optional[int]] = {}
+        self.tasks: Dict[Key, asyncio.Task] = {}
+        self.published = 0
+        self.resyncs = 0
+
+    def connect(self) -> asyncio.Queue:
+        """New client queue"""
+        return asyncio.Queue(maxsize=self.queue_size)
+
+    def disconnect(self, client: asyncio.Queue) -> None:
+        """Remove a client from every subscription"""
+        for key in list(self.subscribers):
+            self.unsubscribe(key, client)
+
+    def subscribe(self, key: Key, client: asyncio.Queue) -> None:
+        self.subscribers.setdefault(key, set()).add(client)
+
+    def unsubscribe(self, key: Key, client: asyncio.Queue) -> None:
+        clients = self.subscribers.get(key)
+        if clients is None:
+            return
+        clients.discard(client)
+        if not clients:
+            del self.subscribers[key]
+
+    def send(self, client: asyncio.Queue, message: dict) -> None:
+        """Queue a message for one client"""
+        self._deliver(client, json.dumps(message))
+
+    def notify(self, key: Key, since: Optional[int]) -> None:
+        """
+        Publish candles of key from since (open_time in ms) onwards to its subscribers
+
+        since=None means the whole history may have changed and subscribers are
+        told to resync instead.
+        """
+        if key not in self.subscribers:
+            return
+        if key in self.pending:
+            current = self.pending[key]
+            self.pending[key] = None if current is None or since is None else min(current, since)
+        else:
+            self.pending[key] = since
+        if key not in self.tasks:
+            self.tasks[key] = asyncio.get_running_loop().create_task(self._publish(key))
+
+    def stats(self) -> dict:
+        return {
+            'subscriptions': len(self.subscribers),
+            'clients': len({client for clients in self.subscribers.values() for client in clients}),
+            'publishing': len(self.tasks),
+            'published': self.published,
+            'resyncs': self.resyncs
+        }
+
+    async def _publish(self, key: Key) -> None:
+        try:
+            while key in self.pending:
+                since = self.pending.pop(key)
+                if since is None:
+                    message = {'type': 'resync', 'symbol': key[0], 'timeframe': key[1]}
+                else:
+                    try:
+                        message = await self.load_update(key, since)
+                    except Exception as e:
+                        print(f"Error loading live update for {key[0]} {key[1]}: {e}")
+                        continue
+                if message is None:
+                    continue
+
+                # Encode once for all subscribers
+                text = json.dumps(message)
+                for client in list(self.subscribers.get(key, ())):
+                    self._deliver(client, text)
+                self.published += 1
+        finally:
+            del self.tasks[key]
+
+    def _deliver(self, client: asyncio.Queue, text: str) -> None:
+        try:
+            client.put_nowait(text)
+        except asyncio.QueueFull:
+            # The client is too far behind to catch up with updates, so it has to reload
+            while not client.empty():
+                client.get_nowait()
+            client.put_nowait(json.dumps({'type': 'resync'}))
+            self.resyncs += 1
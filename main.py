@@ -1,17 +1,130 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Query, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response, PlainTextResponse
+from pydantic import BaseModel
 import pymysql
 pymysql.install_as_MySQLdb()
 import MySQLdb as mysql
+import aiomysql
+import asyncio
+from contextlib import asynccontextmanager
 import pandas as pd
+import numpy as np
 from datetime import datetime
+from collections import OrderedDict
+import copy
 import json
 import os
-from indicators import calculate_macd, calculate_volatility, calculate_dual_ema, calculate_rsi
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import List
+from candle_cache import CandleCache
+from candle_store import CandleStore, DEFAULT_ROOT as CANDLE_STORE_ROOT
+from symbol_snapshot import SymbolSnapshot
+from live_updates import UpdateHub
+from workers import WorkerPool, WorkerPoolFull
+from metrics import Histogram, RequestTimer, current_timer, timed, render_metric
+from screener import parse_condition, screen_series, match_conditions, VALUE_FIELDS, EVENT_FIELDS
+from columnar import encode_columnar, flatten_columns, unflatten_columns, MEDIA_TYPE as COLUMNAR_MEDIA_TYPE
+from resample import (
+    aggregate_to_bars, count_signs_per_bar, BAR_AGGREGATIONS, parse_timeframe, nests_in, bucket_floor, resample_ohlcv,
+    merge_candles, lttb_select
+)
+from indicators import (
+    macd_array, volatility_array, dual_ema_array, rsi_array, to_json_safe, slice_result, concat_results,
+    MACDState, VolatilityState, DualEMAState, RSIState
+)
+
+# Connection pool, created at startup and closed at shutdown (see lifespan)
+db_pool = None
+
+# Connection pool settings (override with environment variables)
+DB_POOL_MINSIZE = int(os.environ.get('SMARTCHART_DB_POOL_MINSIZE', 1))
+DB_POOL_MAXSIZE = int(os.environ.get('SMARTCHART_DB_POOL_MAXSIZE', 20))
+DB_POOL_RECYCLE = int(os.environ.get('SMARTCHART_DB_POOL_RECYCLE', 3600))  # Seconds before a connection is reopened
+DB_CONNECT_TIMEOUT = int(os.environ.get('SMARTCHART_DB_CONNECT_TIMEOUT', 10))
+DB_ACQUIRE_TIMEOUT = float(os.environ.get('SMARTCHART_DB_ACQUIRE_TIMEOUT', 5))  # Max wait for a free connection
+
+# Counters for pool saturation
+pool_stats = {
+    'acquired': 0,
+    'waiting': 0,
+    'timeouts': 0,
+    'wait_seconds_total': 0.0
+}
+
+# Worker pools for CPU-bound work, created at startup (see lifespan)
+cpu_workers = None
+batch_workers = None
+
+# Worker settings (override with environment variables)
+CPU_WORKERS = int(os.environ.get('SMARTCHART_CPU_WORKERS', min(4, os.cpu_count() or 1)))  # Threads for NumPy indicator math
+BATCH_WORKERS = int(os.environ.get('SMARTCHART_BATCH_WORKERS', 0))  # Processes for payloads and screener batches, 0 to use the threads
+WORKER_QUEUE_SIZE = int(os.environ.get('SMARTCHART_WORKER_QUEUE_SIZE', 64))  # Tasks waiting per pool before 503
+
+@asynccontextmanager
+async def lifespan(app):
+    global db_pool, cpu_workers, batch_workers
+    # Processes are started before anything else so they fork from a quiet process
+    if BATCH_WORKERS > 0:
+        batch_workers = WorkerPool('batch', ProcessPoolExecutor(BATCH_WORKERS), BATCH_WORKERS, WORKER_QUEUE_SIZE)
+    cpu_workers = WorkerPool('cpu', ThreadPoolExecutor(CPU_WORKERS, thread_name_prefix='smartchart-cpu'),
+                             CPU_WORKERS, WORKER_QUEUE_SIZE)
+    if batch_workers is None:
+        batch_workers = cpu_workers
+    
+    db_pool = await aiomysql.create_pool(
+        host=DB_CONFIG['host'],
+        port=DB_CONFIG['port'],
+        user=DB_CONFIG['user'],
+        password=DB_CONFIG['password'],
+        db=DB_CONFIG['database'],
+        charset=DB_CONFIG['charset'],
+        autocommit=True,
+        minsize=DB_POOL_MINSIZE,
+        maxsize=DB_POOL_MAXSIZE,
+        pool_recycle=DB_POOL_RECYCLE,
+        connect_timeout=DB_CONNECT_TIMEOUT
+    )
+    try:
+        yield
+    finally:
+        db_pool.close()
+        await db_pool.wait_closed()
+        db_pool = None
+        for workers in {cpu_workers, batch_workers}:
+            workers.shutdown()
+        cpu_workers = batch_workers = None
+
+app = FastAPI(lifespan=lifespan)
 
-app = FastAPI()
+# Latency per endpoint and per stage of a request (see metrics.timed)
+request_seconds = Histogram('smartchart_request_seconds', 'Time to handle a request', ('endpoint',))
+stage_seconds = Histogram('smartchart_stage_seconds', 'Time spent per stage of a request', ('endpoint', 'stage'))
+
+# Request header asking for the stage breakdown in a Server-Timing response header
+DEBUG_TIMING_HEADER = 'x-debug-timing'
+
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    """Record request and stage latency, and return the breakdown when asked for"""
+    timer = RequestTimer()
+    token = current_timer.set(timer)
+    try:
+        response = await call_next(request)
+    finally:
+        current_timer.reset(token)
+    
+    route = request.scope.get('route')
+    endpoint = route.path if route is not None else 'unmatched'
+    request_seconds.observe(timer.elapsed, endpoint)
+    for stage, seconds in timer.stages.items():
+        stage_seconds.observe(seconds, endpoint, stage)
+    if DEBUG_TIMING_HEADER in request.headers:
+        response.headers['Server-Timing'] = timer.server_timing()
+    return response
 
 # CORS middleware to allow requests from the browser
 app.add_middleware(
@@ -32,112 +145,804 @@ DB_CONFIG = {
     'charset': 'utf8mb4'
 }
 
-def get_db_connection():
-    """Create database connection"""
-    return pymysql.connect(**DB_CONFIG, cursorclass=pymysql.cursors.DictCursor)
+# Mapping of timeframe to table name
+TIMEFRAME_TABLES = {
+    '1': 'candles1',
+    '5': 'candles5',
+    '15': 'candles15',
+    '60': 'candles60',
+    '240': 'candles240',
+    'D': 'candlesd',
+    'W': 'candlesw'
+}
 
-@app.get("/api/candles/{symbol}")
-async def get_candles(symbol: str, timeframe: str = "60", limit: int = 20000, include_indicators: bool = True):
-    """Fetch candlestick data from the right table based on timeframe"""
-    
-    # Mapping of timeframe to table name
-    timeframe_tables = {
-        '1': 'candles1',
-        '5': 'candles5',
-        '15': 'candles15',
-        '60': 'candles60',
-        '240': 'candles240',
-        'D': 'candlesd',
-        'W': 'candlesw'
-    }
+# Length of one bar per timeframe in seconds
+TIMEFRAME_SECONDS = {
+    '1': 60,
+    '5': 300,
+    '15': 900,
+    '60': 3600,
+    '240': 14400,
+    'D': 86400,
+    'W': 604800
+}
+
+def normalize_timeframe(timeframe):
+    """Canonical name of a timeframe ('1h' -> '60', '1D' -> 'D', '2h' -> '120'), None if invalid"""
+    seconds = parse_timeframe(timeframe)
+    if seconds is None:
+        return None
+    for name, stored_seconds in TIMEFRAME_SECONDS.items():
+        if stored_seconds == seconds:
+            return name
+    if seconds % TIMEFRAME_SECONDS['W'] == 0:
+        return f"{seconds // TIMEFRAME_SECONDS['W']}W"
+    if seconds % TIMEFRAME_SECONDS['D'] == 0:
+        return f"{seconds // TIMEFRAME_SECONDS['D']}D"
+    return str(seconds // 60)
+
+def timeframe_source(timeframe):
+    """Stored timeframe that candles of `timeframe` are built from (the coarsest one that nests)"""
+    if timeframe in TIMEFRAME_TABLES:
+        return timeframe
+    seconds = parse_timeframe(timeframe)
+    candidates = [name for name, stored_seconds in TIMEFRAME_SECONDS.items() if nests_in(stored_seconds, seconds)]
+    return max(candidates, key=TIMEFRAME_SECONDS.get, default=None)
+
+def validate_timeframe(timeframe, name="timeframe"):
+    """Canonical timeframe, or a 400 error if it is invalid or cannot be built from the stored tables"""
+    canonical = normalize_timeframe(timeframe)
+    if canonical is None or timeframe_source(canonical) is None:
+        raise HTTPException(status_code=400, detail=f"Invalid {name}: {timeframe}")
+    return canonical
+
+def timeframe_display(timeframe):
+    """Display name of a canonical timeframe ('60' -> '60m', 'D' -> '1D')"""
+    if timeframe in ('D', 'W'):
+        return f"1{timeframe}"
+    if timeframe.endswith(('D', 'W')):
+        return timeframe
+    return f"{timeframe}m"
+
+@asynccontextmanager
+async def db_cursor():
+    """Dict cursor on a pooled connection, 503 if no connection is free within DB_ACQUIRE_TIMEOUT"""
+    if db_pool is None:
+        raise HTTPException(status_code=503, detail="Database pool not available")
     
-    # Validate timeframe
-    if timeframe not in timeframe_tables:
-        raise HTTPException(status_code=400, detail=f"Invalid timeframe: {timeframe}")
+    pool_stats['waiting'] += 1
+    started = time.perf_counter()
+    try:
+        with timed('db_acquire'):
+            conn = await asyncio.wait_for(db_pool.acquire(), DB_ACQUIRE_TIMEOUT)
+    except asyncio.TimeoutError:
+        pool_stats['timeouts'] += 1
+        print(f"Database pool exhausted ({db_pool.size}/{db_pool.maxsize} connections in use)")
+        raise HTTPException(status_code=503, detail="Database busy, try again")
+    finally:
+        pool_stats['waiting'] -= 1
+        pool_stats['wait_seconds_total'] += time.perf_counter() - started
     
-    table_name = timeframe_tables[timeframe]
+    pool_stats['acquired'] += 1
+    try:
+        async with conn.cursor(aiomysql.DictCursor) as cursor:
+            yield TimedCursor(cursor)
+    finally:
+        await db_pool.release(conn)
+
+class TimedCursor:
+    """Cursor wrapper adding query time to the 'db' stage of the current request"""
+    
+    def __init__(self, cursor):
+        self.cursor = cursor
+    
+    async def execute(self, query, args=None):
+        with timed('db'):
+            return await self.cursor.execute(query, args)
     
+    async def fetchone(self):
+        with timed('db'):
+            return await self.cursor.fetchone()
+    
+    async def fetchall(self):
+        with timed('db'):
+            return await self.cursor.fetchall()
+    
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+async def run_on_workers(workers, function, *args):
+    """Run function(*args) on a worker pool (inline if there is none), 503 if the pool is full"""
+    if workers is None:
+        return function(*args)
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Fetch from the right table
-        query = f"""
-        SELECT 
-            open_time / 1000 as time,
-            open,
-            high,
-            low,
-            close,
-            volume
+        return await workers.run(function, *args)
+    except WorkerPoolFull as e:
+        print(e)
+        raise HTTPException(status_code=503, detail="Server busy, try again", headers={"Retry-After": "1"})
+
+def get_pool_stats():
+    """Current pool usage and saturation counters"""
+    if db_pool is None:
+        return {"available": False, **pool_stats}
+    return {
+        "available": True,
+        "size": db_pool.size,
+        "free": db_pool.freesize,
+        "in_use": db_pool.size - db_pool.freesize,
+        "minsize": db_pool.minsize,
+        "maxsize": db_pool.maxsize,
+        **pool_stats
+    }
+
+# Extra candles fetched before the first returned candle so EMA200 and
+# volatility(200) are defined from the first bar (and EMA200 has settled)
+INDICATOR_WARMUP_CANDLES = 400
+
+# Streaming indicator state per (symbol, timeframe), saved after the last closed candle
+INDICATOR_STATE_CACHE_SIZE = 256
+DEFAULT_CANDLE_LIMIT = 20000
+# Room for the window of a default /api/candles request, which includes the warm-up
+MAX_SAVED_CANDLES = DEFAULT_CANDLE_LIMIT + INDICATOR_WARMUP_CANDLES
+indicator_states = OrderedDict()
+
+def new_indicator_states():
+    """Fresh streaming state for the indicators returned by /api/candles"""
+    return {
+        'macd': MACDState(),
+        'volatility': VolatilityState(),
+        'dual_ema': DualEMAState(),
+        'rsi': RSIState()
+    }
+
+def calculate_candle_indicators(closes):
+    """The /api/candles indicators calculated from scratch along the last axis (one row per symbol for 2D closes)"""
+    return {
+        'macd': macd_array(closes),
+        'volatility': volatility_array(closes),
+        'dual_ema': dual_ema_array(closes),
+        'rsi': rsi_array(closes)
+    }
+
+def advance_indicator_states(states, closes):
+    """Advance every state over closes and return the new values as arrays"""
+    return {name: state.advance(closes) for name, state in states.items()}
+
+def run_indicator_states(states, closes):
+    """advance_indicator_states for a worker: returns (states, new values)"""
+    return states, advance_indicator_states(states, closes)
+
+def advance_forming_candle(states, closes):
+    """advance_indicator_states on a copy of states, for the forming candle (leaves the saved state as is)"""
+    return advance_indicator_states(copy.deepcopy(states), closes)
+
+# One calculation at a time per (symbol, timeframe), so saved state is advanced once
+indicator_locks = weakref.WeakValueDictionary()
+
+async def compute_candle_indicators(symbol, timeframe, times, closes):
+    """
+    Calculate the /api/candles indicators for times/closes (oldest first)
+
+    Every candle except the last one is treated as closed. When the saved state
+    for (symbol, timeframe) ends on one of the requested candles, only the
+    candles after it are calculated and the rest comes from the saved history,
+    so values at the start of the window are warmed up by earlier candles.
+    The last (forming) candle is calculated on a copy of the state, on the CPU
+    workers like the rest.
+    """
+    key = (symbol, timeframe)
+    lock = indicator_locks.get(key)
+    if lock is None:
+        lock = indicator_locks[key] = asyncio.Lock()
+    async with lock:
+        return await _compute_candle_indicators(key, times, closes)
+
+async def _compute_candle_indicators(key, times, closes):
+    closed = len(times) - 1
+    entry = indicator_states.get(key)
+
+    resumed = False
+    if entry is not None and closed > 0:
+        start = int(np.searchsorted(entry['times'], times[0]))
+        saved = entry['times'][start:]
+        resumed = (
+            0 < len(saved) <= closed
+            and np.array_equal(saved, times[:len(saved)])
+            and entry['last_close'] == closes[len(saved) - 1]
+        )
+
+    if resumed:
+        try:
+            entry['states'], tail = await run_on_workers(
+                cpu_workers, run_indicator_states, entry['states'], closes[len(saved):closed]
+            )
+        except Exception:
+            # The state may have been advanced part of the way
+            indicator_states.pop(key, None)
+            raise
+        entry['times'] = np.concatenate([entry['times'], times[len(saved):closed]])
+        entry['values'] = concat_results(entry['values'], tail)
+        history = slice_result(entry['values'], start)
+    else:
+        states, history = await run_on_workers(cpu_workers, run_indicator_states, new_indicator_states(), closes[:closed])
+        entry = {'states': states, 'times': np.array(times[:closed]), 'values': history}
+
+    # Keep the saved history bounded, but never shorter than this window or the next request can't resume
+    keep = max(MAX_SAVED_CANDLES, closed)
+    if len(entry['times']) > keep:
+        entry['times'] = entry['times'][-keep:]
+        entry['values'] = slice_result(entry['values'], -keep)
+
+    if closed > 0:
+        entry['last_close'] = float(closes[closed - 1])
+        indicator_states[key] = entry
+        indicator_states.move_to_end(key)
+        while len(indicator_states) > INDICATOR_STATE_CACHE_SIZE:
+            indicator_states.popitem(last=False)
+
+    # Still under the lock, so the saved state can't be advanced while it is copied
+    forming = await run_on_workers(cpu_workers, advance_forming_candle, entry['states'], closes[closed:])
+    return concat_results(history, forming)
+
+# Candle fields returned by /api/candles
+CANDLE_FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+def candle_columns(rows):
+    """Convert candle rows (oldest first) to a dict of arrays: int64 'time' plus float64 OHLCV"""
+    with timed('convert'):
+        columns = {'time': np.array([int(row['time']) for row in rows], dtype=np.int64)}
+        for field in CANDLE_FIELDS:
+            columns[field] = np.array([row[field] for row in rows], dtype=np.float64)
+    return columns
+
+def format_candles(columns):
+    """Convert candle columns to the list of dicts returned as JSON"""
+    names = ('time',) + CANDLE_FIELDS
+    return [dict(zip(names, values)) for values in zip(*(columns[name].tolist() for name in names))]
+
+def render_json(content):
+    """Encode content the way FastAPI's JSONResponse does, so it can be done on a worker"""
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+def render_candles(format, meta, columns, indicators):
+    """Build the /api/candles payload (JSON or columnar) from candle and indicator columns"""
+    if format == 'columnar':
+        return encode_columnar(meta, {**columns, **flatten_columns(indicators)})
+    return render_json({
+        "success": True,
+        "data": format_candles(columns),
+        "indicators": to_json_safe(indicators),
+        **meta
+    })
+
+def downsample_candles(columns, indicators, size):
+    """
+    Merge candles `size` at a time and reduce every indicator line to one value per merged candle
+    
+    Candles keep their price range (first open, highest high, lowest low, last
+    close, summed volume); indicator lines are reduced with LTTB on the same groups.
+    """
+    lines = flatten_columns(indicators)
+    if lines:
+        reduced = lttb_select(np.stack(list(lines.values())), size)
+        indicators = unflatten_columns(dict(zip(lines, reduced)))
+    return merge_candles(columns, size), indicators
+
+# Read-through cache of recent candles per (symbol, timeframe)
+CANDLE_CACHE_MB = int(os.environ.get('SMARTCHART_CANDLE_CACHE_MB', 256))
+candle_cache = CandleCache(CANDLE_CACHE_MB * 1024 * 1024)
+
+# Local memory-mapped candle store kept up to date by sync_all_data.py (empty to read only from MySQL)
+CANDLE_STORE_DIR = os.environ.get('SMARTCHART_CANDLE_STORE_DIR', CANDLE_STORE_ROOT)
+candle_store = CandleStore(CANDLE_STORE_DIR) if CANDLE_STORE_DIR else None
+
+def read_stored_candles(table_name, symbol):
+    """Candles of a symbol in the local candle store (see candle_store.CandleStore.read), None if there are none"""
+    if candle_store is None:
+        return None
+    with timed('store'):
+        return candle_store.read(table_name, symbol)
+
+def stored_latest(table_name, symbol, count):
+    """Newest `count` candles from the candle store as zero-copy slices, None if it may not hold all of them"""
+    stored = read_stored_candles(table_name, symbol)
+    if stored is None or (not stored['complete'] and len(stored['columns']['time']) < count):
+        return None
+    return {name: values[-count:] if count > 0 else values[:0] for name, values in stored['columns'].items()}
+
+def stored_since(table_name, symbol, since):
+    """Candles with time >= since (seconds) from the candle store, None if it may not hold all of them"""
+    stored = read_stored_candles(table_name, symbol)
+    if stored is None:
+        return None
+    first = int(np.searchsorted(stored['columns']['time'], since))
+    # Without the whole history, an older stored candle proves nothing is missing
+    if first == 0 and not stored['complete']:
+        return None
+    return {name: values[first:] for name, values in stored['columns'].items()}
+
+async def fetch_candle_columns(symbol, timeframe, limit):
+    """
+    Most recent `limit` candles (oldest first) as columns
+    
+    Stored timeframes are sliced straight from the candle store when it holds
+    them. Otherwise candles are read through the candle cache: on a cache hit
+    only rows from the newest cached candle onwards are fetched, since that
+    candle may still have been forming when it was cached. Timeframes that are
+    not stored are resampled from their source table. MySQL is only queried
+    for what the candle store can't answer.
+    """
+    source = timeframe_source(timeframe)
+    table_name = TIMEFRAME_TABLES[source]
+    bucket_seconds = None if source == timeframe else parse_timeframe(timeframe)
+    ratio = 1 if bucket_seconds is None else bucket_seconds // TIMEFRAME_SECONDS[source]
+    if bucket_seconds is None:
+        columns = stored_latest(table_name, symbol, limit)
+        if columns is not None:
+            return columns
+    entry = candle_cache.lookup(symbol, timeframe, limit)
+    
+    if entry is None:
+        # One extra bucket, since the oldest one may be cut off
+        source_limit = limit if bucket_seconds is None else (limit + 1) * ratio
+        columns = stored_latest(table_name, symbol, source_limit)
+        if columns is None:
+            async with db_cursor() as cursor:
+                await cursor.execute(f"""
+                SELECT open_time / 1000 as time, open, high, low, close, volume
+                FROM {table_name}
+                WHERE symbol = %s
+                ORDER BY open_time DESC
+                LIMIT %s
+                """, (symbol, source_limit))
+                rows = await cursor.fetchall()
+            columns = candle_columns(rows[::-1])
+        complete = len(columns['time']) < source_limit
+        if bucket_seconds is not None:
+            with timed('resample'):
+                columns = resample_ohlcv(columns, bucket_seconds)
+            if not complete:
+                columns = {name: values[1:] for name, values in columns.items()}
+        entry = candle_cache.put(symbol, timeframe, columns, complete)
+    else:
+        # Cached resampled candles start on a bucket boundary, so the tail covers whole buckets
+        last_time = int(entry['columns']['time'][-1]) if len(entry['columns']['time']) else 0
+        tail = stored_since(table_name, symbol, last_time)
+        if tail is None:
+            async with db_cursor() as cursor:
+                await cursor.execute(f"""
+                SELECT open_time / 1000 as time, open, high, low, close, volume
+                FROM {table_name}
+                WHERE symbol = %s AND open_time >= %s
+                ORDER BY open_time
+                """, (symbol, last_time * 1000))
+                tail = candle_columns(await cursor.fetchall())
+        if bucket_seconds is not None:
+            with timed('resample'):
+                tail = resample_ohlcv(tail, bucket_seconds)
+        entry = candle_cache.merge_tail(symbol, timeframe, entry, tail)
+    
+    return {name: values[-limit:] if limit > 0 else values[:0] for name, values in entry['columns'].items()}
+
+def split_candle_rows(rows):
+    """Convert candle rows sorted by symbol and time to symbol -> columns"""
+    columns = candle_columns(rows)
+    names = np.array([row['symbol'] for row in rows])
+    starts = np.flatnonzero(np.r_[True, names[1:] != names[:-1]]) if len(names) else np.empty(0, dtype=np.intp)
+    ends = np.r_[starts[1:], len(names)]
+    # Copies, so cached entries don't keep the whole result alive
+    return {
+        str(names[start]): {name: values[start:end].copy() for name, values in columns.items()}
+        for start, end in zip(starts, ends)
+    }
+
+async def fetch_grouped_candles(cursor, table_name, symbols, since):
+    """Candles of many symbols with open_time >= since (seconds) in one query, as symbol -> columns"""
+    await cursor.execute(f"""
+    SELECT symbol, open_time / 1000 as time, open, high, low, close, volume
+    FROM {table_name}
+    WHERE symbol IN ({', '.join(['%s'] * len(symbols))}) AND open_time >= %s
+    ORDER BY symbol, open_time
+    """, (*symbols, since * 1000))
+    return split_candle_rows(await cursor.fetchall())
+
+async def fetch_candle_columns_batch(timeframe, limits):
+    """
+    fetch_candle_columns for many symbols on one timeframe with grouped queries
+    
+    Symbols the candle store holds are read from it. Of the rest, cache misses
+    are read with one query over the time window of the largest limit and
+    cache hits with one query for their tails. Symbols with fewer candles than
+    asked for in the window (short history or gaps) fall back to
+    fetch_candle_columns.
+    
+    Args:
+        timeframe: Canonical timeframe
+        limits: Symbol to number of most recent candles
+    
+    Returns:
+        Symbol to columns (oldest first)
+    """
+    source = timeframe_source(timeframe)
+    table_name = TIMEFRAME_TABLES[source]
+    bucket_seconds = parse_timeframe(timeframe)
+    resampled = source != timeframe
+    ratio = bucket_seconds // TIMEFRAME_SECONDS[source]
+    
+    # Same source window as fetch_candle_columns, which then reads it without a query
+    stored = [
+        symbol for symbol, limit in limits.items()
+        if stored_latest(table_name, symbol, (limit + 1) * ratio if resampled else limit) is not None
+    ]
+    
+    hits = {}
+    misses = []
+    for symbol, limit in limits.items():
+        if symbol in stored:
+            continue
+        entry = candle_cache.lookup(symbol, timeframe, limit)
+        if entry is None:
+            misses.append(symbol)
+        else:
+            hits[symbol] = entry
+    
+    fallback = []
+    if misses or hits:
+        async with db_cursor() as cursor:
+            if misses:
+                # Buckets start on a boundary, so the window holds whole buckets
+                last_bucket = int(bucket_floor(int(time.time()), bucket_seconds))
+                window_start = last_bucket - (max(limits[symbol] for symbol in misses) - 1) * bucket_seconds
+                fetched = await fetch_grouped_candles(cursor, table_name, misses, window_start)
+                for symbol in misses:
+                    columns = fetched.get(symbol)
+                    if columns is not None and resampled:
+                        with timed('resample'):
+                            columns = resample_ohlcv(columns, bucket_seconds)
+                    if columns is None or len(columns['time']) < limits[symbol]:
+                        fallback.append(symbol)
+                    else:
+                        hits[symbol] = candle_cache.put(symbol, timeframe, columns, False)
+            
+            refresh = {symbol: entry for symbol, entry in hits.items() if len(entry['columns']['time'])}
+            if refresh:
+                # The newest cached candle may have been forming when it was cached
+                last_times = {symbol: int(entry['columns']['time'][-1]) for symbol, entry in refresh.items()}
+                fetched = await fetch_grouped_candles(cursor, table_name, list(refresh), min(last_times.values()))
+                for symbol, entry in refresh.items():
+                    tail = fetched.get(symbol)
+                    if tail is None:
+                        continue
+                    keep = tail['time'] >= last_times[symbol]
+                    tail = {name: values[keep] for name, values in tail.items()}
+                    if resampled:
+                        with timed('resample'):
+                            tail = resample_ohlcv(tail, bucket_seconds)
+                    hits[symbol] = candle_cache.merge_tail(symbol, timeframe, entry, tail)
+    
+    results = {
+        symbol: {name: values[-limits[symbol]:] if limits[symbol] > 0 else values[:0] for name, values in entry['columns'].items()}
+        for symbol, entry in hits.items()
+    }
+    fetched = await asyncio.gather(*(fetch_candle_columns(symbol, timeframe, limits[symbol]) for symbol in stored + fallback))
+    results.update(zip(stored + fallback, fetched))
+    return results
+
+async def fetch_candle_range(symbol, timeframe, start=None, end=None, limit=20000, warmup=0):
+    """
+    Newest `limit` candles with start <= open_time <= end (ms, either may be None), oldest first
+    
+    Up to `warmup` older candles are prepended for indicator lookback. Served
+    from the candle store when it holds the candles, otherwise from MySQL.
+    Returns (columns, number of warm-up candles).
+    """
+    source = timeframe_source(timeframe)
+    if source != timeframe:
+        return await fetch_resampled_range(symbol, timeframe, start, end, limit, warmup)
+    
+    table_name = TIMEFRAME_TABLES[timeframe]
+    stored = read_stored_candles(table_name, symbol)
+    if stored is not None:
+        times = stored['columns']['time']
+        last = len(times) if end is None else int(np.searchsorted(times, end // 1000, side='right'))
+        first = last - limit
+        if start is not None:
+            first = max(first, int(np.searchsorted(times, -(-start // 1000))))
+        first = max(first, 0)
+        # Like the query below, no warm-up without candles in the range
+        first_warmup = max(first - warmup, 0) if first < last else first
+        # Without the whole history, an older stored candle proves nothing is missing
+        if stored['complete'] or first_warmup > 0:
+            return {name: values[first_warmup:last] for name, values in stored['columns'].items()}, first - first_warmup
+    
+    conditions = ["symbol = %s"]
+    params = [symbol]
+    if start is not None:
+        conditions.append("open_time >= %s")
+        params.append(start)
+    if end is not None:
+        conditions.append("open_time <= %s")
+        params.append(end)
+    
+    async with db_cursor() as cursor:
+        await cursor.execute(f"""
+        SELECT open_time / 1000 as time, open, high, low, close, volume
         FROM {table_name}
-        WHERE symbol = %s
+        WHERE {' AND '.join(conditions)}
         ORDER BY open_time DESC
         LIMIT %s
-        """
+        """, (*params, limit))
+        rows = await cursor.fetchall()
         
-        cursor.execute(query, (symbol, limit))
-        data = cursor.fetchall()
+        warmup_rows = []
+        if warmup > 0 and rows:
+            await cursor.execute(f"""
+            SELECT open_time / 1000 as time, open, high, low, close, volume
+            FROM {table_name}
+            WHERE symbol = %s AND open_time < %s
+            ORDER BY open_time DESC
+            LIMIT %s
+            """, (symbol, int(rows[-1]['time']) * 1000, warmup))
+            warmup_rows = await cursor.fetchall()
+    
+    return candle_columns(warmup_rows[::-1] + rows[::-1]), len(warmup_rows)
+
+async def fetch_resampled_range(symbol, timeframe, start=None, end=None, limit=20000, warmup=0):
+    """
+    fetch_candle_range for a resampled timeframe
+    
+    Reads the source candles of the limit + warmup buckets ending with the
+    bucket that contains `end` (or the current time), from the candle store
+    when it holds them.
+    """
+    table_name = TIMEFRAME_TABLES[timeframe_source(timeframe)]
+    bucket_seconds = parse_timeframe(timeframe)
+    last_bucket = int(bucket_floor((int(time.time() * 1000) if end is None else end) // 1000, bucket_seconds))
+    window_start = last_bucket - (limit + warmup - 1) * bucket_seconds
+    
+    columns = None
+    stored = read_stored_candles(table_name, symbol)
+    if stored is not None:
+        times = stored['columns']['time']
+        first = int(np.searchsorted(times, window_start))
+        if stored['complete'] or first > 0:
+            last = int(np.searchsorted(times, last_bucket + bucket_seconds))
+            columns = {name: values[first:last] for name, values in stored['columns'].items()}
+    
+    if columns is None:
+        async with db_cursor() as cursor:
+            await cursor.execute(f"""
+            SELECT open_time / 1000 as time, open, high, low, close, volume
+            FROM {table_name}
+            WHERE symbol = %s AND open_time >= %s AND open_time < %s
+            ORDER BY open_time
+            """, (symbol, window_start * 1000, (last_bucket + bucket_seconds) * 1000))
+            rows = await cursor.fetchall()
+        columns = candle_columns(rows)
+    with timed('resample'):
+        columns = resample_ohlcv(columns, bucket_seconds)
+    
+    times = columns['time']
+    first = len(times) - limit
+    if start is not None:
+        first = max(first, int(np.searchsorted(times * 1000, start)))
+    first = max(first, 0)
+    first_warmup = max(first - warmup, 0)
+    return {name: values[first_warmup:] for name, values in columns.items()}, first - first_warmup
+
+async def load_candles(symbol, timeframe, limit, lower=None, upper=None, include_indicators=True):
+    """
+    Newest `limit` candles with lower <= open_time <= upper (ms, either may be None) and their indicators
+    
+    Open-ended requests are served from the candle cache and the streaming
+    indicator state, everything else is read as a time range with warm-up.
+    Returns (columns, indicators) without the warm-up candles.
+    """
+    warmup = INDICATOR_WARMUP_CANDLES if include_indicators else 0
+    
+    columns = None
+    if upper is None:
+        # Open-ended at the newest candle: serve from the candle cache and streaming indicator state
+        latest = await fetch_candle_columns(symbol, timeframe, limit + warmup)
+        count = len(latest['time'])
+        first = 0 if lower is None else int(np.searchsorted(latest['time'] * 1000, lower))
+        first = max(first, count - limit)
+        # Enough lookback in the window, or the window holds the whole history
+        if first >= warmup or count < limit + warmup:
+            columns = latest
+            indicators = {}
+            if include_indicators and count > 0:
+                with timed('indicators'):
+                    indicators = await compute_candle_indicators(symbol, timeframe, latest['time'], latest['close'])
+    
+    if columns is None:
+        columns, first = await fetch_candle_range(symbol, timeframe, lower, upper, limit, warmup)
+        indicators = {}
+        if include_indicators and len(columns['time']) > 0:
+            with timed('indicators'):
+                indicators = await run_on_workers(cpu_workers, advance_indicator_states, new_indicator_states(), columns['close'])
+    
+    # Drop the warm-up candles
+    columns = {name: values[first:] for name, values in columns.items()}
+    return columns, slice_result(indicators, first)
+
+@app.get("/api/candles/{symbol}")
+async def get_candles(request: Request, symbol: str, timeframe: str = "60", limit: int = DEFAULT_CANDLE_LIMIT, include_indicators: bool = True,
+                      format: str = None, from_: int = Query(None, alias="from"), to: int = None, since: int = None,
+                      cursor: str = None, max_points: int = None):
+    """
+    Fetch candlestick data from the right table based on timeframe
+    
+    Without from/to/since/cursor the most recent `limit` candles are returned.
+    from, to and since (open_time in ms) restrict the candles to a time range;
+    since is meant for polling and includes the candle at `since`, which may
+    have been updated. The newest `limit` candles in the range are returned.
+    When the page is full, next_cursor can be passed as cursor to get the page
+    before it.
+    
+    max_points reduces the candles to at most that many for zoomed-out views:
+    runs of consecutive candles are merged (keeping open, high, low, close and
+    summed volume) and indicator lines, calculated on the full candles, are
+    reduced with LTTB. candles_per_point in the response gives the run length.
+    
+    Responds with JSON by default. format=columnar (or an Accept header with
+    application/vnd.smartchart.columnar) returns the columnar binary format.
+    """
+    
+    # Validate timeframe (any timeframe that can be built from the stored tables)
+    timeframe = validate_timeframe(timeframe)
+    
+    if format is None:
+        format = 'columnar' if COLUMNAR_MEDIA_TYPE in request.headers.get('accept', '') else 'json'
+    if format not in ('json', 'columnar'):
+        raise HTTPException(status_code=400, detail=f"Invalid format: {format}")
+    
+    # Time range in ms; a cursor is the open_time of the first candle of the previous page
+    lower = max([bound for bound in (from_, since) if bound is not None], default=None)
+    upper = to
+    if cursor is not None:
+        try:
+            before = int(cursor) - 1
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid cursor: {cursor}")
+        upper = before if upper is None else min(upper, before)
+    
+    if max_points is not None and max_points < 2:
+        raise HTTPException(status_code=400, detail=f"Invalid max_points: {max_points}")
+    
+    try:
+        columns, indicators = await load_candles(symbol, timeframe, limit, lower, upper, include_indicators)
+        candle_times = columns['time']
+        next_cursor = str(int(candle_times[0]) * 1000) if len(candle_times) == limit and limit > 0 else None
         
-        # Reverse order (oldest first for charts)
-        data = data[::-1]
+        # Adjust timeframe display for D and W
+        tf_display = timeframe_display(timeframe)
         
-        # Convert to the right format
-        formatted_data = []
-        closing_prices = []
-        for candle in data:
-            formatted_data.append({
-                'time': int(candle['time']),
-                'open': float(candle['open']),
-                'high': float(candle['high']),
-                'low': float(candle['low']),
-                'close': float(candle['close']),
-                'volume': float(candle['volume'])
-            })
-            closing_prices.append(float(candle['close']))
+        # Level of detail: merge runs of candles after the indicators ran on all of them
+        lod = {}
+        if max_points is not None:
+            size = max(-(-len(candle_times) // max_points), 1)
+            if size > 1:
+                with timed('downsample'):
+                    columns, indicators = await run_on_workers(cpu_workers, downsample_candles, columns, indicators, size)
+            lod = {"candles_per_point": size}
+        
+        meta = {"count": len(columns['time']), "symbol": symbol, "timeframe": tf_display, "next_cursor": next_cursor, **lod}
+        if format == 'columnar':
+            meta = {"success": True, **meta}
+        with timed('encode'):
+            payload = await run_on_workers(batch_workers, render_candles, format, meta, columns, indicators)
+        return Response(content=payload, media_type=COLUMNAR_MEDIA_TYPE if format == 'columnar' else "application/json")
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error fetching candles: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+class CandleBatchItem(BaseModel):
+    symbol: str
+    timeframe: str = "60"
+    limit: int = 1000
+
+class CandleBatchRequest(BaseModel):
+    requests: List[CandleBatchItem]
+    include_indicators: bool = True
+
+MAX_BATCH_REQUESTS = 100
+MAX_BATCH_LIMIT = 20000
+
+def calculate_batch_indicators(windows):
+    """Indicators for many symbols' closes, stacking windows of equal length into one 2D calculation"""
+    by_length = {}
+    for symbol, closes in windows.items():
+        by_length.setdefault(len(closes), []).append(symbol)
+    
+    results = {}
+    for length, symbols in by_length.items():
+        stacked = calculate_candle_indicators(np.stack([windows[symbol] for symbol in symbols]))
+        for row, symbol in enumerate(symbols):
+            results[symbol] = slice_rows(stacked, row)
+    return results
+
+def slice_rows(result, row):
+    """Row of a 2D array result (or dict of array results)"""
+    if isinstance(result, dict):
+        return {key: slice_rows(value, row) for key, value in result.items()}
+    return result[row]
+
+def render_candle_batch(items):
+    """Build the /api/candles/batch payload from (symbol, timeframe, columns, indicators) per request"""
+    results = []
+    for symbol, timeframe, columns, indicators in items:
+        results.append({
+            "symbol": symbol,
+            "timeframe": timeframe,
+            "data": format_candles(columns),
+            "indicators": to_json_safe(indicators),
+            "count": len(columns['time'])
+        })
+    return render_json({"success": True, "results": results, "count": len(results)})
+
+@app.post("/api/candles/batch")
+async def get_candles_batch(batch: CandleBatchRequest):
+    """
+    Most recent candles for many (symbol, timeframe, limit) requests in one response
+    
+    Candles are read with grouped queries per timeframe, and indicators for
+    symbols on the same timeframe are calculated in one batched pass over the
+    last limit + warm-up candles. Results are in the order of the requests.
+    """
+    if len(batch.requests) > MAX_BATCH_REQUESTS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_REQUESTS} requests per batch")
+    
+    items = []
+    for item in batch.requests:
+        if not 0 < item.limit <= MAX_BATCH_LIMIT:
+            raise HTTPException(status_code=400, detail=f"Invalid limit: {item.limit}")
+        items.append((item.symbol, validate_timeframe(item.timeframe), item.limit))
+    
+    warmup = INDICATOR_WARMUP_CANDLES if batch.include_indicators else 0
+    
+    try:
+        # Largest window per (symbol, timeframe), grouped by timeframe
+        limits = {}
+        for symbol, timeframe, limit in items:
+            window = limits.setdefault(timeframe, {})
+            window[symbol] = max(window.get(symbol, 0), limit + warmup)
         
-        cursor.close()
-        conn.close()
+        timeframes = list(limits)
+        fetched = await asyncio.gather(*(fetch_candle_columns_batch(timeframe, limits[timeframe]) for timeframe in timeframes))
+        candles = dict(zip(timeframes, fetched))
         
-        # Calculate indicators if requested
         indicators = {}
-        if include_indicators and len(closing_prices) > 0:
-            # Calculate MACD
-            macd_result = calculate_macd(closing_prices)
-            indicators['macd'] = macd_result
-            
-            # Calculate Volatility
-            volatility_result = calculate_volatility(closing_prices)
-            indicators['volatility'] = volatility_result
-            
-            # Calculate dual EMA
-            dual_ema_result = calculate_dual_ema(closing_prices)
-            indicators['dual_ema'] = dual_ema_result
-            
-            # Calculate RSI
-            rsi_result = calculate_rsi(closing_prices)
-            indicators['rsi'] = rsi_result
+        if batch.include_indicators:
+            with timed('indicators'):
+                for timeframe in timeframes:
+                    windows = {symbol: columns['close'] for symbol, columns in candles[timeframe].items() if len(columns['close'])}
+                    indicators[timeframe] = await run_on_workers(cpu_workers, calculate_batch_indicators, windows)
         
-        # Adjust timeframe display for D and W
-        tf_display = timeframe
-        if timeframe == 'D':
-            tf_display = '1D'
-        elif timeframe == 'W':
-            tf_display = '1W'
-        elif timeframe not in ['D', 'W']:
-            tf_display = f"{timeframe}m"
+        # Drop the warm-up candles per request
+        results = []
+        for symbol, timeframe, limit in items:
+            columns = candles[timeframe][symbol]
+            first = max(len(columns['time']) - limit, 0)
+            values = indicators.get(timeframe, {}).get(symbol, {})
+            results.append((
+                symbol,
+                timeframe_display(timeframe),
+                {name: column[first:] for name, column in columns.items()},
+                slice_result(values, first)
+            ))
         
-        return {
-            "success": True,
-            "data": formatted_data,
-            "indicators": indicators,
-            "count": len(formatted_data),
-            "symbol": symbol,
-            "timeframe": tf_display
-        }
+        with timed('encode'):
+            payload = await run_on_workers(batch_workers, render_candle_batch, results)
+        return Response(content=payload, media_type="application/json")
         
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Error fetching candles: {e}")
+        print(f"Error fetching candle batch: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/test-db")
@@ -145,14 +950,11 @@ async def test_db():
     """Test database connection"""
     try:
         print("Trying to connect to database...")
-        conn = get_db_connection()
-        print("Connected!")
-        cursor = conn.cursor()
-        cursor.execute("SELECT VERSION()")
-        version = cursor.fetchone()
-        cursor.close()
-        conn.close()
-        return {"success": True, "mysql_version": version['VERSION()']}
+        async with db_cursor() as cursor:
+            print("Connected!")
+            await cursor.execute("SELECT VERSION()")
+            version = await cursor.fetchone()
+        return {"success": True, "mysql_version": version['VERSION()'], "pool": get_pool_stats()}
     except Exception as e:
         print(f"Error type: {type(e).__name__}")
         print(f"Error details: {e}")
@@ -160,178 +962,415 @@ async def test_db():
         traceback.print_exc()
         return {"success": False, "error": str(e), "error_type": type(e).__name__}
 
+# Indicators served by /api/indicators
+INDICATOR_FUNCTIONS = {
+    'macd': macd_array,
+    'rsi': rsi_array,
+    'volatility': volatility_array,
+    'dual_ema': dual_ema_array
+}
+
+def render_indicator(indicator, times, values):
+    """Build the /api/indicators payload from the indicator's arrays"""
+    result = to_json_safe(values)
+    if indicator == 'macd':
+        # Format for charts
+        formatted_data = []
+        for i in range(len(times)):
+            formatted_data.append({
+                'time': times[i],
+                'macd': result['macd'][i],
+                'signal': result['signal'][i],
+                'histogram': result['histogram'][i]
+            })
+        
+        return render_json({
+            "success": True,
+            "indicator": "macd",
+            "data": formatted_data,
+            "count": len(formatted_data)
+        })
+    elif indicator == 'rsi':
+        # Format for charts (simple array)
+        return render_json({
+            "success": True,
+            "indicator": "rsi",
+            "data": result,
+            "count": len(result)
+        })
+    elif indicator == 'volatility':
+        # Format for charts
+        formatted_data = []
+        for i in range(len(times)):
+            formatted_data.append({
+                'time': times[i],
+                'volatility': result[i]
+            })
+        
+        return render_json({
+            "success": True,
+            "indicator": "volatility",
+            "data": formatted_data,
+            "count": len(formatted_data)
+        })
+    elif indicator == 'dual_ema':
+        # Format for charts
+        formatted_data = []
+        for i in range(len(times)):
+            formatted_data.append({
+                'time': times[i],
+                'ema50': result['ema50'][i],
+                'ema200': result['ema200'][i]
+            })
+        
+        return render_json({
+            "success": True,
+            "indicator": "dual_ema",
+            "data": formatted_data,
+            "count": len(formatted_data)
+        })
+
 @app.get("/api/indicators/{indicator}/{symbol}")
 async def get_indicator(indicator: str, symbol: str, timeframe: str = "60", limit: int = 1000):
     """Fetch indicator data for a symbol"""
     
-    # Validate timeframe
-    timeframe_tables = {
-        '1': 'candles1',
-        '5': 'candles5',
-        '15': 'candles15',
-        '60': 'candles60',
-        '240': 'candles240',
-        'D': 'candlesd',
-        'W': 'candlesw'
-    }
+    # Validate timeframe (any timeframe that can be built from the stored tables)
+    timeframe = validate_timeframe(timeframe)
     
-    if timeframe not in timeframe_tables:
-        raise HTTPException(status_code=400, detail=f"Invalid timeframe: {timeframe}")
+    try:
+        # Fetch candlestick data (through the candle cache)
+        columns = await fetch_candle_columns(symbol, timeframe, limit)
+        times = columns['time'].tolist()
+        prices = columns['close']
+        
+        function = INDICATOR_FUNCTIONS.get(indicator.lower())
+        if function is None:
+            raise HTTPException(status_code=400, detail=f"Unknown indicator: {indicator}")
+        
+        # Calculate indicator
+        with timed('indicators'):
+            values = await run_on_workers(cpu_workers, function, prices)
+        with timed('encode'):
+            content = await run_on_workers(batch_workers, render_indicator, indicator.lower(), times, values)
+        return Response(content=content, media_type="application/json")
+            
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error calculating indicator: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Extra source candles fetched before the first bar so MACD is warmed up
+ALIGNED_WARMUP_CANDLES = 200
+MAX_ALIGNED_SOURCE_CANDLES = 20000
+
+@app.get("/api/indicators/macd/{symbol}/aligned")
+async def get_aligned_macd(symbol: str, timeframe: str = "60", source_timeframe: str = "1", limit: int = 1000, agg: str = "absmax"):
+    """Calculate the MACD histogram on source_timeframe and aggregate it to one value per timeframe bar"""
     
-    table_name = timeframe_tables[timeframe]
+    timeframe = validate_timeframe(timeframe)
+    source_timeframe = validate_timeframe(source_timeframe, "source timeframe")
+    if agg not in BAR_AGGREGATIONS and agg != 'sign_count':
+        raise HTTPException(status_code=400, detail=f"Unknown aggregation: {agg}")
     
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        # Bars of the main timeframe
+        bar_times = (await fetch_candle_columns(symbol, timeframe, limit))['time']
         
-        # Fetch candlestick data
-        query = f"""
-        SELECT 
-            open_time / 1000 as time,
-            close
-        FROM {table_name}
-        WHERE symbol = %s
-        ORDER BY open_time DESC
-        LIMIT %s
-        """
+        # Source candles covering those bars plus the warm-up
+        source_times = np.empty(0, dtype=np.int64)
+        source_closes = np.empty(0)
+        if len(bar_times) > 0:
+            source_seconds = parse_timeframe(source_timeframe)
+            start = int(bar_times[0]) - ALIGNED_WARMUP_CANDLES * source_seconds
+            end = int(bar_times[-1]) + parse_timeframe(timeframe)
+            source_limit = min((end - start) // source_seconds, MAX_ALIGNED_SOURCE_CANDLES)
+            source = await fetch_candle_columns(symbol, source_timeframe, source_limit)
+            keep = source['time'] >= start
+            source_times = source['time'][keep]
+            source_closes = source['close'][keep]
         
-        cursor.execute(query, (symbol, limit))
-        data = cursor.fetchall()
+        histogram = macd_array(source_closes)['histogram']
+        bar_seconds = parse_timeframe(timeframe)
+        times = bar_times.tolist()
         
-        # Reverse order (oldest first)
-        data = data[::-1]
+        if agg == 'sign_count':
+            positive, negative = count_signs_per_bar(source_times, histogram, bar_times, bar_seconds)
+            formatted_data = [
+                {'time': t, 'positive': p, 'negative': n}
+                for t, p, n in zip(times, positive.tolist(), negative.tolist())
+            ]
+        else:
+            values = to_json_safe(aggregate_to_bars(source_times, histogram, bar_times, bar_seconds, agg))
+            formatted_data = [{'time': t, 'histogram': v} for t, v in zip(times, values)]
         
-        # Extract prices
-        times = [int(row['time']) for row in data]
-        prices = [float(row['close']) for row in data]
+        return {
+            "success": True,
+            "indicator": "macd",
+            "timeframe": timeframe_display(timeframe),
+            "source_timeframe": timeframe_display(source_timeframe),
+            "agg": agg,
+            "data": formatted_data,
+            "count": len(formatted_data)
+        }
         
-        # Calculate indicator
-        if indicator.lower() == 'macd':
-            result = calculate_macd(prices)
-            
-            # Format for charts
-            formatted_data = []
-            for i in range(len(times)):
-                formatted_data.append({
-                    'time': times[i],
-                    'macd': result['macd'][i],
-                    'signal': result['signal'][i],
-                    'histogram': result['histogram'][i]
-                })
-            
-            cursor.close()
-            conn.close()
-            
-            return {
-                "success": True,
-                "indicator": "macd",
-                "data": formatted_data,
-                "count": len(formatted_data)
-            }
-        elif indicator.lower() == 'rsi':
-            from indicators import calculate_rsi
-            result = calculate_rsi(prices)
-            
-            # Format for charts (simple array)
-            cursor.close()
-            conn.close()
-            
-            return {
-                "success": True,
-                "indicator": "rsi",
-                "data": result,
-                "count": len(result)
-            }
-        elif indicator.lower() == 'volatility':
-            from indicators import calculate_volatility
-            result = calculate_volatility(prices)
-            
-            # Format for charts
-            formatted_data = []
-            for i in range(len(times)):
-                formatted_data.append({
-                    'time': times[i],
-                    'volatility': result[i]
-                })
-            
-            cursor.close()
-            conn.close()
-            
-            return {
-                "success": True,
-                "indicator": "volatility",
-                "data": formatted_data,
-                "count": len(formatted_data)
-            }
-        elif indicator.lower() == 'dual_ema':
-            from indicators import calculate_dual_ema
-            result = calculate_dual_ema(prices)
-            
-            # Format for charts
-            formatted_data = []
-            for i in range(len(times)):
-                formatted_data.append({
-                    'time': times[i],
-                    'ema50': result['ema50'][i],
-                    'ema200': result['ema200'][i]
-                })
-            
-            cursor.close()
-            conn.close()
-            
-            return {
-                "success": True,
-                "indicator": "dual_ema",
-                "data": formatted_data,
-                "count": len(formatted_data)
-            }
-        else:
-            raise HTTPException(status_code=400, detail=f"Unknown indicator: {indicator}")
-            
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Error calculating indicator: {e}")
+        print(f"Error calculating aligned MACD: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/symbols")
-async def get_symbols():
-    """Fetch all symbols with current ticker data"""
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+# Screener results per timeframe, recalculated once candles changed (after each sync)
+SCREENER_CANDLES = 600
+SCREENER_MIN_REFRESH_SECONDS = 10  # Changed results younger than this are still served
+screener_results = {}
+screener_versions = {}
+screener_locks = {}
+
+async def fetch_screener_closes(timeframe):
+    """Closes of the last SCREENER_CANDLES candles of every traded symbol, as symbol -> array"""
+    source = timeframe_source(timeframe)
+    table_name = TIMEFRAME_TABLES[source]
+    bucket_seconds = parse_timeframe(timeframe)
+    last_bucket = int(bucket_floor(int(time.time()), bucket_seconds))
+    window_start = last_bucket - (SCREENER_CANDLES - 1) * bucket_seconds
+    
+    async with db_cursor() as cursor:
+        await cursor.execute("SELECT symbol FROM tickers WHERE turnover24h > 0")
+        symbols = [row['symbol'] for row in await cursor.fetchall()]
+        if not symbols:
+            return {}
         
-        # Fetch directly from tickers table
-        query = """
-        SELECT 
-            symbol,
-            lastPrice as price,
-            price24hPcnt * 100 as change_24h,
-            turnover24h as volume_24h_usdt
-        FROM tickers
-        WHERE turnover24h > 0
-        ORDER BY turnover24h DESC
-        """
+        # Symbols the candle store holds are read from it, the rest with one query
+        parts = []
+        missing = []
+        for symbol in symbols:
+            stored = stored_since(table_name, symbol, window_start)
+            if stored is None:
+                missing.append(symbol)
+            elif len(stored['time']):
+                parts.append((np.full(len(stored['time']), symbol), stored['time'], stored['close']))
         
-        cursor.execute(query)
-        result = cursor.fetchall()
+        if missing:
+            # One range read per symbol on the (symbol, open_time) key
+            await cursor.execute(f"""
+            SELECT symbol, open_time / 1000 as time, close
+            FROM {table_name}
+            WHERE symbol IN ({', '.join(['%s'] * len(missing))}) AND open_time >= %s
+            ORDER BY symbol, open_time
+            """, (*missing, window_start * 1000))
+            rows = await cursor.fetchall()
+            if rows:
+                parts.append((
+                    np.array([row['symbol'] for row in rows]),
+                    np.array([int(row['time']) for row in rows], dtype=np.int64),
+                    np.array([row['close'] for row in rows], dtype=np.float64)
+                ))
+    
+    if not parts:
+        return {}
+    names, times, closes = (np.concatenate(columns) for columns in zip(*parts))
+    
+    # Close of a resampled candle is the close of its last source candle
+    groups = bucket_floor(times, bucket_seconds) if source != timeframe else times
+    last = np.r_[(names[1:] != names[:-1]) | (groups[1:] != groups[:-1]), True]
+    names = names[last]
+    closes = closes[last]
+    
+    starts = np.flatnonzero(np.r_[True, names[1:] != names[:-1]])
+    ends = np.r_[starts[1:], len(names)]
+    return {str(names[start]): closes[start:end] for start, end in zip(starts, ends)}
+
+def screener_fresh(timeframe, entry):
+    """True if the candles did not change since entry was calculated, or it is too recent to redo"""
+    return entry is not None and (
+        entry['version'] == screener_versions.get(timeframe, 0)
+        or time.time() - entry['computed_at'] < SCREENER_MIN_REFRESH_SECONDS
+    )
+
+async def get_screener_fields(timeframe):
+    """Screener fields for every symbol on timeframe, calculated at most once per change of the candles"""
+    entry = screener_results.get(timeframe)
+    if screener_fresh(timeframe, entry):
+        return entry, True
+    
+    # Concurrent requests wait for one calculation
+    lock = screener_locks.setdefault(timeframe, asyncio.Lock())
+    async with lock:
+        entry = screener_results.get(timeframe)
+        if screener_fresh(timeframe, entry):
+            return entry, True
+        version = screener_versions.get(timeframe, 0)
+        series = await fetch_screener_closes(timeframe)
+        symbols, fields = await run_on_workers(batch_workers, screen_series, series)
+        entry = {'symbols': symbols, 'fields': fields, 'version': version, 'computed_at': time.time()}
+        screener_results[timeframe] = entry
+    return entry, False
+
+def invalidate_screener(timeframe):
+    """Mark screener results built from a stored timeframe (all if None) as changed"""
+    for cached in list(screener_results):
+        if timeframe is None or timeframe_source(cached) == timeframe:
+            screener_versions[cached] = screener_versions.get(cached, 0) + 1
+
+@app.get("/api/screener")
+async def get_screener(timeframe: str = "60", where: List[str] = Query([]), within: int = 1,
+                       sort: str = None, limit: int = None):
+    """
+    Evaluate indicator conditions for every symbol on a timeframe
+    
+    where takes conditions such as rsi<30 or volatility>=2 on the latest values
+    (close, change, rsi, macd, signal, histogram, ema50, ema200, volatility)
+    and events ema_cross_up, ema_cross_down, macd_cross_up and macd_cross_down,
+    which match when they happened within the last `within` candles. All
+    conditions must hold. sort takes a field name, prefixed with '-' for
+    descending order.
+    """
+    timeframe = validate_timeframe(timeframe)
+    try:
+        conditions = [parse_condition(condition) for condition in where]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    sort_field = None if sort is None else sort.lstrip('-')
+    if sort_field is not None and sort_field not in VALUE_FIELDS:
+        raise HTTPException(status_code=400, detail=f"Invalid sort field: {sort}")
+    
+    try:
+        entry, cached = await get_screener_fields(timeframe)
+        fields = entry['fields']
+        matches = np.flatnonzero(match_conditions(fields, conditions, within))
         
-        # Format the result
-        symbols = []
-        for row in result:
-            symbols.append({
-                'symbol': row['symbol'],
-                'price': float(row['price']),
-                'change_24h': float(row['change_24h']),
-                'volume_24h_usdt': float(row['volume_24h_usdt'])
-            })
+        if sort_field is not None:
+            values = fields[sort_field][matches]
+            # NaN sorts last in both directions
+            matches = matches[np.argsort(-values if sort.startswith('-') else values, kind='stable')]
+        if limit is not None:
+            matches = matches[:max(limit, 0)]
         
-        cursor.close()
-        conn.close()
+        names = VALUE_FIELDS + tuple(f"{event}_age" for event in EVENT_FIELDS)
+        columns = [to_json_safe(fields[name][matches]) for name in names]
+        results = [
+            {'symbol': entry['symbols'][index], **dict(zip(names, values))}
+            for index, values in zip(matches.tolist(), zip(*columns))
+        ]
         
         return {
             "success": True,
-            "symbols": symbols
+            "timeframe": timeframe,
+            "results": results,
+            "count": len(results),
+            "total": len(entry['symbols']),
+            "cached": cached,
+            "computed_at": int(entry['computed_at'] * 1000)
         }
         
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error running screener: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Symbol list served from memory, reloaded when sync_tickers.py reports a refresh or the snapshot gets old
+SYMBOLS_MAX_AGE = float(os.environ.get('SMARTCHART_SYMBOLS_MAX_AGE', 60))
+SYMBOLS_RENDERED_MAX = 64  # Encoded responses kept per snapshot version
+symbol_snapshot = SymbolSnapshot()
+symbols_rendered = {}
+symbols_lock = asyncio.Lock()
+
+async def fetch_symbol_rows():
+    """Every traded symbol with its current ticker data"""
+    query = """
+    SELECT 
+        symbol,
+        lastPrice as price,
+        price24hPcnt * 100 as change_24h,
+        turnover24h as volume_24h_usdt
+    FROM tickers
+    WHERE turnover24h > 0
+    """
+    async with db_cursor() as cursor:
+        await cursor.execute(query)
+        result = await cursor.fetchall()
+    
+    with timed('convert'):
+        return [
+            {
+                'symbol': row['symbol'],
+                'price': None if row['price'] is None else float(row['price']),
+                'change_24h': None if row['change_24h'] is None else float(row['change_24h']),
+                'volume_24h_usdt': float(row['volume_24h_usdt'])
+            }
+            for row in result
+        ]
+
+async def refresh_symbol_snapshot(force=False):
+    """Reload the symbol snapshot if forced or older than SYMBOLS_MAX_AGE, returns the number of changed symbols"""
+    if not force and time.time() - symbol_snapshot.loaded_at < SYMBOLS_MAX_AGE:
+        return 0
+    # Concurrent requests wait for one reload
+    async with symbols_lock:
+        if not force and time.time() - symbol_snapshot.loaded_at < SYMBOLS_MAX_AGE:
+            return 0
+        changed = symbol_snapshot.update(await fetch_symbol_rows())
+        if changed:
+            symbols_rendered.clear()
+    return changed
+
+@app.get("/api/symbols")
+async def get_symbols(search: str = None, min_volume: float = None, sort: str = "-volume_24h_usdt",
+                      limit: int = None, since_version: int = None):
+    """
+    Fetch all symbols with current ticker data
+    
+    search matches part of the symbol name and min_volume drops symbols with a
+    lower 24h turnover. sort takes symbol, price, change_24h or volume_24h_usdt,
+    prefixed with '-' for descending order, and limit keeps the top N.
+    
+    With since_version (the version of an earlier response) only symbols that
+    changed since then are returned, plus 'removed' symbols to drop; sort and
+    limit are not applied. If that version is too old the full list is
+    returned instead, marked with full=true.
+    """
+    try:
+        await refresh_symbol_snapshot()
+        
+        if since_version is not None:
+            changes = symbol_snapshot.changes_since(since_version, search, min_volume)
+            if changes is not None:
+                rows, removed = changes
+                with timed('encode'):
+                    content = render_json({
+                        "success": True,
+                        "version": symbol_snapshot.version,
+                        "full": False,
+                        "symbols": rows,
+                        "removed": removed
+                    })
+                return Response(content=content, media_type="application/json")
+        
+        key = (symbol_snapshot.version, search, min_volume, sort, limit)
+        content = symbols_rendered.get(key)
+        if content is None:
+            symbols = symbol_snapshot.select(search, min_volume, sort, limit)
+            with timed('encode'):
+                content = render_json({
+                    "success": True,
+                    "version": symbol_snapshot.version,
+                    "full": True,
+                    "symbols": symbols,
+                    "count": len(symbols),
+                    "total": len(symbol_snapshot.rows)
+                })
+            if len(symbols_rendered) >= SYMBOLS_RENDERED_MAX:
+                symbols_rendered.clear()
+            symbols_rendered[key] = content
+        return Response(content=content, media_type="application/json")
+        
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
     except pymysql.Error as e:
         print(f"Database error: {e}")
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
@@ -339,6 +1378,204 @@ async def get_symbols():
         print(f"General error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/symbols/refresh")
+async def refresh_symbols():
+    """Reload the symbol list after the tickers table changed (called by sync_tickers.py)"""
+    try:
+        changed = await refresh_symbol_snapshot(force=True)
+    except pymysql.Error as e:
+        print(f"Database error: {e}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    return {"success": True, "version": symbol_snapshot.version, "changed": changed}
+
+# Live updates over WebSocket, one shared computation per (symbol, timeframe)
+PUSH_MAX_CANDLES = 1000
+PUSH_QUEUE_SIZE = 100
+PUSH_RETRY_SECONDS = 1
+
+async def load_push_update(key, since):
+    """Update message with the candles of key from since (ms) onwards and their indicators"""
+    symbol, timeframe = key
+    try:
+        columns, indicators = await load_candles(symbol, timeframe, PUSH_MAX_CANDLES, since)
+    except HTTPException as e:
+        if e.status_code != 503:
+            raise
+        # Workers or database busy, try again shortly
+        await asyncio.sleep(PUSH_RETRY_SECONDS)
+        push_hub.notify(key, since)
+        return None
+    if len(columns['time']) == 0:
+        return None
+    if len(columns['time']) == PUSH_MAX_CANDLES:
+        # Too much changed to patch the chart, the client reloads instead
+        return {"type": "resync", "symbol": symbol, "timeframe": timeframe}
+    return {
+        "type": "update",
+        "symbol": symbol,
+        "timeframe": timeframe,
+        "data": format_candles(columns),
+        "indicators": to_json_safe(indicators),
+        "count": len(columns['time'])
+    }
+
+push_hub = UpdateHub(load_push_update, PUSH_QUEUE_SIZE)
+
+def notify_subscribers(symbol, timeframe, since):
+    """Push changed candles (stored timeframe, since in ms) to subscribers of every timeframe built from it"""
+    for key in list(push_hub.subscribers):
+        if (symbol is not None and key[0] != symbol) or (timeframe is not None and timeframe_source(key[1]) != timeframe):
+            continue
+        # Resampled candles change from the bucket containing since
+        bucket_since = None if since is None else int(bucket_floor(since // 1000, parse_timeframe(key[1]))) * 1000
+        push_hub.notify(key, bucket_since)
+
+async def forward_messages(websocket, client):
+    """Send queued messages to the WebSocket until the connection closes"""
+    while True:
+        await websocket.send_text(await client.get())
+
+@app.websocket("/api/stream")
+async def stream_updates(websocket: WebSocket):
+    """
+    Live candle and indicator updates
+    
+    Clients send {"action": "subscribe" | "unsubscribe", "symbol": ..., "timeframe": ...}
+    and, after each sync, receive {"type": "update", ...} messages with the changed
+    or appended candles and their indicators (same layout as /api/candles).
+    Candles replace any candle with the same time. A subscribe may include since
+    (open_time in ms) to get the candles from that time right away. A "resync"
+    message means updates were missed and the candles should be reloaded.
+    """
+    await websocket.accept()
+    client = push_hub.connect()
+    sender = asyncio.create_task(forward_messages(websocket, client))
+    try:
+        while True:
+            try:
+                message = json.loads(await websocket.receive_text())
+                action = message['action']
+                symbol = message['symbol']
+                timeframe = normalize_timeframe(str(message['timeframe']))
+                since = message.get('since')
+            except (ValueError, KeyError, TypeError):
+                push_hub.send(client, {"type": "error", "detail": "Expected {action, symbol, timeframe}"})
+                continue
+            
+            if timeframe is None or timeframe_source(timeframe) is None:
+                push_hub.send(client, {"type": "error", "detail": f"Invalid timeframe: {message['timeframe']}"})
+            elif action == 'subscribe':
+                push_hub.subscribe((symbol, timeframe), client)
+                push_hub.send(client, {"type": "subscribed", "symbol": symbol, "timeframe": timeframe})
+                if isinstance(since, int):
+                    push_hub.notify((symbol, timeframe), since)
+            elif action == 'unsubscribe':
+                push_hub.unsubscribe((symbol, timeframe), client)
+                push_hub.send(client, {"type": "unsubscribed", "symbol": symbol, "timeframe": timeframe})
+            else:
+                push_hub.send(client, {"type": "error", "detail": f"Unknown action: {action}"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        push_hub.disconnect(client)
+        sender.cancel()
+
+@app.post("/api/cache/invalidate")
+async def invalidate_cache(symbol: str = None, timeframe: str = None, table: str = None, since: int = None):
+    """
+    Drop cached candles after the database changed (called by sync_all_data.py)
+    
+    timeframe may be given as a table name instead, and since is an open_time in ms.
+    Timeframes resampled from the changed table are invalidated as well.
+    """
+    if table is not None:
+        timeframes = [tf for tf, name in TIMEFRAME_TABLES.items() if name == table]
+        if not timeframes:
+            raise HTTPException(status_code=400, detail=f"Invalid table: {table}")
+        timeframe = timeframes[0]
+    if timeframe is not None and timeframe not in TIMEFRAME_TABLES:
+        raise HTTPException(status_code=400, detail=f"Invalid timeframe: {timeframe}")
+    
+    if timeframe is None:
+        invalidated = candle_cache.invalidate(symbol, None, None if since is None else since // 1000)
+        invalidate_screener(None)
+        notify_subscribers(symbol, None, since)
+        return {"success": True, "invalidated": invalidated}
+    
+    invalidated = 0
+    cached_timeframes = {key[1] for key in candle_cache.entries}
+    for cached in cached_timeframes | {timeframe}:
+        if timeframe_source(cached) != timeframe:
+            continue
+        # Resampled candles are cached per bucket, so invalidate from the bucket containing since
+        bucket_since = None if since is None else int(bucket_floor(since // 1000, parse_timeframe(cached)))
+        invalidated += candle_cache.invalidate(symbol, cached, bucket_since)
+    invalidate_screener(timeframe)
+    notify_subscribers(symbol, timeframe, since)
+    return {"success": True, "invalidated": invalidated}
+
+@app.get("/api/cache")
+async def cache_status():
+    """Candle cache size and hit rate, and candle store usage"""
+    return {"success": True, "cache": candle_cache.stats(), "store": None if candle_store is None else candle_store.stats()}
+
+@app.get("/api/db-pool")
+async def db_pool_status():
+    """Connection pool usage and saturation counters"""
+    return {"success": True, "pool": get_pool_stats()}
+
+@app.get("/api/workers")
+async def workers_status():
+    """Worker pool usage and rejected tasks"""
+    pools = [] if cpu_workers is None else [cpu_workers] + ([batch_workers] if batch_workers is not cpu_workers else [])
+    return {"success": True, "workers": [workers.stats() for workers in pools]}
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Latency histograms plus pool, cache, store, symbol list, worker and stream gauges in Prometheus text format"""
+    pool = get_pool_stats()
+    cache = candle_cache.stats()
+    worker_pools = [] if cpu_workers is None else list({cpu_workers, batch_workers})
+    worker_stats = [workers.stats() for workers in worker_pools]
+    stream = push_hub.stats()
+    store = {} if candle_store is None else candle_store.stats()
+    symbols = symbol_snapshot.stats()
+    
+    sections = [
+        request_seconds.render(),
+        stage_seconds.render(),
+        render_metric('smartchart_db_pool_connections', 'Open database connections', 'gauge', pool.get('size')),
+        render_metric('smartchart_db_pool_in_use', 'Database connections in use', 'gauge', pool.get('in_use')),
+        render_metric('smartchart_db_pool_max', 'Maximum database connections', 'gauge', pool.get('maxsize')),
+        render_metric('smartchart_db_pool_waiting', 'Requests waiting for a connection', 'gauge', pool['waiting']),
+        render_metric('smartchart_db_pool_acquired_total', 'Connections handed out', 'counter', pool['acquired']),
+        render_metric('smartchart_db_pool_timeouts_total', 'Requests that got no connection in time', 'counter', pool['timeouts']),
+        render_metric('smartchart_db_pool_wait_seconds_total', 'Time spent waiting for connections', 'counter', pool['wait_seconds_total']),
+        render_metric('smartchart_candle_cache_entries', 'Cached (symbol, timeframe) entries', 'gauge', cache['entries']),
+        render_metric('smartchart_candle_cache_bytes', 'Memory used by cached candles', 'gauge', cache['bytes']),
+        render_metric('smartchart_candle_cache_max_bytes', 'Candle cache memory budget', 'gauge', cache['max_bytes']),
+        render_metric('smartchart_candle_cache_hit_rate', 'Share of candle cache lookups that were hits', 'gauge', cache['hit_rate']),
+        render_metric('smartchart_candle_cache_hits_total', 'Candle cache hits', 'counter', cache['hits']),
+        render_metric('smartchart_candle_cache_misses_total', 'Candle cache misses', 'counter', cache['misses']),
+        render_metric('smartchart_candle_cache_evictions_total', 'Candle cache evictions', 'counter', cache['evictions']),
+        render_metric('smartchart_candle_store_mapped', 'Memory-mapped (table, symbol) pairs of the candle store', 'gauge', store.get('mapped')),
+        render_metric('smartchart_candle_store_reads_total', 'Reads answered from the candle store', 'counter', store.get('reads')),
+        render_metric('smartchart_candle_store_remaps_total', 'Candle store files mapped again after growing', 'counter', store.get('remaps')),
+        render_metric('smartchart_symbols', 'Symbols in the in-memory symbol list', 'gauge', len(symbol_snapshot.rows)),
+        render_metric('smartchart_symbols_age_seconds', 'Seconds since the symbol list was reloaded', 'gauge', symbols['age_seconds']),
+        render_metric('smartchart_indicator_states', 'Saved streaming indicator states', 'gauge', len(indicator_states)),
+        render_metric('smartchart_workers_running', 'Tasks running on a worker pool', 'gauge',
+                      [({'pool': stats['name']}, stats['running']) for stats in worker_stats]),
+        render_metric('smartchart_workers_queued', 'Tasks waiting for a worker', 'gauge',
+                      [({'pool': stats['name']}, stats['queued']) for stats in worker_stats]),
+        render_metric('smartchart_workers_rejected_total', 'Tasks rejected because the pool was full', 'counter',
+                      [({'pool': stats['name']}, stats['rejected']) for stats in worker_stats]),
+        render_metric('smartchart_stream_subscriptions', 'Subscribed (symbol, timeframe) pairs', 'gauge', stream['subscriptions']),
+        render_metric('smartchart_stream_clients', 'Subscribed WebSocket clients', 'gauge', stream['clients']),
+        render_metric('smartchart_stream_published_total', 'Live updates published', 'counter', stream['published'])
+    ]
+    return PlainTextResponse('\n'.join(sections) + '\n', media_type='text/plain; version=0.0.4')
+
 # Root endpoint for index.html
 @app.get("/")
 async def read_root():
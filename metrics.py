@@ -0,0 +1,111 @@
+"""
+Request timing and Prometheus metrics for SmartChart
+Stages of a request are timed with timed(stage) and exported as histograms
+"""
+
+import bisect
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+# Latency buckets in seconds
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = '') -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class Histogram:
+    """Prometheus histogram with a fixed set of labels"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self.series: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, *labelvalues) -> None:
+        series = self.series.get(labelvalues)
+        if series is None:
+            # Count per bucket (plus +Inf), sum
+            series = self.series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labelvalues, (counts, total) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{bound!r}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labelvalues, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labelvalues)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labelvalues)} {cumulative}")
+        return '\n'.join(lines)
+
+
+def render_metric(name: str, documentation: str, kind: str, samples) -> str:
+    """
+    Render a gauge or counter
+
+    Args:
+        name: Metric name
+        documentation: Help text
+        kind: 'gauge' or 'counter'
+        samples: Value, or list of (labels dict, value); None values are left out
+    """
+    if not isinstance(samples, list):
+        samples = [({}, samples)]
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        if value is not None:
+            lines.append(f"{name}{_labels(tuple(labels), tuple(labels.values()))} {float(value)}")
+    return '\n'.join(lines)
+
+
+class RequestTimer:
+    """Time spent per stage during one request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def server_timing(self) -> str:
+        """Breakdown as a Server-Timing header value (durations in ms)"""
+        entries = [f"{stage};dur={seconds * 1000:.3f}" for stage, seconds in self.stages.items()]
+        entries.append(f"total;dur={self.elapsed * 1000:.3f}")
+        return ', '.join(entries)
+
+
+# Timer of the request being handled, set by the timing middleware
+current_timer: ContextVar[Optional[RequestTimer]] = ContextVar('current_timer', default=None)
+
+
+@contextmanager
+def timed(stage: str):
+    """Add the time spent in the block to `stage` of the current request (if any)"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer = current_timer.get()
+        if timer is not None:
+            timer.add(stage, time.perf_counter() - started)
@@ -0,0 +1,260 @@
+"""
+Timeframe alignment and resampling for SmartChart
+Maps series from a finer timeframe onto the bars of a coarser one and builds
+candles of any timeframe from a finer stored one
+"""
+
+import re
+import warnings
+import numpy as np
+from typing import Dict, Optional, Tuple
+
+# Aggregations supported by aggregate_to_bars
+BAR_AGGREGATIONS = ('last', 'min', 'max', 'absmax')
+
+
+def bucket_index(source_times: np.ndarray, bar_times: np.ndarray, bar_seconds: int) -> np.ndarray:
+    """
+    Find the bar each source time belongs to
+
+    Args:
+        source_times: Sorted open times (seconds) of the finer series
+        bar_times: Sorted open times (seconds) of the bars
+        bar_seconds: Length of one bar in seconds
+
+    Returns:
+        Bar index per source time, -1 where the time is not inside any bar
+    """
+    index = np.searchsorted(bar_times, source_times, side='right') - 1
+    inside = index >= 0
+    inside[inside] = source_times[inside] < bar_times[index[inside]] + bar_seconds
+    return np.where(inside, index, -1)
+
+
+def _groups(source_times, values, bar_times, bar_seconds) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Values inside a bar (NaN dropped), the bar of each group and where each group starts"""
+    index = bucket_index(np.asarray(source_times), np.asarray(bar_times), bar_seconds)
+    values = np.asarray(values, dtype=np.float64)
+    keep = (index >= 0) & ~np.isnan(values)
+    index = index[keep]
+    values = values[keep]
+
+    # Source times are sorted, so each bar's values are contiguous
+    starts = np.flatnonzero(np.r_[True, np.diff(index) != 0]) if len(index) else np.empty(0, dtype=np.intp)
+    return values, index[starts], starts
+
+
+def aggregate_to_bars(source_times, values, bar_times, bar_seconds: int, how: str = 'absmax') -> np.ndarray:
+    """
+    Aggregate a finer series into one value per bar
+
+    Args:
+        source_times: Sorted open times (seconds) of the finer series
+        values: Values of the finer series (NaN values are ignored)
+        bar_times: Sorted open times (seconds) of the bars
+        bar_seconds: Length of one bar in seconds
+        how: 'last', 'min', 'max' or 'absmax' (the value with the largest absolute size)
+
+    Returns:
+        Array with one value per bar (NaN for bars without values)
+    """
+    if how not in BAR_AGGREGATIONS:
+        raise ValueError(f"Unknown aggregation: {how}")
+
+    result = np.full(len(bar_times), np.nan)
+    values, bars, starts = _groups(source_times, values, bar_times, bar_seconds)
+    if len(bars) == 0:
+        return result
+
+    if how == 'last':
+        result[bars] = values[np.r_[starts[1:], len(values)] - 1]
+    elif how == 'min':
+        result[bars] = np.minimum.reduceat(values, starts)
+    elif how == 'max':
+        result[bars] = np.maximum.reduceat(values, starts)
+    else:
+        highest = np.maximum.reduceat(values, starts)
+        lowest = np.minimum.reduceat(values, starts)
+        result[bars] = np.where(highest >= -lowest, highest, lowest)
+    return result
+
+
+def count_signs_per_bar(source_times, values, bar_times, bar_seconds: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Count positive and negative values of a finer series per bar
+
+    Returns:
+        Tuple of (positive counts, negative counts), one entry per bar
+    """
+    positive = np.zeros(len(bar_times), dtype=np.int64)
+    negative = np.zeros(len(bar_times), dtype=np.int64)
+    values, bars, starts = _groups(source_times, values, bar_times, bar_seconds)
+    if len(bars):
+        positive[bars] = np.add.reduceat((values > 0).astype(np.int64), starts)
+        negative[bars] = np.add.reduceat((values < 0).astype(np.int64), starts)
+    return positive, negative
+
+
+# Bybit weekly candles open on Monday 00:00 UTC; the Unix epoch was a Thursday
+WEEK_OFFSET_SECONDS = 4 * 86400
+
+_TIMEFRAME_UNITS = {
+    'm': 60,
+    'h': 3600,
+    'D': 86400,
+    'W': 604800
+}
+
+
+def parse_timeframe(timeframe: str) -> Optional[int]:
+    """
+    Length of a timeframe in seconds
+
+    Accepts Bybit style intervals ('1', '60', 'D', 'W') as well as
+    '30m', '2h', '12h', '3D' and '2W'. Returns None for anything else.
+    """
+    if timeframe.isdigit():
+        minutes = int(timeframe)
+        return minutes * 60 if minutes > 0 else None
+    if timeframe in ('D', 'W'):
+        return _TIMEFRAME_UNITS[timeframe]
+
+    match = re.fullmatch(r'(\d+)([mhDW])', timeframe)
+    if match is None or int(match.group(1)) == 0:
+        return None
+    return int(match.group(1)) * _TIMEFRAME_UNITS[match.group(2)]
+
+
+def bucket_offset(bucket_seconds: int) -> int:
+    """Offset from the epoch that buckets of this length are aligned to"""
+    return WEEK_OFFSET_SECONDS if bucket_seconds % _TIMEFRAME_UNITS['W'] == 0 else 0
+
+
+def bucket_floor(times, bucket_seconds: int):
+    """Open time (seconds) of the bucket each time falls in"""
+    offset = bucket_offset(bucket_seconds)
+    return (times - offset) // bucket_seconds * bucket_seconds + offset
+
+
+def nests_in(source_seconds: int, bucket_seconds: int) -> bool:
+    """True if every source bar lies entirely inside one bucket"""
+    return (
+        bucket_seconds % source_seconds == 0
+        and (bucket_offset(bucket_seconds) - bucket_offset(source_seconds)) % source_seconds == 0
+    )
+
+
+def resample_ohlcv(columns: Dict[str, np.ndarray], bucket_seconds: int) -> Dict[str, np.ndarray]:
+    """
+    Aggregate candle columns into buckets of bucket_seconds
+
+    Args:
+        columns: 'time' (seconds, sorted) plus 'open', 'high', 'low', 'close', 'volume'
+            arrays, and optionally 'turnover' (summed like volume)
+        bucket_seconds: Bucket length in seconds
+
+    Returns:
+        Columns with one row per non-empty bucket, 'time' being the bucket's open time
+    """
+    buckets = bucket_floor(columns['time'], bucket_seconds)
+    if len(buckets) == 0:
+        return {name: values[:0].copy() for name, values in columns.items()}
+
+    starts = np.flatnonzero(np.r_[True, np.diff(buckets) != 0])
+    ends = np.r_[starts[1:], len(buckets)] - 1
+    result = {
+        'time': buckets[starts],
+        'open': columns['open'][starts],
+        'high': np.maximum.reduceat(columns['high'], starts),
+        'low': np.minimum.reduceat(columns['low'], starts),
+        'close': columns['close'][ends],
+        'volume': np.add.reduceat(columns['volume'], starts)
+    }
+    if 'turnover' in columns:
+        result['turnover'] = np.add.reduceat(columns['turnover'], starts)
+    return result
+
+
+def merge_candles(columns: Dict[str, np.ndarray], size: int) -> Dict[str, np.ndarray]:
+    """
+    Merge every `size` consecutive candles into one, keeping the price range
+
+    Args:
+        columns: 'time' plus 'open', 'high', 'low', 'close', 'volume' arrays
+        size: Candles per merged candle (the last one may hold fewer)
+
+    Returns:
+        Columns with one row per group, 'time' being the open time of its first candle
+    """
+    n = len(columns['time'])
+    if size <= 1 or n == 0:
+        return columns
+
+    starts = np.arange(0, n, size)
+    ends = np.r_[starts[1:], n] - 1
+    return {
+        'time': columns['time'][starts],
+        'open': columns['open'][starts],
+        'high': np.maximum.reduceat(columns['high'], starts),
+        'low': np.minimum.reduceat(columns['low'], starts),
+        'close': columns['close'][ends],
+        'volume': np.add.reduceat(columns['volume'], starts)
+    }
+
+
+def lttb_select(values: np.ndarray, size: int) -> np.ndarray:
+    """
+    Pick one value per group of `size` points with Largest-Triangle-Three-Buckets
+
+    The groups are the same as in merge_candles, so the result lines up with the
+    merged candles. The first group keeps its first value and the last group its
+    last; every other group keeps the value forming the largest triangle with the
+    value kept before it and the mean of the next group. NaN values are skipped
+    and a group of only NaN stays NaN. Works along the last axis.
+
+    Args:
+        values: Series with points along the last axis (one series per row for 2D input)
+        size: Points per group
+
+    Returns:
+        Array with one value per group along the last axis
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = values.shape[-1]
+    if size <= 1 or n == 0:
+        return values
+
+    n_groups = -(-n // size)
+    padded = np.full(values.shape[:-1] + (n_groups * size,), np.nan)
+    padded[..., :n] = values
+    groups = padded.reshape(values.shape[:-1] + (n_groups, size))
+    with warnings.catch_warnings():
+        # Mean of a group of only NaN is NaN
+        warnings.simplefilter('ignore', RuntimeWarning)
+        means = np.nanmean(groups, axis=-1)
+    group_starts = np.arange(n_groups) * size
+    centers = (group_starts + np.minimum(group_starts + size, n) - 1) / 2
+
+    result = np.empty(values.shape[:-1] + (n_groups,))
+    result[..., 0] = groups[..., 0, 0]
+    result[..., -1] = values[..., -1]
+    prev_x = np.zeros(values.shape[:-1])
+    prev_y = result[..., 0]
+    offsets = np.arange(size)
+    for group in range(1, n_groups - 1):
+        x = group * size + offsets
+        y = groups[..., group, :]
+        next_x = centers[group + 1]
+        next_y = means[..., group + 1]
+        area = np.abs(
+            (prev_x - next_x)[..., None] * (y - prev_y[..., None])
+            - (prev_x[..., None] - x) * (next_y - prev_y)[..., None]
+        )
+        # Values next to a missing neighbour have no triangle, so fall back to the first valid value
+        area = np.where(np.isnan(area), np.where(np.isnan(y), -np.inf, -1.0), area)
+        pick = np.argmax(area, axis=-1)
+        chosen = np.take_along_axis(y, pick[..., None], axis=-1)[..., 0]
+        result[..., group] = chosen
+        prev_x = np.where(np.isnan(chosen), prev_x, group * size + pick)
+        prev_y = np.where(np.isnan(chosen), prev_y, chosen)
+    return result
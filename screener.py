@@ -0,0 +1,133 @@
+"""
+Multi-symbol screener for SmartChart
+Runs the indicators for many symbols at once and filters them on conditions
+"""
+
+import re
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+from indicators import macd_array, rsi_array, dual_ema_array, volatility_array
+
+# Latest value fields, available in conditions and sorting
+VALUE_FIELDS = ('close', 'change', 'rsi', 'macd', 'signal', 'histogram', 'ema50', 'ema200', 'volatility')
+
+# Events, true when they happened within the last `within` candles
+EVENT_FIELDS = ('ema_cross_up', 'ema_cross_down', 'macd_cross_up', 'macd_cross_down')
+
+_COMPARISONS = {
+    '<': np.less,
+    '<=': np.less_equal,
+    '>': np.greater,
+    '>=': np.greater_equal
+}
+
+_CONDITION = re.compile(r'\s*(\w+)\s*(<=|>=|<|>)\s*(-?\d+(?:\.\d*)?(?:[eE][-+]?\d+)?)\s*')
+
+
+def parse_condition(text: str) -> Tuple[str, Optional[str], Optional[float]]:
+    """
+    Parse a condition such as 'rsi<30', 'volatility >= 1.5' or 'ema_cross_up'
+
+    Returns:
+        Tuple of (field, operator, value); events have operator None and value None
+
+    Raises:
+        ValueError: If the condition or its field is not recognized
+    """
+    if text.strip() in EVENT_FIELDS:
+        return text.strip(), None, None
+    match = _CONDITION.fullmatch(text)
+    if match is None or match.group(1) not in VALUE_FIELDS:
+        raise ValueError(f"Invalid condition: {text}")
+    return match.group(1), match.group(2), float(match.group(3))
+
+
+def _candles_since_last(events: np.ndarray) -> np.ndarray:
+    """Candles since the last True along the last axis (0 = on the last candle), NaN if there is none"""
+    n = events.shape[-1]
+    if n == 0:
+        return np.full(events.shape[:-1], np.nan)
+    found = events.any(axis=-1)
+    last = n - 1 - np.argmax(events[..., ::-1], axis=-1)
+    return np.where(found, n - 1 - last, np.nan)
+
+
+def _cross_ages(fast: np.ndarray, slow: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Candles since fast last crossed above and below slow (NaN where it did not)"""
+    difference = fast - slow
+    before = difference[..., :-1]
+    after = difference[..., 1:]
+    up = (after > 0) & (before <= 0)
+    down = (after < 0) & (before >= 0)
+    return _candles_since_last(up), _candles_since_last(down)
+
+
+def screen_closes(closes: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Screener fields for a 2D array of closes (one row per symbol, oldest first)
+
+    Returns:
+        Dictionary of field name to one value per row. Events are stored as
+        '<event>_age', the number of candles since the event last happened.
+    """
+    closes = np.asarray(closes, dtype=np.float64)
+    macd = macd_array(closes)
+    emas = dual_ema_array(closes)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change = (closes[:, -1] / closes[:, -2] - 1) * 100 if closes.shape[-1] > 1 else np.full(len(closes), np.nan)
+
+    fields = {
+        'close': closes[:, -1],
+        'change': change,
+        'rsi': rsi_array(closes)[:, -1],
+        'macd': macd['macd'][:, -1],
+        'signal': macd['signal'][:, -1],
+        'histogram': macd['histogram'][:, -1],
+        'ema50': emas['ema50'][:, -1],
+        'ema200': emas['ema200'][:, -1],
+        'volatility': volatility_array(closes)[:, -1]
+    }
+    fields['ema_cross_up_age'], fields['ema_cross_down_age'] = _cross_ages(emas['ema50'], emas['ema200'])
+    fields['macd_cross_up_age'], fields['macd_cross_down_age'] = _cross_ages(macd['macd'], macd['signal'])
+    return fields
+
+
+def screen_series(series: Dict[str, np.ndarray]) -> Tuple[List[str], Dict[str, np.ndarray]]:
+    """
+    Screener fields for many symbols' closes
+
+    Symbols with the same number of candles are stacked into one 2D array, so
+    the usual case (every symbol has the full window) is a single batch.
+
+    Args:
+        series: Symbol to 1D array of closes (oldest first)
+
+    Returns:
+        Tuple of (symbols, fields) with one value per symbol in each field
+    """
+    symbols = []
+    batches = []
+    by_length = {}
+    for symbol, closes in series.items():
+        if len(closes) > 0:
+            by_length.setdefault(len(closes), []).append(symbol)
+
+    for length, group in sorted(by_length.items(), reverse=True):
+        symbols.extend(group)
+        batches.append(screen_closes(np.stack([series[symbol] for symbol in group])))
+
+    if not batches:
+        names = VALUE_FIELDS + tuple(f"{event}_age" for event in EVENT_FIELDS)
+        return [], {name: np.empty(0) for name in names}
+    return symbols, {name: np.concatenate([batch[name] for batch in batches]) for name in batches[0]}
+
+
+def match_conditions(fields: Dict[str, np.ndarray], conditions: List[Tuple[str, str, float]], within: int = 1) -> np.ndarray:
+    """Boolean mask of the symbols that meet every condition (NaN never matches)"""
+    mask = np.ones(len(fields['close']), dtype=bool)
+    for field, operator, value in conditions:
+        if operator is None:
+            mask &= fields[f"{field}_age"] < within
+        else:
+            mask &= _COMPARISONS[operator](fields[field], value)
+    return mask
@@ -0,0 +1,128 @@
+"""
+In-memory symbol list for SmartChart
+Holds the latest ticker row per symbol with a version per change, so clients can fetch only what changed
+"""
+
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Fields of a symbol row, all of them can be sorted on
+SYMBOL_FIELDS = ('symbol', 'price', 'change_24h', 'volume_24h_usdt')
+
+
+class SymbolSnapshot:
+    """
+    Ticker rows per symbol with change tracking
+
+    Every update() that changes anything bumps the version, and each symbol
+    remembers the version it last changed (or was removed) in. Versions start
+    at the creation time in ms, so a client holding a version from before a
+    restart is older than anything known and gets the full list again.
+    Tombstones of removed symbols are kept for the last max_removed removals.
+    """
+
+    def __init__(self, max_removed: int = 1000):
+        self.max_removed = max_removed
+        self.version = int(time.time() * 1000)
+        self.oldest_version = self.version
+        self.rows: Dict[str, dict] = {}
+        self.changed: Dict[str, int] = {}
+        self.removed: Dict[str, int] = {}
+        self.loaded_at = 0.0
+        self.updates = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self.loaded_at > 0
+
+    def update(self, rows: Iterable[dict]) -> int:
+        """
+        Replace the snapshot with the current rows (symbols not among them are removed)
+
+        Returns:
+            Number of symbols that were added, changed or removed
+        """
+        rows = {row['symbol']: row for row in rows}
+        added_or_changed = [symbol for symbol, row in rows.items() if self.rows.get(symbol) != row]
+        gone = [symbol for symbol in self.rows if symbol not in rows]
+        self.loaded_at = time.time()
+        self.updates += 1
+        if not added_or_changed and not gone:
+            return 0
+
+        self.version += 1
+        for symbol in added_or_changed:
+            self.changed[symbol] = self.version
+            self.removed.pop(symbol, None)
+        for symbol in gone:
+            del self.changed[symbol]
+            self.removed[symbol] = self.version
+        self.rows = rows
+
+        # Forget the oldest tombstones, clients behind them need the full list
+        if len(self.removed) > self.max_removed:
+            oldest = sorted(self.removed.items(), key=lambda item: item[1])[:len(self.removed) - self.max_removed]
+            for symbol, version in oldest:
+                del self.removed[symbol]
+                self.oldest_version = max(self.oldest_version, version)
+        return len(added_or_changed) + len(gone)
+
+    def select(self, search: Optional[str] = None, min_volume: Optional[float] = None,
+               sort: str = '-volume_24h_usdt', limit: Optional[int] = None) -> List[dict]:
+        """
+        Rows matching the filters, sorted on a field ('-' prefix for descending) and cut to limit
+
+        Raises:
+            ValueError: If the sort field is not one of SYMBOL_FIELDS
+        """
+        field = sort.lstrip('-')
+        if field not in SYMBOL_FIELDS:
+            raise ValueError(f"Invalid sort field: {sort}")
+        rows = [row for row in self.rows.values() if self._matches(row, search, min_volume)]
+        # None sorts last in both directions
+        present = [row for row in rows if row[field] is not None]
+        present.sort(key=lambda row: row[field], reverse=sort.startswith('-'))
+        rows = present + [row for row in rows if row[field] is None]
+        return rows if limit is None else rows[:max(limit, 0)]
+
+    def changes_since(self, version: int, search: Optional[str] = None,
+                      min_volume: Optional[float] = None) -> Optional[Tuple[List[dict], List[str]]]:
+        """
+        Rows changed after version and symbols to drop since then
+
+        A changed symbol that no longer matches the filters is listed as removed,
+        so a client holding a filtered list can apply the result as is.
+
+        Returns:
+            Tuple of (rows, removed symbols), or None if version is too old (or
+            from another process) and the client needs the full list
+        """
+        if version < self.oldest_version or version > self.version:
+            return None
+        rows = []
+        removed = [symbol for symbol, changed in self.removed.items() if changed > version]
+        for symbol, changed in self.changed.items():
+            if changed > version:
+                row = self.rows[symbol]
+                if self._matches(row, search, min_volume):
+                    rows.append(row)
+                else:
+                    removed.append(symbol)
+        return rows, removed
+
+    def stats(self) -> dict:
+        return {
+            'symbols': len(self.rows),
+            'version': self.version,
+            'tombstones': len(self.removed),
+            'updates': self.updates,
+            'age_seconds': time.time() - self.loaded_at if self.loaded else None
+        }
+
+    @staticmethod
+    def _matches(row: dict, search: Optional[str], min_volume: Optional[float]) -> bool:
+        if search and search.upper() not in row['symbol'].upper():
+            return False
+        if min_volume is not None and (row['volume_24h_usdt'] or 0) < min_volume:
+            return False
+        return True
@@ -3,9 +3,18 @@ import aiohttp
 import aiomysql
 import time
 import json
+from collections import deque
 from datetime import datetime
 import pymysql.err
-import subprocess
+import argparse
+import functools
+import os
+import tempfile
+import zlib
+import numpy as np
+from candle_store import CandleStore, DEFAULT_ROOT as CANDLE_STORE_ROOT
+from resample import resample_ohlcv, bucket_floor, parse_timeframe
+import sync_tickers
 
 # Databaskonfiguration
 DB_HOST = 'localhost'
@@ -14,15 +23,75 @@ DB_USER = 'root'
 DB_PASS = 'root'
 DB_NAME = 'smartchart'
 
+# Bybits API, kan pekas om till fake_bybit.py för att köra synken lokalt (--api-url)
+BYBIT_API_URL = 'https://api.bybit.com'
+
 DEFAULT_START_TIMESTAMP = int(datetime(2000, 1, 1).timestamp() * 1000)
 MAX_CONCURRENT_REQUESTS = 10
-REQUESTS_PER_SECOND = 60  # Antal requests per sekund
+REQUESTS_PER_SECOND = 60  # Antal requests per sekund, gemensamt för alla timeframes
+REQUEST_BURST = 10  # Max antal sparade tokens när API-budgeten inte används
+MIN_REQUESTS_PER_SECOND = 2  # Lägsta takt efter 429/403
+MAX_REQUESTS_PER_SECOND = 110  # Högsta takt när Bybits rate limit-headers visar utrymme (IP-gränsen är 600 per 5 s)
+RATE_LIMIT_RESERVE = 0.1  # Andel av kvoten i headers som lämnas orörd
+HTTP_CONNECTIONS = 64  # Max öppna anslutningar i aiohttp-sessionen
+HTTP_KEEPALIVE_SECONDS = 30  # Hur länge en ledig anslutning hålls öppen
+HTTP_TIMEOUT = 30  # Sekunder innan en request ges upp och görs om
+RATE_LIMIT_RET_CODES = (10006, 10018)  # Bybits retCode för för många requests (per användare och per IP)
 MAX_RETRIES = 5
 RETRY_DELAY = 0.5
 
+# Skrivning till databasen
+WRITERS_PER_TABLE = 2  # Writers per timeframe, symbolerna fördelas mellan dem
+WRITE_QUEUE_SIZE = 50  # Chunks som får vänta per writer innan hämtningen pausas
+WRITE_BATCH_ROWS = 20000  # Max rader per transaktion när flera chunks väntar
+INSERT_ROWS = 5000  # Rader per INSERT-sats
+LOAD_DATA_INFILE = False  # Skriv stora batcher med LOAD DATA LOCAL INFILE (för första backfill, kräver local_infile på servern)
+LOAD_DATA_MIN_ROWS = 5000  # Minsta batch som skrivs med LOAD DATA
+WRITE_RETRIES = 3  # Försök per batch innan dess symboler markeras som misslyckade
+
+# Skrivna rader och tid per tabell
+ingest_stats = {}
+
+# Symboler vars candles inte kunde sparas: tabell -> {symbol: första open_time (ms) som saknas}
+failed_writes = {}
+
+# Bygg högre timeframes av 1m-candles i stället för att hämta dem från API:et (--derive)
+DERIVE_TIMEFRAMES = False
+
+# Kör som daemon i stället för ett pass (--daemon)
+DAEMON = False
+DAEMON_CLOSE_DELAY = 2  # Sekunder efter en stängning innan candlen hämtas, så Bybit hunnit stänga den
+DAEMON_MAX_WAIT = 300  # Max sekunder mellan hämtningar per timeframe, så pågående D- och W-candles hålls färska
+TICKER_REFRESH_SECONDS = 3600  # Hur ofta daemonen uppdaterar symbollistan
+
+# API-endpoint som rensar API:ets candle-cache efter att nya candles sparats (None = av)
+API_CACHE_INVALIDATE_URL = 'http://localhost:8000/api/cache/invalidate'
+
+# Lokal candle-store som API:et läser direkt från disk (None = av)
+CANDLE_STORE_DIR = CANDLE_STORE_ROOT
+CANDLE_STORE_COPY_ROWS = 100000  # Rader per query när befintlig historik kopieras från MySQL
+candle_store = CandleStore(CANDLE_STORE_DIR) if CANDLE_STORE_DIR else None
+
+# Kopior från MySQL som pågår: (tabell, symbol) -> namnet kopian skrivs under
+store_copies = {}
+# (tabell, symbol) som inte skrivs till candle-storen medan äldre candles hämtas, storen byggs om efteråt
+store_rebuilds = set()
+
 # Lista över timeframes i ordning, störst till minst
 timeframes = ["W", "D", "240", "60", "15", "5", "1"]
 
+# Andel av API-budgeten per timeframe när flera väntar på tokens. Små timeframes har
+# långt fler sidor att hämta och skulle annars ta nästan alla tokens.
+interval_priority = {
+    "W": 4,
+    "D": 4,
+    "240": 3,
+    "60": 3,
+    "15": 2,
+    "5": 2,
+    "1": 1
+}
+
 intervals_mapping = {
     "1": "candles1",
     "5": "candles5",
@@ -40,6 +109,9 @@ async def get_all_symbols(pool):
             rows = await cur.fetchall()
     return [r[0] for r in rows]
 
+# Timeframes som byggs av 1m-candles, varje nivå av den föregående (alla ryms jämnt i nästa)
+derived_timeframes = ["5", "15", "60", "240", "D", "W"]
+
 async def get_last_candle_timestamp(pool, symbol, table_name):
     async with pool.acquire() as conn:
         async with conn.cursor() as cur:
@@ -48,138 +120,713 @@ async def get_last_candle_timestamp(pool, symbol, table_name):
             row = await cur.fetchone()
     return row[0] if row else None
 
-async def save_candles_to_database(pool, symbol, candles, table_name):
-    if not candles:
+async def invalidate_api_cache(session, symbol, table_name, since):
+    """Säg åt API:et att candles från och med since (ms) har ändrats"""
+    if session is None or API_CACHE_INVALIDATE_URL is None:
+        return
+    params = {'symbol': symbol, 'table': table_name, 'since': since}
+    try:
+        async with session.post(API_CACHE_INVALIDATE_URL, params=params, timeout=aiohttp.ClientTimeout(total=2)) as resp:
+            await resp.read()
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        # API:et kör inte, så det finns ingen cache att rensa
+        pass
+
+# Invalideringar som skickas i bakgrunden, så writers aldrig väntar på API:et
+invalidations = set()
+
+async def invalidate_api_caches(session, table_name, since):
+    await asyncio.gather(*(invalidate_api_cache(session, symbol, table_name, first) for symbol, first in since.items()))
+
+def schedule_invalidations(session, table_name, since):
+    """Skicka invalideringar för en sparad batch (symbol -> tidigaste open_time i ms) samtidigt, i en egen task"""
+    if session is None or API_CACHE_INVALIDATE_URL is None or not since:
         return
+    task = asyncio.create_task(invalidate_api_caches(session, table_name, since))
+    invalidations.add(task)
+    task.add_done_callback(invalidations.discard)
+
+def candle_store_columns(open_times, rows):
+    """Kolumner för candle-storen av open_time (ms) och rader med open, high, low, close, volume"""
+    values = np.array(rows, dtype=np.float64).reshape(-1, 5)
+    columns = {'time': np.asarray(open_times, dtype=np.int64) // 1000}
+    for i, field in enumerate(('open', 'high', 'low', 'close', 'volume')):
+        columns[field] = values[:, i]
+    return columns
+
+async def fill_candle_store(pool, symbol, table_name):
+    """
+    Kopiera symbolens historik från MySQL till candle-storen om den inte redan finns där
+
+    Writers skriver sina rader även till kopian medan den pågår, så rader som
+    sparas efter att deras del av tabellen lästs finns med när kopian ersätter storen.
+    """
+    key = (table_name, symbol)
+    if candle_store is None or key in store_rebuilds or key in store_copies or candle_store.is_complete(table_name, symbol):
+        return
+
+    # Kopieras under ett eget namn, eftersom API:et bara kan läsa de senaste candles ur en ofullständig store
+    staging = f"{symbol}.copy"
+    candle_store.remove(table_name, staging)
+    store_copies[key] = staging
+    last_open_time = -1
+    copied = 0
+    try:
+        while True:
+            async with pool.acquire() as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute(f"""
+                    SELECT open_time, open, high, low, close, volume FROM {table_name}
+                    WHERE symbol=%s AND open_time > %s ORDER BY open_time LIMIT %s
+                    """, (symbol, last_open_time, CANDLE_STORE_COPY_ROWS))
+                    rows = await cur.fetchall()
+            if not rows:
+                break
+            candle_store.write(table_name, staging, candle_store_columns([r[0] for r in rows], [r[1:] for r in rows]))
+            copied += len(rows)
+            last_open_time = rows[-1][0]
+            if len(rows) < CANDLE_STORE_COPY_ROWS:
+                break
+
+        # Ingen await efter sista läsningen, så inga writes hinner komma emellan
+        candle_store.mark_complete(table_name, staging)
+        candle_store.move(table_name, staging, symbol)
+    finally:
+        del store_copies[key]
+    if copied:
+        print(f"[{symbol}] Kopierade {copied} candles från {table_name} till candle-storen")
+
+CANDLE_COLUMNS = ('open_time', 'open', 'high', 'low', 'close', 'volume', 'turnover')
+
+def candle_datetimes(open_time):
+    """open_datetime-strängar (UTC) för open_time i ms"""
+    if len(open_time) == 0:
+        return np.empty(0, dtype='U19')
+    seconds = open_time.astype('datetime64[ms]').astype('datetime64[s]')
+    return np.char.replace(seconds.astype(str), 'T', ' ')
+
+def parse_candles(candles):
+    """
+    Bybit-listan av candles (strängar, nyast först) som kolumner sorterade på open_time
+
+    Returnerar dict med int64 'open_time' (ms), float64 OHLCV och turnover samt
+    'open_datetime' som strängar i UTC. Tar även rader från databasen i CANDLE_COLUMNS-ordning.
+    """
+    values = np.array(candles, dtype=np.float64).reshape(-1, len(CANDLE_COLUMNS))
+    values = values[np.argsort(values[:, 0], kind='stable')]
+    columns = {name: values[:, i] for i, name in enumerate(CANDLE_COLUMNS)}
+    columns['open_time'] = columns['open_time'].astype(np.int64)
+    columns['open_datetime'] = candle_datetimes(columns['open_time'])
+    return columns
+
+def aggregate_candles(columns, bucket_seconds):
+    """Slå ihop candles (kolumner som från parse_candles) till en rad per bucket om bucket_seconds"""
+    result = resample_ohlcv({'time': columns['open_time'] // 1000, **{name: columns[name] for name in CANDLE_COLUMNS[1:]}}, bucket_seconds)
+    open_time = result.pop('time') * 1000
+    return {'open_time': open_time, **result, 'open_datetime': candle_datetimes(open_time)}
+
+class CandleDeriver:
+    """
+    Bygger derived_timeframes för en symbol av 1m-chunks i tidsordning
+
+    Varje nivå byggs av den föregående (5m av 1m, 15m av 5m osv.) och bara de
+    buckets som nya rader hamnar i skrivs. Per nivå sparas raderna i den senaste
+    bucketen, så nästa chunk kan bygga klart den. Inför första chunken läses de
+    tidigare raderna i bucketen från databasen, vilket är som mest några rader
+    per nivå.
+    """
+
+    def __init__(self, pool, symbol, queues):
+        self.pool = pool
+        self.symbol = symbol
+        self.queues = queues
+        self.buffers = {}  # timeframe -> rader i föregående nivå sedan början av senaste bucketen
+        self.first_open_time = None  # Första 1m-candlen som lagts till
+
+    async def read_bucket_start(self, source, bucket_seconds, open_time):
+        """Rader i source-tabellen från början av bucketen som open_time (ms) ligger i, fram till open_time"""
+        bucket_start = int(bucket_floor(open_time // 1000, bucket_seconds)) * 1000
+        async with self.pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(f"""
+                SELECT open_time, open, high, low, close, volume, turnover FROM {intervals_mapping[source]}
+                WHERE symbol=%s AND open_time >= %s AND open_time < %s ORDER BY open_time
+                """, (self.symbol, bucket_start, open_time))
+                rows = await cur.fetchall()
+        return parse_candles(rows)
+
+    async def add(self, columns):
+        """Bygg och köa högre timeframes för en ny chunk 1m-candles"""
+        if self.first_open_time is None:
+            self.first_open_time = int(columns['open_time'][0])
+        source = "1"
+        for interval in derived_timeframes:
+            bucket_seconds = parse_timeframe(interval)
+            first = int(columns['open_time'][0])
+            buffer = self.buffers.get(interval)
+            if buffer is None:
+                buffer = await self.read_bucket_start(source, bucket_seconds, first)
+            # Chunken börjar med den senaste candlen i förra chunken, nya värden gäller
+            keep = buffer['open_time'] < first
+            combined = {name: np.concatenate([buffer[name][keep], values]) for name, values in columns.items()}
+            derived = aggregate_candles(combined, bucket_seconds)
+            await writer_queue(self.queues[intervals_mapping[interval]], self.symbol).put((self.symbol, derived))
+
+            last_bucket = derived['open_time'][-1]
+            self.buffers[interval] = {name: values[combined['open_time'] >= last_bucket] for name, values in combined.items()}
+            source, columns = interval, derived
 
-    values = []
-    for c in candles:
-        open_time = int(c[0])
-        open_datetime = datetime.utcfromtimestamp(open_time / 1000).strftime('%Y-%m-%d %H:%M:%S')
-        open_price = float(c[1])
-        high_price = float(c[2])
-        low_price = float(c[3])
-        close_price = float(c[4])
-        volume = float(c[5])
-        turnover = float(c[6])
-        values.append((
-            symbol,
-            open_time,
-            open_datetime,
-            open_price,
-            high_price,
-            low_price,
-            close_price,
-            volume,
-            turnover
+def chunk_rows(chunks):
+    """(symbol, kolumner)-chunks som rader i ordningen i INSERT-satsen, sorterade på symbol och open_time"""
+    rows = []
+    for symbol, columns in sorted(chunks, key=lambda chunk: chunk[0]):
+        rows.extend(zip(
+            [symbol] * len(columns['open_time']),
+            columns['open_time'].tolist(),
+            columns['open_datetime'].tolist(),
+            *(columns[name].tolist() for name in CANDLE_COLUMNS[1:])
         ))
+    return rows
 
-    placeholders = ", ".join(["(%s,%s,%s,%s,%s,%s,%s,%s,%s)"] * len(values))
-    sql = f"""
-    INSERT INTO {table_name} (symbol, open_time, open_datetime, open, high, low, close, volume, turnover)
-    VALUES {placeholders}
-    AS new
-    ON DUPLICATE KEY UPDATE
-        open=new.open,
-        high=new.high,
-        low=new.low,
-        close=new.close,
-        volume=new.volume,
-        turnover=new.turnover
+async def insert_rows(cur, table_name, rows):
+    """Upserta rader med multi-row INSERT, INSERT_ROWS rader per sats"""
+    for start in range(0, len(rows), INSERT_ROWS):
+        part = rows[start:start + INSERT_ROWS]
+        placeholders = ", ".join(["(%s,%s,%s,%s,%s,%s,%s,%s,%s)"] * len(part))
+        sql = f"""
+        INSERT INTO {table_name} (symbol, open_time, open_datetime, open, high, low, close, volume, turnover)
+        VALUES {placeholders}
+        AS new
+        ON DUPLICATE KEY UPDATE
+            open=new.open,
+            high=new.high,
+            low=new.low,
+            close=new.close,
+            volume=new.volume,
+            turnover=new.turnover
+        """
+        await cur.execute(sql, tuple(value for row in part for value in row))
+
+async def load_rows(cur, table_name, rows):
+    """
+    Upserta rader med LOAD DATA LOCAL INFILE via en temporär CSV-fil
+
+    Raderna laddas in i en temporär tabell och flyttas med INSERT ... SELECT ...
+    ON DUPLICATE KEY UPDATE, samma upsert som insert_rows. LOAD DATA REPLACE
+    direkt i tabellen skulle radera och lägga in befintliga rader på nytt.
+    """
+    staging = f"{table_name}_load"
+    with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as file:
+        file.write('\n'.join(','.join(map(str, row)) for row in rows))
+    try:
+        # Temporära tabeller hör till anslutningen och ger ingen implicit commit
+        await cur.execute(f"CREATE TEMPORARY TABLE IF NOT EXISTS {staging} LIKE {table_name}")
+        await cur.execute(f"DELETE FROM {staging}")
+        await cur.execute(f"""
+        LOAD DATA LOCAL INFILE %s INTO TABLE {staging}
+        FIELDS TERMINATED BY ',' LINES TERMINATED BY '\\n'
+        (symbol, open_time, open_datetime, open, high, low, close, volume, turnover)
+        """, (file.name,))
+        await cur.execute(f"""
+        INSERT INTO {table_name} (symbol, open_time, open_datetime, open, high, low, close, volume, turnover)
+        SELECT symbol, open_time, open_datetime, open, high, low, close, volume, turnover FROM {staging} AS staged
+        ON DUPLICATE KEY UPDATE
+            open=staged.open,
+            high=staged.high,
+            low=staged.low,
+            close=staged.close,
+            volume=staged.volume,
+            turnover=staged.turnover
+        """)
+    finally:
+        os.remove(file.name)
+
+async def save_candles_to_database(pool, chunks, table_name, session=None):
     """
+    Spara candles för en eller flera symboler i en transaktion
 
-    flat_values = []
-    for v in values:
-        flat_values.extend(v)
+    Args:
+        chunks: Lista av (symbol, kolumner från parse_candles)
+    """
+    chunks = [(symbol, columns) for symbol, columns in chunks if len(columns['open_time'])]
+    if not chunks:
+        return
 
+    rows = chunk_rows(chunks)
+    started = time.perf_counter()
     attempt = 0
     while True:
         attempt += 1
         try:
             async with pool.acquire() as conn:
-                async with conn.cursor() as cur:
-                    await cur.execute(sql, tuple(flat_values))
-                await conn.commit()
-            return
+                try:
+                    async with conn.cursor() as cur:
+                        if LOAD_DATA_INFILE and len(rows) >= LOAD_DATA_MIN_ROWS:
+                            await load_rows(cur, table_name, rows)
+                        else:
+                            await insert_rows(cur, table_name, rows)
+                    await conn.commit()
+                except BaseException:
+                    await conn.rollback()
+                    raise
+            break
         except pymysql.err.OperationalError as e:
             # Deadlock
             if e.args[0] == 1213 and attempt < MAX_RETRIES:
-                print(f"[{symbol}] Deadlock inträffade, försöker igen... ({attempt}/{MAX_RETRIES})")
+                print(f"[{table_name}] Deadlock inträffade, försöker igen... ({attempt}/{MAX_RETRIES})")
                 await asyncio.sleep(RETRY_DELAY)
                 continue
             else:
-                print(f"[{symbol}] Fel vid insättning: {e}")
+                print(f"[{table_name}] Fel vid insättning av {len(rows)} rader: {e}")
                 raise
 
-async def rate_limiter(token_queue: asyncio.Queue, requests_per_second: int):
-    interval = 1.0 / requests_per_second
-    while True:
-        await token_queue.put(None)  
-        await asyncio.sleep(interval)
+    stats = ingest_stats.setdefault(table_name, {'rows': 0, 'transactions': 0, 'seconds': 0.0})
+    stats['rows'] += len(rows)
+    stats['transactions'] += 1
+    stats['seconds'] += time.perf_counter() - started
+
+    since = {}
+    for symbol, columns in chunks:
+        since[symbol] = min(since.get(symbol, int(columns['open_time'][0])), int(columns['open_time'][0]))
+        if candle_store is not None and (table_name, symbol) not in store_rebuilds:
+            store_columns = {
+                'time': columns['open_time'] // 1000,
+                **{field: columns[field] for field in ('open', 'high', 'low', 'close', 'volume')}
+            }
+            candle_store.write(table_name, symbol, store_columns)
+            copy = store_copies.get((table_name, symbol))
+            if copy is not None:
+                candle_store.write(table_name, copy, store_columns)
+    # En invalidering per symbol och batch, efter commit
+    schedule_invalidations(session, table_name, since)
+
+class TokenBucket:
+    """
+    Gemensam rate limit för alla timeframes
+
+    Fylls på med `rate` tokens per sekund upp till `burst`. När flera timeframes
+    väntar delas tokens ut i proportion till deras prioritet (vägd rättvis kö), så
+    en timeframe med tusentals väntande requests inte svälter de andra.
+
+    Takten anpassas efter API:ets svar (observe). Med Bybits rate limit-headers
+    sätts den så att kvarvarande kvot räcker till fönstrets slut, mellan min_rate
+    och max_rate. 429/403 halverar takten och pausar utdelningen tills kvoten
+    återställs, varefter takten sakta går tillbaka mot den konfigurerade. Utan
+    min_rate och max_rate hålls takten fast och bara pauserna gäller.
+    """
+
+    def __init__(self, rate, burst, priorities, min_rate=None, max_rate=None):
+        self.base_rate = rate
+        self.rate = rate
+        self.min_rate = min_rate or rate
+        self.max_rate = max_rate or rate
+        self.burst = burst
+        self.priorities = priorities
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.waiters = {}  # timeframe -> kö av futures
+        self.usage = {}  # timeframe -> utdelade tokens / prioritet
+        self.granted = {}
+        self.throttled = 0
+        self.dispatcher = None
+
+    async def acquire(self, interval):
+        """Vänta på en token för en request i interval"""
+        future = asyncio.get_running_loop().create_future()
+        queue = self.waiters.get(interval)
+        if queue is None:
+            queue = self.waiters[interval] = deque()
+            # En timeframe som legat stilla får inte spara ihop förtur
+            active = [self.usage.get(i, 0.0) for i in self.waiters if i != interval]
+            if active:
+                self.usage[interval] = max(self.usage.get(interval, 0.0), min(active))
+        queue.append(future)
+        if self.dispatcher is None or self.dispatcher.done():
+            self.dispatcher = asyncio.create_task(self._dispatch())
+        await future
 
-async def fetch_candles(session, symbol, start_timestamp, token_queue, api_interval, max_retries=5):
-    url = f"https://api.bybit.com/v5/market/kline?category=linear&symbol={symbol}&interval={api_interval}&limit=1000"
+    def observe(self, status, headers, throttled=False):
+        """
+        Anpassa takten efter ett svar
+
+        Args:
+            status: HTTP-status
+            headers: Svarets headers (X-Bapi-Limit, X-Bapi-Limit-Status, X-Bapi-Limit-Reset-Timestamp)
+            throttled: Bybit svarade 200 men med retCode för för många requests
+        """
+        now = time.time()
+        limit = _header_number(headers, 'X-Bapi-Limit')
+        remaining = _header_number(headers, 'X-Bapi-Limit-Status')
+        reset = _header_number(headers, 'X-Bapi-Limit-Reset-Timestamp')
+        window = reset / 1000 - now if reset is not None else None
+
+        if throttled or status in (429, 403):
+            self.throttled += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+            retry_after = _header_number(headers, 'Retry-After')
+            if window is not None and window > 0:
+                pause = window
+            elif retry_after is not None:
+                pause = retry_after
+            else:
+                pause = 1.0
+            self._pause(pause)
+        elif remaining is not None and window is not None and window > 0:
+            # Sprid kvoten som finns kvar över resten av fönstret
+            usable = remaining - (limit or 0) * RATE_LIMIT_RESERVE
+            if usable <= 0:
+                self._pause(window)
+            else:
+                self.rate = min(self.max_rate, max(self.min_rate, usable / window))
+        elif self.rate < self.base_rate:
+            # Utan headers går takten bara tillbaka mot den konfigurerade
+            self.rate = min(self.base_rate, self.rate + self.base_rate / 100)
+
+    def stats(self):
+        return {'rate': self.rate, 'requests': sum(self.granted.values()), 'throttled': self.throttled}
+
+    def _pause(self, seconds):
+        self._refill()
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = min(self.tokens, 0)
+
+    def _refill(self):
+        now = time.monotonic()
+        # Under en paus fylls inget på
+        if now > self.paused_until:
+            self.tokens = min(self.burst, self.tokens + (now - max(self.updated, self.paused_until)) * self.rate)
+        self.updated = now
+
+    async def _dispatch(self):
+        while self.waiters:
+            self._refill()
+            pause = self.paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+                continue
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                continue
+
+            # Timeframen som fått minst i förhållande till sin prioritet
+            interval = min(self.waiters, key=lambda i: self.usage.get(i, 0.0))
+            queue = self.waiters[interval]
+            future = queue.popleft()
+            if not queue:
+                del self.waiters[interval]
+            if future.cancelled():
+                continue
+            future.set_result(None)
+            self.tokens -= 1
+            self.usage[interval] = self.usage.get(interval, 0.0) + 1 / self.priorities.get(interval, 1)
+            self.granted[interval] = self.granted.get(interval, 0) + 1
+
+def _header_number(headers, name):
+    try:
+        return float(headers[name])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+async def fetch_candles(session, symbol, start_timestamp, limiter, api_interval, max_retries=5):
+    url = f"{BYBIT_API_URL}/v5/market/kline?category=linear&symbol={symbol}&interval={api_interval}&limit=1000"
     if start_timestamp is not None:
         url += f"&start={start_timestamp}"
 
     wait_time = 1
     for attempt in range(1, max_retries+1):
-        await token_queue.get()
-        token_queue.task_done()
+        await limiter.acquire(api_interval)
 
-        async with session.get(url) as resp:
-            text = await resp.text()
-            if resp.status == 200:
-                try:
-                    data = json.loads(text)
+        try:
+            async with session.get(url) as resp:
+                text = await resp.text()
+                status = resp.status
+                headers = resp.headers
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"[{symbol}] Request misslyckades: {e!r} Försök {attempt}/{max_retries}")
+            await asyncio.sleep(wait_time)
+            wait_time *= 2
+            continue
+
+        if status == 200:
+            try:
+                data = json.loads(text)
+            except json.JSONDecodeError:
+                print(f"[{symbol}] JSONDecodeError!\nSvar:\n{text}\nFörsök {attempt}/{max_retries}")
+            else:
+                throttled = data.get('retCode') in RATE_LIMIT_RET_CODES
+                limiter.observe(status, headers, throttled)
+                if not throttled:
                     result = data.get('result', {})
                     return result.get('list', [])
-                except json.JSONDecodeError:
-                    print(f"[{symbol}] JSONDecodeError!\nSvar:\n{text}\nFörsök {attempt}/{max_retries}")
-            else:
-                print(f"[{symbol}] Fick status {resp.status} istället för 200. Svar: {text} Försök {attempt}/{max_retries}")
+                print(f"[{symbol}] Rate limit: {data.get('retMsg')} Försök {attempt}/{max_retries}")
+                # Limitern pausar tills kvoten återställs
+                continue
+        else:
+            limiter.observe(status, headers)
+            print(f"[{symbol}] Fick status {status} istället för 200. Svar: {text} Försök {attempt}/{max_retries}")
+            if status in (429, 403):
+                continue
 
-            await asyncio.sleep(wait_time)
-            wait_time *= 2
+        await asyncio.sleep(wait_time)
+        wait_time *= 2
 
     print(f"[{symbol}] Kunde inte hämta data efter {max_retries} försök.")
     return []
 
-async def writer_task(pool, queue, table_name):
-    while True:
-        symbol, candles = await queue.get()
-        if symbol is None and candles is None:
-            queue.task_done()
-            break
-        await save_candles_to_database(pool, symbol, candles, table_name)
-        queue.task_done()
+def mark_failed_write(table_name, chunks):
+    """
+    Kom ihåg att chunks inte sparats, så synken hämtar om symbolerna från den första saknade candlen
+
+    Symbolernas candle-store tas bort, eftersom senare chunks annars skulle
+    läggas efter ett hål. Den byggs om från MySQL nästa gång symbolen synkas.
+    """
+    failed = failed_writes.setdefault(table_name, {})
+    for symbol, columns in chunks:
+        first = int(columns['open_time'][0])
+        failed[symbol] = min(failed.get(symbol, first), first)
+        if candle_store is not None:
+            candle_store.remove(table_name, symbol)
+
+def pop_failed_writes(table_name, symbols):
+    """Första saknade open_time (ms) per symbol bland symbols som inte kunnat sparas i tabellen; markeringarna tas bort"""
+    marks = failed_writes.get(table_name, {})
+    return {symbol: marks.pop(symbol) for symbol in [symbol for symbol in marks if symbol in symbols]}
 
-async def process_symbol(session, pool, queue, token_queue, symbol, table_name, api_interval):
-    last_timestamp = await get_last_candle_timestamp(pool, symbol, table_name)
+async def writer_task(pool, queue, table_name, session=None):
+    # Chunks som väntar i kön slås ihop till en transaktion på upp till WRITE_BATCH_ROWS rader
+    done = False
+    while not done:
+        chunks = []
+        flushed = []
+        rows = 0
+        taken = 0
+        while not done and (taken == 0 or (rows < WRITE_BATCH_ROWS and not queue.empty())):
+            symbol, columns = await queue.get()
+            taken += 1
+            if symbol is None and columns is None:
+                done = True
+            elif isinstance(columns, asyncio.Event):
+                # Från flush_writer: sätts när allt som köats före den är skrivet
+                flushed.append(columns)
+                break
+            else:
+                chunks.append((symbol, columns))
+                rows += len(columns['open_time'])
+        try:
+            for attempt in range(1, WRITE_RETRIES + 1):
+                try:
+                    await save_candles_to_database(pool, chunks, table_name, session)
+                    break
+                except Exception as e:
+                    if attempt < WRITE_RETRIES:
+                        print(f"[{table_name}] Kunde inte spara {rows} candles, försöker igen... ({attempt}/{WRITE_RETRIES}): {e}")
+                        await asyncio.sleep(RETRY_DELAY * attempt)
+                    else:
+                        # Writern måste fortsätta tömma kön, annars fastnar hämtningen på den fulla kön.
+                        # Symbolerna markeras så de hämtas om från den första osparade candlen.
+                        print(f"[{table_name}] Kunde inte spara {rows} candles för {len(chunks)} chunks: {e}")
+                        mark_failed_write(table_name, [chunk for chunk in chunks if len(chunk[1]['open_time'])])
+        finally:
+            for _ in range(taken):
+                queue.task_done()
+            for event in flushed:
+                event.set()
+
+def start_writers(pool, table_name, session=None):
+    """Köer och writer-tasks för en tabell"""
+    queues = [asyncio.Queue(maxsize=WRITE_QUEUE_SIZE) for _ in range(WRITERS_PER_TABLE)]
+    writers = [asyncio.create_task(writer_task(pool, queue, table_name, session)) for queue in queues]
+    return queues, writers
+
+async def stop_writers(queues, writers):
+    """Säg åt writers att sluta när deras köer är tomma och vänta på dem"""
+    for queue in queues:
+        await queue.put((None, None))
+    await asyncio.gather(*writers)
+    # Sessionen stängs efter synken, så invalideringarna som är kvar skickas först
+    if invalidations:
+        await asyncio.wait(list(invalidations))
+
+async def flush_writer(queues, symbol):
+    """Vänta tills allt som köats för symbolen i tabellens köer har skrivits (eller markerats som misslyckat)"""
+    event = asyncio.Event()
+    await writer_queue(queues, symbol).put((symbol, event))
+    await event.wait()
+
+async def fetch_older_candles(pool, queues, symbol, table_name, fetch):
+    """
+    Kör fetch, en hämtning av candles äldre än de senaste, och bygg symbolens candle-store av MySQL efteråt
+
+    Varje chunk före de sparade raderna skulle annars skriva om allt efter den
+    i storen. Storen tas bort medan hämtningen pågår, så API:et läser MySQL.
+    Returnerar fetch:s resultat.
+    """
+    key = (table_name, symbol)
+    if candle_store is None or key in store_rebuilds:
+        return await fetch
+    store_rebuilds.add(key)
+    candle_store.remove(table_name, symbol)
+    try:
+        result = await fetch
+        await flush_writer(queues, symbol)
+    finally:
+        store_rebuilds.discard(key)
+    await fill_candle_store(pool, symbol, table_name)
+    return result
+
+def print_ingest_stats(table_name, elapsed):
+    stats = ingest_stats.get(table_name, {'rows': 0, 'transactions': 0, 'seconds': 0.0})
+    print(f"=== {table_name}: {stats['rows']} rader i {stats['transactions']} transaktioner, "
+          f"{stats['rows'] / elapsed if elapsed else 0:.0f} rader/s totalt, "
+          f"{stats['rows'] / stats['seconds'] if stats['seconds'] else 0:.0f} rader/s vid skrivning ===")
+
+def writer_queue(queues, symbol):
+    """Kön för symbolens writer; en symbol skrivs alltid av samma writer så dess rader aldrig låses av två transaktioner"""
+    return queues[zlib.crc32(symbol.encode()) % len(queues)]
+
+async def process_symbol(session, pool, queues, limiter, symbol, table_name, api_interval,
+                         start_timestamp=None, end_timestamp=None, deriver=None, quiet=False):
+    """
+    Hämta symbolens candles från API:et och köa dem för skrivning
+
+    Startar efter den senaste candlen i tabellen om inte start_timestamp anges.
+    Med end_timestamp (ms) hämtas bara candles som öppnar före den, och med
+    deriver byggs högre timeframes av varje chunk. quiet stänger av utskriften
+    per chunk (daemonen hämtar bara några candles per symbol och pass).
+
+    Returnerar open_time (ms) för den senaste köade candlen, None om inga köades.
+    """
+    await fill_candle_store(pool, symbol, table_name)
+    last_timestamp = start_timestamp
+    if last_timestamp is None:
+        last_timestamp = await get_last_candle_timestamp(pool, symbol, table_name)
     if last_timestamp is None:
         last_timestamp = DEFAULT_START_TIMESTAMP
         print(f"Inga candles i {table_name} för {symbol}. Startar från: {datetime.utcfromtimestamp(last_timestamp/1000)}")
 
+    newest = None
     while True:
-        candles = await fetch_candles(session, symbol, last_timestamp, token_queue, api_interval)
+        candles = await fetch_candles(session, symbol, last_timestamp, limiter, api_interval)
         if not candles:
-            print(f"Inga fler candles för {symbol} i {table_name}. Klar.")
+            if not quiet:
+                print(f"Inga fler candles för {symbol} i {table_name}. Klar.")
             break
 
-        candles.sort(key=lambda x: int(x[0]))
+        columns = parse_candles(candles)
+        if end_timestamp is not None:
+            before_end = columns['open_time'] < end_timestamp
+            columns = {name: values[before_end] for name, values in columns.items()}
+            if len(columns['open_time']) == 0:
+                break
 
-        await queue.put((symbol, candles))
+        await writer_queue(queues, symbol).put((symbol, columns))
+        if deriver is not None:
+            await deriver.add(columns)
 
-        end_ts = int(candles[-1][0])
+        end_ts = int(columns['open_time'][-1])
+        newest = end_ts
         last_timestamp = end_ts - 2
-        print(f"Sparade chunk för {symbol} t.o.m: {datetime.utcfromtimestamp(end_ts/1000)}")
+        if not quiet:
+            print(f"Sparade chunk för {symbol} t.o.m: {datetime.utcfromtimestamp(end_ts/1000)}")
 
-        if len(candles) < 1000:
-            print(f"Alla candles för {symbol} har hämtats och kommer skrivas i {table_name}.")
+        if len(candles) < 1000 or (end_timestamp is not None and not before_end.all()):
+            if not quiet:
+                print(f"Alla candles för {symbol} har hämtats och kommer skrivas i {table_name}.")
             break
+    return newest
+
+async def derive_symbol(session, pool, queues, limiter, symbol, start_timestamp=None, empty=None, deriver=None, quiet=False):
+    """
+    Hämta symbolens 1m-candles och bygg de högre timeframes av dem
 
-async def run_for_interval(interval, pool):
+    Saknar en högre timeframe candles helt hämtas historiken före den första
+    1m-candlen från API:et, till och med bucketen som 1m-datan börjar i (den kan
+    vara ofullständig om 1m-historiken är kortare). De tomma timeframes slås upp
+    i databasen om inte empty anges, och daemonen skickar med sin deriver så dess
+    buffertar följer med mellan passen.
+
+    Returnerar open_time (ms) för den senaste köade 1m-candlen.
+    """
+    minute_table = intervals_mapping["1"]
+    if empty is None:
+        empty = []
+        for interval in derived_timeframes:
+            if await get_last_candle_timestamp(pool, symbol, intervals_mapping[interval]) is None:
+                empty.append(interval)
+
+    # En tom timeframe byggs från början av 1m-historiken
+    if deriver is None:
+        deriver = CandleDeriver(pool, symbol, queues)
+    start = DEFAULT_START_TIMESTAMP if empty else start_timestamp
+    newest = await process_symbol(session, pool, queues[minute_table], limiter, symbol, minute_table, "1",
+                                  start_timestamp=start, deriver=deriver, quiet=quiet)
+
+    if deriver.first_open_time is None:
+        return newest
+    for interval in empty:
+        table_name = intervals_mapping[interval]
+        bucket_seconds = parse_timeframe(interval)
+        end = (int(bucket_floor(deriver.first_open_time // 1000, bucket_seconds)) + bucket_seconds) * 1000
+        api_interval = interval.upper() if interval in ["D", "W"] else interval
+        # Historiken kommer efter de nyare rader som byggts av 1m
+        await fetch_older_candles(pool, queues[table_name], symbol, table_name, process_symbol(
+            session, pool, queues[table_name], limiter, symbol, table_name, api_interval,
+            start_timestamp=DEFAULT_START_TIMESTAMP, end_timestamp=end, quiet=quiet
+        ))
+    return newest
+
+async def repair_failed_writes(session, pool, queues, limiter, table_names, symbols, quiet=False):
+    """
+    Hämta om candles som inte kunde sparas, från den första saknade candlen per tabell och symbol
+
+    Varje tabell hämtas från sin egen timeframe i API:et, även de som annars
+    byggs av 1m. Returnerar antal (tabell, symbol) som hämtades om.
+    """
+    async def repair(symbol, table_name, api_interval, first):
+        print(f"[{symbol}] Hämtar om {table_name} från {datetime.utcfromtimestamp(first/1000)} efter misslyckad skrivning")
+        try:
+            await fetch_older_candles(pool, queues[table_name], symbol, table_name, process_symbol(
+                session, pool, queues[table_name], limiter, symbol, table_name, api_interval,
+                start_timestamp=first - 1, quiet=quiet
+            ))
+        except Exception:
+            # Markeringen ligger kvar till nästa försök
+            failed = failed_writes.setdefault(table_name, {})
+            failed[symbol] = min(failed.get(symbol, first), first)
+            raise
+
+    symbols = set(symbols)
+    tasks = []
+    for interval, table_name in intervals_mapping.items():
+        if table_name not in table_names:
+            continue
+        api_interval = interval.upper() if interval in ["D", "W"] else interval
+        for symbol, first in pop_failed_writes(table_name, symbols).items():
+            tasks.append(repair(symbol, table_name, api_interval, first))
+    await asyncio.gather(*tasks)
+    return len(tasks)
+
+async def finish_writes(session, pool, queues, limiter, symbols):
+    """
+    Vänta tills köerna är skrivna och hämta om det som inte kunde sparas, högst MAX_RETRIES gånger
+
+    queues är tabell -> köer. Det som fortfarande saknas efteråt skrivs ut, så
+    ett hål i historiken aldrig passerar obemärkt.
+    """
+    for _ in range(MAX_RETRIES):
+        await asyncio.gather(*(queue.join() for table_queues in queues.values() for queue in table_queues))
+        if not await repair_failed_writes(session, pool, queues, limiter, queues, symbols):
+            return
+    await asyncio.gather(*(queue.join() for table_queues in queues.values() for queue in table_queues))
+    for table_name in queues:
+        for symbol, first in pop_failed_writes(table_name, set(symbols)).items():
+            print(f"[{symbol}] ✗ Candles i {table_name} från {datetime.utcfromtimestamp(first/1000)} kunde inte sparas, "
+                  f"historiken har ett hål från den tiden")
+
+async def run_for_interval(interval, pool, session, limiter):
     # Denna funktion kör hela logiken för en specifik timeframe
+    interval_start = time.time()
     api_interval = interval.upper() if interval in ["D", "W"] else interval
     table_name = intervals_mapping[interval]
 
@@ -190,21 +837,176 @@ async def run_for_interval(interval, pool):
 
     print(f"=== Bearbetar {len(all_symbols)} symboler för interval {interval} ===")
 
-    candle_queue = asyncio.Queue()
-    writer = asyncio.create_task(writer_task(pool, candle_queue, table_name))
+    candle_queues, writers = start_writers(pool, table_name, session)
+
+    tasks = [asyncio.create_task(process_symbol(session, pool, candle_queues, limiter, sym, table_name, api_interval)) for sym in all_symbols]
+    await asyncio.gather(*tasks)
+    await finish_writes(session, pool, {table_name: candle_queues}, limiter, all_symbols)
+
+    await stop_writers(candle_queues, writers)
+
+    elapsed = time.time() - interval_start
+    print(f"=== Interval {interval} klart på {elapsed:.1f} sekunder ({limiter.granted.get(api_interval, 0)} requests) ===")
+    print_ingest_stats(table_name, elapsed)
+
+async def run_derived(pool, session, limiter):
+    # Hämtar bara 1m från API:et och bygger övriga timeframes av den
+    run_start = time.time()
+    all_symbols = await get_all_symbols(pool)
+    if not all_symbols:
+        print("Inga symboler i databasen, inget att synka.")
+        return
+
+    print(f"=== Bearbetar {len(all_symbols)} symboler, {', '.join(derived_timeframes)} byggs av 1m ===")
+
+    queues = {}
+    writers = {}
+    for table_name in intervals_mapping.values():
+        queues[table_name], writers[table_name] = start_writers(pool, table_name, session)
+
+    tasks = [asyncio.create_task(derive_symbol(session, pool, queues, limiter, sym)) for sym in all_symbols]
+    await asyncio.gather(*tasks)
+    await finish_writes(session, pool, queues, limiter, all_symbols)
+
+    for table_name in intervals_mapping.values():
+        await stop_writers(queues[table_name], writers[table_name])
+
+    elapsed = time.time() - run_start
+    print(f"=== Klart på {elapsed:.1f} sekunder ({sum(limiter.granted.values())} requests) ===")
+    for table_name in intervals_mapping.values():
+        print_ingest_stats(table_name, elapsed)
+
+async def refresh_symbols():
+    """Uppdatera tickers-tabellen med sync_tickers i samma process (i en tråd, den använder blockerande I/O)"""
+    try:
+        await asyncio.to_thread(sync_tickers.main)
+    except Exception as e:
+        print(f"✗ Fel vid uppdatering av symboler: {e}")
 
-    token_queue = asyncio.Queue()
-    rate_task = asyncio.create_task(rate_limiter(token_queue, REQUESTS_PER_SECOND))
+async def load_frontier(pool, table_name):
+    """Senaste open_time (ms) per symbol i tabellen, med en enda grupperad query"""
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(f"SELECT symbol, MAX(open_time) FROM {table_name} GROUP BY symbol")
+            rows = await cur.fetchall()
+    return {row[0]: row[1] for row in rows}
+
+def next_sync_time(interval, now):
+    """Tidpunkt (s) för nästa hämtning: strax efter att den pågående candlen stängt, men senast om DAEMON_MAX_WAIT"""
+    bucket_seconds = parse_timeframe(interval)
+    close = int(bucket_floor(int(now), bucket_seconds)) + bucket_seconds + DAEMON_CLOSE_DELAY
+    return min(close, now + DAEMON_MAX_WAIT)
+
+async def daemon_interval(interval, pool, session, limiter, state, queues):
+    """
+    Håll en timeframe uppdaterad: hämta alla symbolers nya candles strax efter varje stängning
+
+    Frontieren (senaste open_time per symbol) läses från databasen en gång och
+    följer sedan med i minnet, så ett pass är en request per symbol. Symboler som
+    saknas i frontieren backfillas i egna tasks så de inte håller upp passen.
+    """
+    api_interval = interval.upper() if interval in ["D", "W"] else interval
+    table_name = intervals_mapping[interval]
+    frontier = await load_frontier(pool, table_name)
+    derive = DERIVE_TIMEFRAMES and interval == "1"
+    tables = [table_name] + ([intervals_mapping[iv] for iv in derived_timeframes] if derive else [])
+    if derive:
+        derived_frontiers = {iv: await load_frontier(pool, intervals_mapping[iv]) for iv in derived_timeframes}
+    derivers = {}
+    backfills = {}  # symbol -> task
+    print(f"=== Daemon {interval}: {len(frontier)} symboler i {table_name} ===")
+
+    async def sync_symbol(symbol, start_timestamp):
+        if derive:
+            # Tomma högre timeframes behöver bara fyllas första gången symbolen synkas, sedan finns de
+            deriver = derivers.get(symbol)
+            empty = [] if deriver is not None else [iv for iv in derived_timeframes if symbol not in derived_frontiers[iv]]
+            if deriver is None:
+                deriver = CandleDeriver(pool, symbol, queues)
+            newest = await derive_symbol(session, pool, queues, limiter, symbol, start_timestamp=start_timestamp,
+                                         empty=empty, deriver=deriver, quiet=start_timestamp is not None)
+            # Sparas först när passet lyckats, annars görs det första om
+            derivers[symbol] = deriver
+        else:
+            newest = await process_symbol(session, pool, queues[table_name], limiter, symbol, table_name, api_interval,
+                                          start_timestamp=start_timestamp, quiet=start_timestamp is not None)
+        if newest is not None:
+            frontier[symbol] = newest
+
+    def backfill_done(symbol, task):
+        backfills.pop(symbol, None)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"[{symbol}] Backfill av {table_name} misslyckades: {task.exception()}")
+
+    try:
+        while True:
+            pass_start = time.time()
+            symbols = state['symbols']
+            for symbol in set(frontier) - set(symbols):
+                # Delistad sedan förra passet
+                del frontier[symbol]
+                derivers.pop(symbol, None)
+
+            tails = []
+            for symbol in symbols:
+                if symbol in frontier:
+                    tails.append(symbol)
+                elif symbol not in backfills:
+                    # Referensen hålls i backfills så tasken inte försvinner medan den körs
+                    task = backfills[symbol] = asyncio.create_task(sync_symbol(symbol, None))
+                    task.add_done_callback(functools.partial(backfill_done, symbol))
+
+            results = await asyncio.gather(*(sync_symbol(symbol, frontier[symbol]) for symbol in tails), return_exceptions=True)
+            for symbol, result in zip(tails, results):
+                if isinstance(result, Exception):
+                    print(f"[{symbol}] Synk av {table_name} misslyckades: {result}")
+
+            # Frontieren har redan passerat candles som writers inte kunde spara, de hämtas om från hålet
+            try:
+                await repair_failed_writes(session, pool, queues, limiter, tables, tails, quiet=True)
+            except Exception as e:
+                print(f"[daemon {interval}] Omhämtning efter misslyckad skrivning misslyckades: {e}")
+
+            wake = next_sync_time(interval, time.time())
+            print(f"[daemon {interval}] {len(tails)} symboler på {time.time() - pass_start:.1f} s, "
+                  f"{len(backfills)} backfills pågår, nästa pass {datetime.fromtimestamp(wake).strftime('%H:%M:%S')}")
+            await asyncio.sleep(max(wake - time.time(), 0))
+    finally:
+        for task in list(backfills.values()):
+            task.cancel()
+
+async def refresh_tickers_loop(pool, state):
+    """Uppdatera symbollistan var TICKER_REFRESH_SECONDS sekund"""
+    while True:
+        await asyncio.sleep(TICKER_REFRESH_SECONDS)
+        await refresh_symbols()
+        try:
+            symbols = await get_all_symbols(pool)
+        except Exception as e:
+            print(f"✗ Kunde inte läsa symboler, behåller de gamla: {e}")
+            continue
+        if symbols:
+            state['symbols'] = symbols
 
-    async with aiohttp.ClientSession() as session:
-        tasks = [asyncio.create_task(process_symbol(session, pool, candle_queue, token_queue, sym, table_name, api_interval)) for sym in all_symbols]
-        await asyncio.gather(*tasks)
+async def run_daemon(pool, session, limiter):
+    # Körs tills processen stoppas, med writers och frontier kvar mellan passen
+    state = {'symbols': await get_all_symbols(pool)}
+    intervals = ["1"] if DERIVE_TIMEFRAMES else timeframes
+    print(f"=== Daemon startad för {len(state['symbols'])} symboler, timeframes: {', '.join(intervals)} ===")
 
-    await candle_queue.put((None, None))
-    await candle_queue.join()
-    await writer
+    queues = {}
+    writers = {}
+    for table_name in intervals_mapping.values():
+        queues[table_name], writers[table_name] = start_writers(pool, table_name, session)
 
-    rate_task.cancel()
+    try:
+        await asyncio.gather(
+            refresh_tickers_loop(pool, state),
+            *(daemon_interval(interval, pool, session, limiter, state, queues) for interval in intervals)
+        )
+    finally:
+        for table_name in intervals_mapping.values():
+            await stop_writers(queues[table_name], writers[table_name])
 
 async def main():
     start_time = time.time()
@@ -212,30 +1014,49 @@ async def main():
     
     # Kör sync_tickers först för att uppdatera symboler
     print("\nUppdaterar symboler från Bybit...")
-    import subprocess
-    result = subprocess.run(['python', 'sync_tickers.py'], capture_output=True, text=True)
-    if result.returncode == 0:
-        print("✓ Symboler uppdaterade")
-    else:
-        print(f"✗ Fel vid uppdatering av symboler: {result.stderr}")
-        print("Fortsätter ändå...")
+    await refresh_symbols()
     
     print("\nStartar datasynkronisering...")
 
     pool = await aiomysql.create_pool(
         host=DB_HOST, port=DB_PORT, user=DB_USER, password=DB_PASS, db=DB_NAME,
-        autocommit=False, minsize=1, maxsize=MAX_CONCURRENT_REQUESTS*2
+        autocommit=False, minsize=1, maxsize=MAX_CONCURRENT_REQUESTS*2 + WRITERS_PER_TABLE*len(timeframes),
+        local_infile=LOAD_DATA_INFILE
     )
 
-    # Iterera över alla timeframes från störst till minst
-    for interval in timeframes:
-        await run_for_interval(interval, pool)
+    # Alla timeframes körs samtidigt och delar på API-budgeten
+    limiter = TokenBucket(REQUESTS_PER_SECOND, REQUEST_BURST, interval_priority,
+                          MIN_REQUESTS_PER_SECOND, MAX_REQUESTS_PER_SECOND)
+    connector = aiohttp.TCPConnector(limit=HTTP_CONNECTIONS, keepalive_timeout=HTTP_KEEPALIVE_SECONDS, ttl_dns_cache=300)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT)) as session:
+        if DAEMON:
+            await run_daemon(pool, session, limiter)
+        elif DERIVE_TIMEFRAMES:
+            await run_derived(pool, session, limiter)
+        else:
+            await asyncio.gather(*(run_for_interval(interval, pool, session, limiter) for interval in timeframes))
 
     pool.close()
     await pool.wait_closed()
 
+    stats = limiter.stats()
+    print(f"API: {stats['requests']} requests, rate limit {stats['throttled']} gånger, takt vid slutet {stats['rate']:.1f}/s")
     end_time = time.time()
     print(f"Scriptet kördes klart på {end_time - start_time} sekunder för samtliga timeframes.")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Synka candles för alla symboler och timeframes från Bybit")
+    parser.add_argument('--load-data', action='store_true', help="Skriv stora batcher med LOAD DATA LOCAL INFILE (första backfill)")
+    parser.add_argument('--derive', action='store_true', help="Hämta bara 1m och bygg övriga timeframes av den")
+    parser.add_argument('--api-url', help=f"Bas-URL för Bybits API (standard {BYBIT_API_URL})")
+    parser.add_argument('--daemon', action='store_true', help="Kör tills den stoppas och hämta nya candles när de stänger")
+    args = parser.parse_args()
+    if args.load_data:
+        LOAD_DATA_INFILE = True
+    if args.derive:
+        DERIVE_TIMEFRAMES = True
+    if args.daemon:
+        DAEMON = True
+    if args.api_url:
+        BYBIT_API_URL = sync_tickers.BYBIT_API_URL = args.api_url.rstrip('/')
     asyncio.run(main())
\ No newline at end of file
@@ -10,7 +10,10 @@ Synkar symbols med Bybit API:
 import pymysql
 import requests
 import json
+import argparse
+import time
 from datetime import datetime
+from candle_store import CandleStore, DEFAULT_ROOT as CANDLE_STORE_ROOT
 
 # Databaskonfiguration
 DB_CONFIG = {
@@ -22,16 +25,29 @@ DB_CONFIG = {
     'charset': 'utf8mb4'
 }
 
+# Bybits API (sync_all_data.py --api-url pekar om den)
+BYBIT_API_URL = 'https://api.bybit.com'
+
+# Candle-tabeller som delistade symbols tas bort ur
+CANDLE_TABLES = ['candles1', 'candles5', 'candles15', 'candles60', 'candles240', 'candlesd', 'candlesw']
+REMOVE_BATCH_ROWS = 50000  # Rader per DELETE när delistade symbols tas bort
+
+# Candle-storen som sync_all_data.py skriver (None = av)
+CANDLE_STORE_DIR = CANDLE_STORE_ROOT
+
+# API-endpoint som laddar om API:ets symbollista efter en uppdatering (None = av)
+API_SYMBOLS_REFRESH_URL = 'http://localhost:8000/api/symbols/refresh'
+
 def get_db_connection():
     """Skapa databaskoppling"""
     return pymysql.connect(**DB_CONFIG, cursorclass=pymysql.cursors.DictCursor)
 
-def fetch_tickers():
-    """Hämta alla tickers från Bybit API"""
-    url = "https://api.bybit.com/v5/market/tickers?category=linear"
+def fetch_tickers(session=None):
+    """Hämta alla tickers från Bybit API (med session återanvänds anslutningen)"""
+    url = f"{BYBIT_API_URL}/v5/market/tickers?category=linear"
     
     try:
-        response = requests.get(url)
+        response = (session or requests).get(url, timeout=10)
         response.raise_for_status()
         data = response.json()
         
@@ -44,6 +60,16 @@ def fetch_tickers():
         print(f"Error fetching tickers: {e}")
         return []
 
+def notify_api(session=None):
+    """Säg åt API:et att tickers-tabellen har ändrats"""
+    if API_SYMBOLS_REFRESH_URL is None:
+        return
+    try:
+        (session or requests).post(API_SYMBOLS_REFRESH_URL, timeout=2)
+    except requests.RequestException:
+        # API:et kör inte, så det finns ingen symbollista att ladda om
+        pass
+
 def get_db_symbols(conn):
     """Hämta alla symbols från databasen"""
     cursor = conn.cursor()
@@ -58,90 +84,104 @@ def add_new_symbols(conn, symbols):
     pass
 
 def remove_symbols(conn, symbols):
-    """Ta bort symbols som inte längre finns"""
+    """Ta bort symbols som inte längre finns, ur tickers, alla candle-tabeller och candle-storen"""
     if not symbols:
         return
     
     cursor = conn.cursor()
+    placeholders = ','.join(['%s'] * len(symbols))
     
-    # Lista av tabeller att rensa från
-    tables = [
-        'tickers',
-        'klines'  # Vår klines tabell
-    ]
+    # Tickers först, så ingen synk hinner hämta symbolerna igen
+    cursor.execute(f"DELETE FROM tickers WHERE symbol IN ({placeholders})", symbols)
+    conn.commit()
+    print(f"Removed {cursor.rowcount} rows from tickers")
     
-    for table in tables:
-        placeholders = ','.join(['%s'] * len(symbols))
-        query = f"DELETE FROM {table} WHERE symbol IN ({placeholders})"
-        cursor.execute(query, symbols)
-        print(f"Removed {cursor.rowcount} rows from {table}")
+    # Candles tas bort i omgångar så ingen transaktion låser miljontals rader
+    for table in CANDLE_TABLES:
+        removed = 0
+        while True:
+            cursor.execute(f"DELETE FROM {table} WHERE symbol IN ({placeholders}) LIMIT {REMOVE_BATCH_ROWS}", symbols)
+            conn.commit()
+            removed += cursor.rowcount
+            if cursor.rowcount < REMOVE_BATCH_ROWS:
+                break
+        print(f"Removed {removed} rows from {table}")
+    
+    if CANDLE_STORE_DIR is not None:
+        store = CandleStore(CANDLE_STORE_DIR)
+        for table in CANDLE_TABLES:
+            for symbol in symbols:
+                store.remove(table, symbol)
     
-    conn.commit()
     cursor.close()
 
+def safe_float(val):
+    return float(val) if val else None
+
+def safe_int(val):
+    return int(val) if val else None
+
+# Kolumner i tickers-tabellen och hur API:ets värde konverteras
+TICKER_FIELDS = [
+    ('symbol', str),
+    ('lastPrice', safe_float),
+    ('indexPrice', safe_float),
+    ('markPrice', safe_float),
+    ('prevPrice24h', safe_float),
+    ('price24hPcnt', safe_float),
+    ('highPrice24h', safe_float),
+    ('lowPrice24h', safe_float),
+    ('prevPrice1h', safe_float),
+    ('openInterest', safe_float),
+    ('openInterestValue', safe_float),
+    ('turnover24h', safe_float),
+    ('volume24h', safe_float),
+    ('fundingRate', safe_float),
+    ('nextFundingTime', safe_int),
+    ('predictedDeliveryPrice', safe_float),
+    ('basisRate', safe_float),
+    ('deliveryFeeRate', safe_float),
+    ('deliveryTime', safe_int),
+    ('ask1Size', safe_float),
+    ('bid1Price', safe_float),
+    ('ask1Price', safe_float),
+    ('bid1Size', safe_float),
+    ('basis', lambda val: val or '')
+]
+
+def ticker_rows(tickers_data):
+    """Rader för tickers-tabellen, bara USDT perpetuals"""
+    return [
+        tuple(convert(ticker.get(name)) for name, convert in TICKER_FIELDS)
+        for ticker in tickers_data
+        if ticker.get('symbol', '').endswith('USDT')
+    ]
+
 def update_tickers(conn, tickers_data):
-    """Uppdatera tickers tabell med senaste data"""
-    if not tickers_data:
+    """
+    Uppdatera tickers tabell med senaste data
+    
+    Tabellen töms och fylls i samma transaktion, så läsare ser antingen de gamla
+    eller de nya raderna och aldrig en tom tabell. executemany skickar raderna
+    som multi-row INSERT.
+    """
+    rows = ticker_rows(tickers_data)
+    if not rows:
         return
     
+    columns = ', '.join(name for name, _ in TICKER_FIELDS)
+    placeholders = ', '.join(['%s'] * len(TICKER_FIELDS))
     cursor = conn.cursor()
-    
-    # Först, rensa gamla tickers
-    cursor.execute("TRUNCATE TABLE tickers")
-    
-    # Helper functions för säker konvertering
-    def safe_float(val):
-        return float(val) if val else None
-    
-    def safe_int(val):
-        return int(val) if val else None
-    
-    # Förbered data för insert
-    inserted_count = 0
-    for ticker in tickers_data:
-        # Filtrera bara USDT perpetuals
-        if ticker.get('symbol', '').endswith('USDT'):
-            cursor.execute("""
-            INSERT INTO tickers (
-                symbol, lastPrice, indexPrice, markPrice, prevPrice24h, price24hPcnt,
-                highPrice24h, lowPrice24h, prevPrice1h, openInterest, openInterestValue,
-                turnover24h, volume24h, fundingRate, nextFundingTime, predictedDeliveryPrice,
-                basisRate, deliveryFeeRate, deliveryTime, ask1Size, bid1Price,
-                ask1Price, bid1Size, basis
-            ) VALUES (
-                %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
-            )
-            """, (
-                ticker['symbol'],
-                safe_float(ticker.get('lastPrice')),
-                safe_float(ticker.get('indexPrice')),
-                safe_float(ticker.get('markPrice')),
-                safe_float(ticker.get('prevPrice24h')),
-                safe_float(ticker.get('price24hPcnt')),
-                safe_float(ticker.get('highPrice24h')),
-                safe_float(ticker.get('lowPrice24h')),
-                safe_float(ticker.get('prevPrice1h')),
-                safe_float(ticker.get('openInterest')),
-                safe_float(ticker.get('openInterestValue')),
-                safe_float(ticker.get('turnover24h')),
-                safe_float(ticker.get('volume24h')),
-                safe_float(ticker.get('fundingRate')),
-                safe_int(ticker.get('nextFundingTime')),
-                safe_float(ticker.get('predictedDeliveryPrice')),
-                safe_float(ticker.get('basisRate')),
-                safe_float(ticker.get('deliveryFeeRate')),
-                safe_int(ticker.get('deliveryTime')),
-                safe_float(ticker.get('ask1Size')),
-                safe_float(ticker.get('bid1Price')),
-                safe_float(ticker.get('ask1Price')),
-                safe_float(ticker.get('bid1Size')),
-                ticker.get('basis', '')
-            ))
-            inserted_count += 1
-    
-    conn.commit()
-    cursor.close()
-    print(f"Updated {inserted_count} tickers")
+    try:
+        cursor.execute("DELETE FROM tickers")
+        cursor.executemany(f"INSERT INTO tickers ({columns}) VALUES ({placeholders})", rows)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    print(f"Updated {len(rows)} tickers")
 
 def main():
     """Huvudfunktion"""
@@ -198,6 +238,7 @@ def main():
         # Uppdatera tickers tabell
         print("\nUpdating tickers table...")
         update_tickers(conn, api_tickers)
+        notify_api()
         
         print("\n✓ Symbol management completed successfully!")
         
@@ -208,5 +249,37 @@ def main():
     finally:
         conn.close()
 
+def run_live(seconds):
+    """
+    Uppdatera tickers var `seconds` sekund, som ett live-flöde
+    
+    Databaskopplingen och HTTP-sessionen hålls öppna mellan uppdateringarna.
+    Delistade symbols försvinner ur tickers direkt men deras candles tas bara
+    bort av en vanlig körning, så ett tillfälligt ofullständigt API-svar inte
+    raderar historik.
+    """
+    session = requests.Session()
+    conn = get_db_connection()
+    try:
+        while True:
+            started = time.time()
+            api_tickers = fetch_tickers(session)
+            if api_tickers:
+                try:
+                    conn.ping(reconnect=True)
+                    update_tickers(conn, api_tickers)
+                    notify_api(session)
+                except Exception as e:
+                    print(f"✗ Error updating tickers: {e}")
+            time.sleep(max(seconds - (time.time() - started), 0))
+    finally:
+        conn.close()
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Synka symbols och ticker data med Bybit")
+    parser.add_argument('--every', type=float, help="Uppdatera tickers var N sekund tills scriptet stoppas")
+    args = parser.parse_args()
+    if args.every:
+        run_live(args.every)
+    else:
+        main()
\ No newline at end of file
@@ -0,0 +1,77 @@
+"""
+Worker pools for CPU-bound work in SmartChart
+Runs indicator math and payload building off the event loop with bounded queues
+"""
+
+import asyncio
+import functools
+from concurrent.futures import Executor
+
+
+class WorkerPoolFull(Exception):
+    """Raised when a worker pool already has max_pending tasks"""
+
+
+class WorkerPool:
+    """
+    Executor with a bounded number of pending tasks
+
+    At most max_workers tasks run at once and at most max_queue more wait for
+    a worker. Submitting beyond that raises WorkerPoolFull straight away
+    instead of letting the backlog (and response times) grow without bound.
+    """
+
+    def __init__(self, name: str, executor: Executor, max_workers: int, max_queue: int):
+        self.name = name
+        self.executor = executor
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    @property
+    def max_pending(self) -> int:
+        return self.max_workers + self.max_queue
+
+    async def run(self, function, *args, **kwargs):
+        """Run function(*args, **kwargs) on a worker and return its result"""
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise WorkerPoolFull(f"{self.name} worker pool is full ({self.pending} tasks pending)")
+
+        loop = asyncio.get_running_loop()
+        future = self.executor.submit(functools.partial(function, *args, **kwargs))
+        self.pending += 1
+        # Counted until the job itself is done: a caller that is cancelled (client disconnect)
+        # stops waiting, but a job that already started keeps its worker busy
+        future.add_done_callback(lambda done: self._call_soon(loop, self._finished, done))
+        return await asyncio.wrap_future(future)
+
+    def _finished(self, future) -> None:
+        self.pending -= 1
+        if not future.cancelled():
+            self.completed += 1
+
+    @staticmethod
+    def _call_soon(loop, callback, *args) -> None:
+        # Done callbacks run on the executor's thread
+        try:
+            loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            # The loop has been closed at shutdown
+            pass
+
+    def stats(self) -> dict:
+        return {
+            'name': self.name,
+            'workers': self.max_workers,
+            'max_queue': self.max_queue,
+            'running': min(self.pending, self.max_workers),
+            'queued': max(self.pending - self.max_workers, 0),
+            'completed': self.completed,
+            'rejected': self.rejected
+        }
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)